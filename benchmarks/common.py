@@ -0,0 +1,171 @@
+import os
+import sys
+import json
+import time
+import random
+import threading
+import subprocess
+from typing import Optional
+
+
+# ================= 路径 =================
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOOLS_DIR = os.path.join(ROOT_DIR, "tools")
+RESULTS_DIR = os.path.join(ROOT_DIR, "benchmarks", "results")
+
+
+def use_tools_path():
+    """让基准测试可以直接 import tools/ 下的模块"""
+    if TOOLS_DIR not in sys.path:
+        sys.path.insert(0, TOOLS_DIR)
+
+
+# ================= 故障注入 =================
+
+class FaultInjector:
+    """
+    模拟服务的延迟和故障
+    - latency / jitter: 每个请求在响应前等待 latency ± jitter 秒
+    - fail_rate: 按该概率让请求失败
+    - fail_status: 失败方式，HTTP 状态码（429 带 Retry-After）或 "reset"（不返回响应直接断开连接）
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, fail_rate: float = 0.0,
+                 fail_status="500", seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.fail_status = str(fail_status)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def before_request(self) -> Optional[str]:
+        """等待模拟延迟，返回本次要注入的故障（None 表示正常响应）"""
+        with self._lock:
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            fail = self._random.random() < self.fail_rate
+        if delay:
+            time.sleep(delay)
+        return self.fail_status if fail else None
+
+    def describe(self) -> dict:
+        return {"latency": self.latency, "jitter": self.jitter,
+                "fail_rate": self.fail_rate, "fail_status": self.fail_status}
+
+
+class RequestStats:
+    """模拟服务收到的请求计数（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {}
+
+    def add(self, key: str):
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
+
+    def total(self, prefix: str = "") -> int:
+        with self._lock:
+            return sum(n for key, n in self.counts.items() if key.startswith(prefix))
+
+
+# ================= 统计 =================
+
+def percentile(samples: list, q: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def summarize(samples: list) -> dict:
+    """耗时样本（秒）汇总为毫秒统计"""
+    if not samples:
+        return {"count": 0}
+
+    def ms(value):
+        return round(value * 1000, 2)
+
+    return {
+        "count": len(samples),
+        "mean_ms": ms(sum(samples) / len(samples)),
+        "p50_ms": ms(percentile(samples, 50)),
+        "p95_ms": ms(percentile(samples, 95)),
+        "min_ms": ms(min(samples)),
+        "max_ms": ms(max(samples)),
+    }
+
+
+class Timer:
+    """with Timer() as t: ...; t.elapsed 为耗时（秒）"""
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.elapsed = None
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+        return False
+
+
+# ================= 结果 =================
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def write_results(results: dict, output: str = None) -> str:
+    """写入 JSON 结果（默认 benchmarks/results/<时间>.json，同时更新 latest.json），返回文件路径"""
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+        latest = os.path.join(RESULTS_DIR, "latest.json")
+    else:
+        latest = None
+    for path in filter(None, (output, latest)):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return output
+
+
+def flatten_metrics(results: dict) -> dict:
+    """把 {"benchmarks": {名称: {指标: 值或 {统计}}}} 展开为 {"名称.指标.统计": 值}，用于对比"""
+    flat = {}
+
+    def walk(prefix, value):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                walk(f"{prefix}.{key}" if prefix else key, item)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix] = value
+
+    walk("", results.get("benchmarks", {}))
+    return flat
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """
+    对比两次结果中的耗时指标（以 _ms 结尾），返回变慢超过 threshold 比例的指标
+    [(指标, 基准值, 当前值, 变化比例)]
+    """
+    now, before = flatten_metrics(current), flatten_metrics(baseline)
+    regressions = []
+    for key, value in sorted(now.items()):
+        old = before.get(key)
+        if not key.endswith("_ms") or not old:
+            continue
+        change = (value - old) / old
+        print(f"  {key:<55} {old:>10.2f} -> {value:>10.2f}  ({change:+.1%})")
+        if change > threshold:
+            regressions.append((key, old, value, change))
+    return regressions
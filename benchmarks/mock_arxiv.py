@@ -0,0 +1,231 @@
+import re
+import random
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape, quoteattr
+
+from common import FaultInjector, RequestStats, use_tools_path
+
+
+# ================= 默认配置 =================
+
+DEFAULT_PAPERS = 2000  # 模拟论文库的论文数
+PAPER_INTERVAL_MINUTES = 45  # 相邻两篇论文的提交时间间隔
+
+TOPICS = [
+    ("LLM", "large language models"), ("RAG", "retrieval-augmented generation"),
+    ("diffusion", "diffusion models"), ("GAN", "generative adversarial networks"),
+    ("transformer", "transformer architectures"), ("agent", "autonomous agents"),
+    ("robot", "robot manipulation"), ("reinforcement learning", "policy optimization"),
+    ("graph", "graph neural networks"), ("speech", "speech recognition"),
+]
+METHODS = ["Efficient", "Scalable", "Robust", "Sparse", "Contrastive", "Hierarchical", "Adaptive", "Unified"]
+GOALS = ["Reasoning", "Alignment", "Compression", "Evaluation", "Pretraining", "Planning", "Benchmarking"]
+SURNAMES = ["Wang", "Li", "Zhang", "Smith", "Kumar", "Garcia", "Müller", "Tanaka", "Kim", "Rossi"]
+
+_WORD_RE = re.compile(r"[A-Za-z]+")
+
+
+# ================= 模拟论文库 =================
+
+def build_corpus(count: int = DEFAULT_PAPERS, seed: int = 0) -> list:
+    """生成确定性的论文列表（按提交时间倒序），每篇论文涉及一到两个主题"""
+    rng = random.Random(seed)
+    newest = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    papers = []
+    for i in range(count):
+        topics = rng.sample(TOPICS, rng.choice((1, 1, 2)))
+        title = f"{rng.choice(METHODS)} {rng.choice(GOALS)} for {' and '.join(t[1] for t in topics)}"
+        summary = (f"We study {topics[0][1]} ({topics[0][0]}). " +
+                   " ".join(f"Our method improves {t[1]} on standard benchmarks." for t in topics) +
+                   f" Experiments cover {rng.randint(3, 12)} datasets.")
+        published = newest - timedelta(minutes=PAPER_INTERVAL_MINUTES * i)
+        papers.append({
+            "id": f"{published:%y%m}.{90000 - i:05d}",
+            "title": title,
+            "summary": summary,
+            "authors": [f"{rng.choice('ABCDEFGHJK')}. {rng.choice(SURNAMES)}" for _ in range(rng.randint(1, 4))],
+            "published": published,
+        })
+    return papers
+
+
+def _matcher(query: str):
+    """
+    用 tools/arxiv_fetcher 的本地查询解析（与合并抓取时分发结果的逻辑一致），
+    遇到本地无法判断的语法时退回为“包含任一关键词”
+    """
+    use_tools_path()
+    from arxiv_fetcher import compile_query
+
+    match = compile_query(query)
+    if match is not None:
+        return match
+    words = [w.lower() for w in _WORD_RE.findall(query) if w not in ("AND", "OR", "ANDNOT", "all", "ti", "abs")]
+    return lambda paper: any(w in f"{paper['title']} {paper['summary']}".lower() for w in words)
+
+
+def _entry_xml(paper: dict) -> str:
+    timestamp = paper["published"].strftime("%Y-%m-%dT%H:%M:%SZ")
+    abs_url = f"http://arxiv.org/abs/{paper['id']}v1"
+    authors = "".join(f"<author><name>{escape(name)}</name></author>" for name in paper["authors"])
+    return (
+        f"<entry><id>{abs_url}</id><updated>{timestamp}</updated><published>{timestamp}</published>"
+        f"<title>{escape(paper['title'])}</title><summary>{escape(paper['summary'])}</summary>{authors}"
+        f"<link href={quoteattr(abs_url)} rel=\"alternate\" type=\"text/html\"/>"
+        f"<link title=\"pdf\" href=\"http://arxiv.org/pdf/{paper['id']}v1\" rel=\"related\" type=\"application/pdf\"/>"
+        f"<arxiv:primary_category term=\"cs.LG\" scheme=\"http://arxiv.org/schemas/atom\"/>"
+        f"<category term=\"cs.LG\" scheme=\"http://arxiv.org/schemas/atom\"/></entry>"
+    )
+
+
+def feed_xml(papers: list, total: int, start: int) -> str:
+    entries = "".join(_entry_xml(p) for p in papers)
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/" '
+        'xmlns:arxiv="http://arxiv.org/schemas/atom">'
+        '<title>ArXiv Query (mock)</title><id>http://arxiv.org/api/mock</id>'
+        f'<updated>{datetime.now(timezone.utc):%Y-%m-%dT%H:%M:%SZ}</updated>'
+        f'<opensearch:totalResults>{total}</opensearch:totalResults>'
+        f'<opensearch:startIndex>{start}</opensearch:startIndex>'
+        f'<opensearch:itemsPerPage>{len(papers)}</opensearch:itemsPerPage>'
+        f'{entries}</feed>'
+    )
+
+
+# ================= HTTP 服务 =================
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_Server"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: str, content_type: str = "application/atom+xml; charset=utf-8"):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if not url.path.rstrip("/").endswith("/query"):
+            self._send(404, "not found", "text/plain")
+            return
+
+        self.server.stats.add("query")
+        fault = self.server.faults.before_request()
+        if fault is not None:
+            self.server.stats.add(f"fault:{fault}")
+            if fault == "reset":
+                self.close_connection = True
+            else:
+                self._send(int(fault), f"模拟故障 {fault}", "text/plain")
+            return
+
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        start = int(params.get("start", 0))
+        max_results = int(params.get("max_results", 10))
+        id_list = [i for i in params.get("id_list", "").split(",") if i]
+        if id_list:
+            wanted = {re.sub(r"v\d+$", "", i) for i in id_list}
+            matches = [p for p in self.server.corpus if p["id"] in wanted]
+        else:
+            match = self.server.matcher(params.get("search_query", ""))
+            matches = [p for p in self.server.corpus if match(self.server.as_paper(p))]
+        if params.get("sortOrder") == "ascending":
+            matches = matches[::-1]
+        self._send(200, feed_xml(matches[start:start + max_results], len(matches), start))
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def matcher(self, query: str):
+        with self.matchers_lock:
+            match = self.matchers.get(query)
+            if match is None:
+                match = self.matchers[query] = _matcher(query)
+            return match
+
+    @staticmethod
+    def as_paper(paper: dict) -> dict:
+        """本地查询匹配使用的字段（与 arxiv_fetcher.to_paper_info 一致）"""
+        cached = paper.get("_fields")
+        if cached is None:
+            cached = paper["_fields"] = {"title": paper["title"], "summary": paper["summary"],
+                                         "authors": ", ".join(paper["authors"])}
+        return cached
+
+
+class MockArxivServer:
+    """
+    本地 arXiv API 模拟服务（/api/query，返回 Atom），用于离线基准测试
+    论文库是确定性生成的，支持 search_query（arXiv 查询语法）、id_list、start、max_results；
+    延迟和故障由 FaultInjector 控制
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, faults: FaultInjector = None,
+                 papers: int = DEFAULT_PAPERS, seed: int = 0):
+        self._server = _Server((host, port), _Handler)
+        self._server.faults = faults or FaultInjector()
+        self._server.stats = RequestStats()
+        self._server.corpus = build_corpus(papers, seed)
+        self._server.matchers = {}
+        self._server.matchers_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def api_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/query"
+
+    @property
+    def stats(self) -> RequestStats:
+        return self._server.stats
+
+    @property
+    def faults(self) -> FaultInjector:
+        return self._server.faults
+
+    def start(self) -> "MockArxivServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-arxiv", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# ================= 测试入口 =================
+
+if __name__ == "__main__":
+    import time
+    import argparse
+
+    parser = argparse.ArgumentParser(description="本地 arXiv API 模拟服务")
+    parser.add_argument("--port", type=int, default=8902)
+    parser.add_argument("--latency", type=float, default=0.5, help="每个请求的延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--fail-status", default="503", help="失败时的状态码，或 reset 表示直接断开")
+    parser.add_argument("--papers", type=int, default=DEFAULT_PAPERS)
+    args = parser.parse_args()
+
+    server = MockArxivServer(port=args.port, papers=args.papers,
+                             faults=FaultInjector(args.latency, args.jitter, args.fail_rate, args.fail_status))
+    server.start()
+    print(f"模拟服务已启动: {server.api_url}")
+    print(f"使用方法: ARXIV_API_URL={server.api_url} ARXIV_DELAY_SECONDS=0 python tools/worker.py")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
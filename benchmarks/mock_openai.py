@@ -0,0 +1,245 @@
+import re
+import ast
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from common import FaultInjector, RequestStats
+
+
+# ================= 默认配置 =================
+
+DEFAULT_ANSWER_TOKENS = 64  # 普通问答回复的词数
+DEFAULT_CHUNK_DELAY = 0.01  # 流式回复相邻两段之间的间隔（秒）
+CHUNK_WORDS = 4  # 流式回复每段的词数
+DEFAULT_OCR_TEXT = ("Attention Is All You Need\n\nThe dominant sequence transduction models are based on "
+                    "complex recurrent or convolutional neural networks that include an encoder and a decoder.")
+
+_FOLDERS_RE = re.compile(r"必须是 (\[.*?\]) 中的一个")
+_ITEM_RE = re.compile(r"^\s*\[(\d+)\]", re.MULTILINE)
+_DESCRIPTION_RE = re.compile(r"内容描述:\s*(.*?)\s*可选文件夹:", re.DOTALL)
+
+
+# ================= 回复生成 =================
+
+def _message_text(messages: list) -> tuple:
+    """拼接所有消息中的文本，返回 (文本, 是否包含图片)"""
+    texts, has_image = [], False
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            texts.append(content)
+            continue
+        for part in content or []:
+            if part.get("type") == "text":
+                texts.append(part.get("text", ""))
+            elif part.get("type") == "image_url":
+                has_image = True
+    return "\n".join(texts), has_image
+
+
+def _pick_folder(folders: list, description: str) -> str:
+    """选择名称出现在内容中的文件夹，都没有出现时选第一个"""
+    lower = description.lower()
+    for name in folders:
+        if name.lower() in lower:
+            return name
+    return folders[0]
+
+
+def generate_reply(body: dict, answer_tokens: int = DEFAULT_ANSWER_TOKENS, ocr_text: str = DEFAULT_OCR_TEXT) -> str:
+    """
+    按请求内容生成确定性的回复：
+    - OCR 模型或带图片的请求返回固定的识别文字
+    - choose_to_save 的分类提示词返回符合格式的 JSON（单条或数组）
+    - 其他请求返回 answer_tokens 个词的回答
+    """
+    text, has_image = _message_text(body.get("messages", []))
+    if has_image or "ocr" in body.get("model", "").lower():
+        return ocr_text
+
+    folders_match = _FOLDERS_RE.search(text)
+    if folders_match:
+        folders = ast.literal_eval(folders_match.group(1)) or ["未分类"]
+        if "JSON 数组" in text:
+            items = _ITEM_RE.findall(text)
+            lines = text.splitlines()
+            result = []
+            for index in items:
+                line = next((l for l in lines if l.strip().startswith(f"[{index}]")), "")
+                result.append({"index": int(index), "folder_name": _pick_folder(folders, line),
+                               "reason": "模拟分类"})
+            return json.dumps(result, ensure_ascii=False)
+        description = _DESCRIPTION_RE.search(text)
+        folder = _pick_folder(folders, description.group(1) if description else text)
+        return json.dumps({"folder_name": folder, "reason": "模拟分类"}, ensure_ascii=False)
+
+    words = ["token"] * max(1, min(answer_tokens, body.get("max_tokens") or answer_tokens))
+    return " ".join(f"{word}{i}" for i, word in enumerate(words))
+
+
+# ================= HTTP 服务 =================
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_Server"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _inject_fault(self, kind: str) -> bool:
+        """执行故障注入，返回是否已处理（不需要正常响应）"""
+        fault = self.server.faults.before_request()
+        if fault is None:
+            return False
+        self.server.stats.add(f"fault:{fault}")
+        if fault == "reset":
+            self.close_connection = True
+            return True
+        status = int(fault)
+        headers = {"Retry-After": "1"} if status == 429 else None
+        self._send_json(status, {"error": {"message": f"模拟故障 {status}", "type": kind}}, headers)
+        return True
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self.server.stats.add("models")
+            self._send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+            return
+        self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        self.server.stats.add("chat")
+        if self._inject_fault("server_error"):
+            return
+
+        reply = generate_reply(body, self.server.answer_tokens, self.server.ocr_text)
+        model = body.get("model", "mock")
+        created = int(time.time())
+        if body.get("stream"):
+            self._stream(reply, model, created)
+            return
+
+        words = len(reply.split())
+        self._send_json(200, {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": length // 4, "completion_tokens": words,
+                      "total_tokens": length // 4 + words},
+        })
+
+    def _stream(self, reply: str, model: str, created: int):
+        """按 Server-Sent Events 逐段返回，段间等待 chunk_delay"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(delta: dict, finish_reason=None):
+            chunk = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created,
+                     "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        words = reply.split(" ")
+        event({"role": "assistant", "content": ""})
+        for i in range(0, len(words), CHUNK_WORDS):
+            if i:
+                time.sleep(self.server.chunk_delay)
+            piece = " ".join(words[i:i + CHUNK_WORDS])
+            event({"content": piece if i == 0 else " " + piece})
+        event({}, "stop")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class MockOpenAIServer:
+    """
+    本地 OpenAI 兼容服务（/chat/completions，支持流式），用于离线基准测试
+    回复内容确定，延迟和故障由 FaultInjector 控制，收到的请求按类型计数
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, faults: FaultInjector = None,
+                 answer_tokens: int = DEFAULT_ANSWER_TOKENS, chunk_delay: float = DEFAULT_CHUNK_DELAY,
+                 ocr_text: str = DEFAULT_OCR_TEXT):
+        self._server = _Server((host, port), _Handler)
+        self._server.faults = faults or FaultInjector()
+        self._server.stats = RequestStats()
+        self._server.answer_tokens = answer_tokens
+        self._server.chunk_delay = chunk_delay
+        self._server.ocr_text = ocr_text
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    @property
+    def stats(self) -> RequestStats:
+        return self._server.stats
+
+    @property
+    def faults(self) -> FaultInjector:
+        return self._server.faults
+
+    def start(self) -> "MockOpenAIServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# ================= 测试入口 =================
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容模拟服务")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--latency", type=float, default=0.2, help="每个请求的延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--fail-status", default="500", help="失败时的状态码，或 reset 表示直接断开")
+    parser.add_argument("--chunk-delay", type=float, default=DEFAULT_CHUNK_DELAY)
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(port=args.port, chunk_delay=args.chunk_delay,
+                              faults=FaultInjector(args.latency, args.jitter, args.fail_rate, args.fail_status))
+    server.start()
+    print(f"模拟服务已启动: {server.base_url}")
+    print(f"使用方法: SILICONFLOW_BASE_URL={server.base_url} SILICONFLOW_API_KEY=mock python tools/worker.py")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
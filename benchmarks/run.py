@@ -0,0 +1,390 @@
+"""
+离线端到端基准测试
+
+启动本地 OpenAI 兼容模拟服务和 arXiv 模拟服务，在临时数据目录（YANZHI_APP_DIR）中运行 tools/ 的真实代码，
+结果写入 benchmarks/results/<时间>.json（同时更新 latest.json），可与之前的结果对比。
+
+用法:
+    python benchmarks/run.py                                # 运行全部
+    python benchmarks/run.py --only ask,pdf_text            # 只运行部分
+    python benchmarks/run.py --latency 0.3 --fail-rate 0.2  # 模拟慢速、不稳定的服务商
+    python benchmarks/run.py --compare benchmarks/results/latest.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import contextlib
+import subprocess
+from collections import OrderedDict
+
+from common import (TOOLS_DIR, FaultInjector, Timer, compare, git_commit, summarize, use_tools_path,
+                    write_results)
+from mock_arxiv import MockArxivServer
+from mock_openai import MockOpenAIServer
+
+
+SAMPLE_KEYWORDS = ["LLM", "RAG", "diffusion", "GAN", "transformer", "agent", "robot", "reinforcement learning"]
+SAMPLE_FOLDERS = {
+    "GAN": "生成对抗网络（GAN）相关的论文、图片和笔记，包括生成器、判别器和训练技巧",
+    "Diffusion": "扩散模型（Diffusion）相关内容，包括去噪、采样加速和图像生成",
+    "LLM": "大语言模型（LLM）相关内容，包括预训练、指令微调、推理和对齐",
+    "RAG": "检索增强生成（RAG）相关内容，包括向量检索、重排和知识库问答",
+    "Robotics": "机器人（Robotics）相关内容，包括操作、导航和强化学习控制",
+}
+
+
+# ================= 运行环境 =================
+
+class BenchContext:
+    """一次基准测试运行的共享状态：模拟服务、临时数据目录和参数"""
+
+    def __init__(self, args):
+        self.args = args
+        self.app_dir = tempfile.mkdtemp(prefix="yanzhi-bench-")
+        self.primary = MockOpenAIServer(
+            faults=FaultInjector(args.latency, args.jitter, args.fail_rate, args.fail_status, seed=1),
+            answer_tokens=args.answer_tokens, chunk_delay=args.chunk_delay).start()
+        # 备用服务商不注入故障，用于观察故障切换
+        self.secondary = MockOpenAIServer(
+            faults=FaultInjector(args.latency, args.jitter, seed=2),
+            answer_tokens=args.answer_tokens, chunk_delay=args.chunk_delay).start()
+        self.arxiv = MockArxivServer(
+            faults=FaultInjector(args.arxiv_latency, 0.0, args.arxiv_fail_rate, "503", seed=3),
+            papers=args.arxiv_papers).start()
+
+    def environ(self) -> dict:
+        """指向模拟服务和临时目录的环境变量（必须在 import tools 模块之前设置）"""
+        return {
+            "YANZHI_APP_DIR": self.app_dir,
+            "SILICONFLOW_API_KEY": "mock-key",
+            "SILICONFLOW_BASE_URL": self.primary.base_url,
+            "GITHUB_TOKEN": "mock-key",
+            "GITHUB_MODELS_BASE_URL": self.secondary.base_url,
+            "ARXIV_API_URL": self.arxiv.api_url,
+            "ARXIV_DELAY_SECONDS": str(self.args.arxiv_delay),
+            "AI_CACHE_ENABLED": "0",  # 测量真实往返，不命中响应缓存
+        }
+
+    def close(self):
+        for server in (self.primary, self.secondary, self.arxiv):
+            server.stop()
+        shutil.rmtree(self.app_dir, ignore_errors=True)
+
+
+@contextlib.contextmanager
+def quiet(enabled: bool):
+    """屏蔽 tools 模块的 print 诊断输出"""
+    if not enabled:
+        yield
+        return
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+# ================= 基准测试 =================
+
+def bench_cold_start(ctx: BenchContext) -> dict:
+    """worker 冷启动：启动进程到 ready 通知、到第一次 ping 返回的时间，以及 import ask_ai 的耗时"""
+    ready, first_ping, imports = [], [], []
+    worker_path = os.path.join(TOOLS_DIR, "worker.py")
+    for _ in range(ctx.args.cold_runs):
+        with Timer() as total:
+            process = subprocess.Popen([sys.executable, "-u", worker_path], cwd=TOOLS_DIR, env=os.environ.copy(),
+                                       stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                       text=True, encoding="utf-8")
+            for line in process.stdout:
+                if json.loads(line).get("method") == "ready":
+                    ready.append(time.perf_counter() - total.start)
+                    break
+            process.stdin.write(json.dumps({"jsonrpc": "2.0", "id": 1, "method": "ping"}) + "\n")
+            process.stdin.flush()
+            for line in process.stdout:
+                if json.loads(line).get("id") == 1:
+                    break
+        first_ping.append(total.elapsed)
+        process.stdin.close()
+        process.wait(timeout=30)
+
+        code = "import time; t = time.perf_counter(); import ask_ai; print(time.perf_counter() - t)"
+        result = subprocess.run([sys.executable, "-c", code], cwd=TOOLS_DIR, env=os.environ.copy(),
+                                capture_output=True, text=True, timeout=60)
+        imports.append(float(result.stdout.strip().splitlines()[-1]))
+
+    return {"ready": summarize(ready), "first_ping": summarize(first_ping), "import_ask_ai": summarize(imports)}
+
+
+def bench_ask(ctx: BenchContext) -> dict:
+    """ask_ai 往返：普通请求和流式请求（首段、完整）的耗时，以及故障切换次数"""
+    from ask_ai import AIClient
+
+    client = AIClient()
+    client.ask(text="预热", temperature=0.7, max_tokens=8)
+    before = ctx.primary.stats.snapshot(), ctx.secondary.stats.snapshot()
+
+    samples, errors = [], 0
+    for i in range(ctx.args.repeat):
+        with Timer() as t:
+            try:
+                client.ask(text=f"请解释第 {i} 个概念", temperature=0.7, max_tokens=ctx.args.answer_tokens)
+            except Exception:
+                errors += 1
+                continue
+        samples.append(t.elapsed)
+
+    first_chunk, full = [], []
+    for i in range(max(1, ctx.args.repeat // 2)):
+        with Timer() as t:
+            try:
+                for n, _ in enumerate(client.ask_stream(text=f"流式问题 {i}", temperature=0.7,
+                                                        max_tokens=ctx.args.answer_tokens)):
+                    if n == 0:
+                        first_chunk.append(time.perf_counter() - t.start)
+            except Exception:
+                errors += 1
+                continue
+        full.append(t.elapsed)
+
+    primary, secondary = ctx.primary.stats.snapshot(), ctx.secondary.stats.snapshot()
+    return {
+        "ask": summarize(samples),
+        "stream_first_chunk": summarize(first_chunk),
+        "stream_full": summarize(full),
+        "overhead_p50_ms": round((summarize(samples).get("p50_ms") or 0) - ctx.args.latency * 1000, 2),
+        "errors": errors,
+        "primary_requests": primary.get("chat", 0) - before[0].get("chat", 0),
+        "secondary_requests": secondary.get("chat", 0) - before[1].get("chat", 0),
+        "injected_faults": sum(n for k, n in primary.items() if k.startswith("fault:"))
+                           - sum(n for k, n in before[0].items() if k.startswith("fault:")),
+    }
+
+
+def _make_pdf(path: str, pages: int, scanned: bool):
+    """生成测试 PDF：文字版每页约 40 行文本；扫描版把文字页渲染为图片后插入（没有文本层）"""
+    import fitz
+
+    text = "\n".join(f"Line {i}: Transformers use self-attention to model long-range dependencies."
+                     for i in range(40))
+    source = fitz.open()
+    for n in range(pages):
+        page = source.new_page()
+        page.insert_text((48, 56), f"Page {n + 1}\n{text}", fontsize=9)
+    if not scanned:
+        source.save(path)
+        return
+
+    scan = fitz.open()
+    for page in source:
+        pixmap = page.get_pixmap(dpi=150, colorspace=fitz.csGRAY)
+        scan.new_page(width=page.rect.width, height=page.rect.height).insert_image(page.rect, pixmap=pixmap)
+    scan.save(path)
+
+
+def _bench_pdf(ctx: BenchContext, scanned: bool, pages: int) -> dict:
+    import pdf_reader
+    from ask_ai import SILICONFLOW_ENDPOINT
+
+    # 模拟服务地址沿用 SiliconFlow 的 OCR 并发上限，与线上行为一致
+    pdf_reader.PROVIDER_CONCURRENCY.setdefault(ctx.primary.base_url,
+                                               pdf_reader.PROVIDER_CONCURRENCY[SILICONFLOW_ENDPOINT])
+    path = os.path.join(ctx.app_dir, f"bench_{'scanned' if scanned else 'text'}.pdf")
+    _make_pdf(path, pages, scanned)
+
+    reader = pdf_reader.PdfReader()
+    samples = []
+    for _ in range(ctx.args.pdf_runs):
+        with Timer() as t:
+            result = reader.read(path)
+        samples.append(t.elapsed)
+    stats = summarize(samples)
+    return {"pages": result["total_pages"], "read": stats,
+            "pages_per_second": round(pages / (stats["p50_ms"] / 1000), 2)}
+
+
+def bench_pdf_text(ctx: BenchContext) -> dict:
+    """文字版 PDF 提取（只读文本层）"""
+    return _bench_pdf(ctx, scanned=False, pages=ctx.args.pdf_pages)
+
+
+def bench_pdf_scanned(ctx: BenchContext) -> dict:
+    """扫描版 PDF 提取（逐页渲染并请求模拟 OCR 服务）"""
+    return _bench_pdf(ctx, scanned=True, pages=ctx.args.scanned_pages)
+
+
+def bench_save_content(ctx: BenchContext) -> dict:
+    """save_content 分类保存：逐条保存和 save_many 批量保存的耗时，以及实际调用 LLM 的次数"""
+    from choose_to_save import ContentManager, InputType
+    from folder_registry import get_folder_registry
+
+    registry = get_folder_registry()
+    knowledge_dir = os.path.join(ctx.app_dir, "knowledge")
+    for name, description in SAMPLE_FOLDERS.items():
+        os.makedirs(os.path.join(knowledge_dir, name), exist_ok=True)
+        registry.add(name, os.path.join(knowledge_dir, name), description)
+
+    # 每三条中有一条主题不明确，本地路由无法判断，需要调用 LLM 分类
+    names = list(SAMPLE_FOLDERS)
+    texts = [f"会议记录 {i}：讨论了下周的实验安排和分工。" if i % 3 == 2 else
+             f"关于 {names[i % len(names)]} 的笔记 {i}：{SAMPLE_FOLDERS[names[i % len(names)]][:30]}，记录实验结果。"
+             for i in range(ctx.args.repeat)]
+
+    manager = ContentManager()
+    chat_before = ctx.primary.stats.total("chat") + ctx.secondary.stats.total("chat")
+    single = []
+    for text in texts:
+        with Timer() as t:
+            manager.save_content(InputType.TEXT, text)
+        single.append(t.elapsed)
+    chat_single = ctx.primary.stats.total("chat") + ctx.secondary.stats.total("chat") - chat_before
+
+    with Timer() as batch:
+        results = manager.save_many([{"type": InputType.TEXT, "content": text} for text in texts])
+    chat_batch = ctx.primary.stats.total("chat") + ctx.secondary.stats.total("chat") - chat_before - chat_single
+
+    return {
+        "items": len(texts),
+        "save_content": summarize(single),
+        "save_many_total_ms": round(batch.elapsed * 1000, 2),
+        "save_many_per_item_ms": round(batch.elapsed * 1000 / len(texts), 2),
+        "saved": sum(1 for r in results if r),
+        "llm_calls_single": chat_single,
+        "llm_calls_batch": chat_batch,
+    }
+
+
+def bench_scheduled_search(ctx: BenchContext) -> dict:
+    """
+    定时搜索吞吐：多个订阅关键词同时触发（与 Electron 端同一分钟内的多个定时任务一致），
+    记录首次抓取和增量抓取的总耗时、对 arXiv 发出的请求数，以及合并查询翻到上限后单独补抓的关键词数
+    """
+    from arxiv_fetcher import get_fetcher
+    from research_article import ArxivRecommender
+
+    keywords = SAMPLE_KEYWORDS[:ctx.args.keywords]
+    recommender = ArxivRecommender(max_results=5)
+
+    def run_round() -> dict:
+        requests_before = ctx.arxiv.stats.total("query")
+        fallbacks_before = get_fetcher().fallbacks
+        results = {}
+
+        def search(keyword):
+            results[keyword] = recommender.search(keyword, max_age=0)
+
+        with Timer() as t:
+            threads = [threading.Thread(target=search, args=(k,)) for k in keywords]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return {
+            "wall_ms": round(t.elapsed * 1000, 2),
+            "keywords_per_second": round(len(keywords) / t.elapsed, 2),
+            "arxiv_requests": ctx.arxiv.stats.total("query") - requests_before,
+            "single_fallbacks": get_fetcher().fallbacks - fallbacks_before,
+            "papers": sum(len(r["papers"]) for r in results.values()),
+        }
+
+    return {"keywords": len(keywords), "first_fetch": run_round(), "incremental": run_round()}
+
+
+BENCHMARKS = OrderedDict([
+    ("cold_start", bench_cold_start),
+    ("ask", bench_ask),
+    ("pdf_text", bench_pdf_text),
+    ("pdf_scanned", bench_pdf_scanned),
+    ("save_content", bench_save_content),
+    ("scheduled_search", bench_scheduled_search),
+])
+
+
+# ================= 入口 =================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="离线端到端基准测试")
+    parser.add_argument("--only", help=f"逗号分隔的测试名: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--repeat", type=int, default=20, help="问答、保存等测试的重复次数")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟 AI 服务的延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="首选 AI 服务商的故障率")
+    parser.add_argument("--fail-status", default="500", help="故障时的状态码，或 reset 表示直接断开")
+    parser.add_argument("--chunk-delay", type=float, default=0.01, help="流式回复每段的间隔（秒）")
+    parser.add_argument("--answer-tokens", type=int, default=64)
+    parser.add_argument("--arxiv-latency", type=float, default=0.2)
+    parser.add_argument("--arxiv-fail-rate", type=float, default=0.0)
+    parser.add_argument("--arxiv-delay", type=float, default=0.0,
+                        help="arXiv 请求间隔（线上为 3 秒，默认 0 以便快速运行；请求数不受影响）")
+    parser.add_argument("--arxiv-papers", type=int, default=2000)
+    parser.add_argument("--keywords", type=int, default=len(SAMPLE_KEYWORDS), help="定时搜索的关键词数")
+    parser.add_argument("--cold-runs", type=int, default=3)
+    parser.add_argument("--pdf-pages", type=int, default=40)
+    parser.add_argument("--scanned-pages", type=int, default=8)
+    parser.add_argument("--pdf-runs", type=int, default=3)
+    parser.add_argument("--output", help="结果文件路径（默认 benchmarks/results/<时间>.json）")
+    parser.add_argument("--compare", help="与之前的结果文件对比耗时指标")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="对比时耗时增加超过该比例视为退化，退出码为 1")
+    parser.add_argument("--verbose", action="store_true", help="显示 tools 模块的诊断输出")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    selected = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = [name for name in selected if name not in BENCHMARKS]
+    if unknown:
+        print(f"未知的测试: {', '.join(unknown)}")
+        return 2
+
+    ctx = BenchContext(args)
+    os.environ.update(ctx.environ())
+    use_tools_path()
+
+    results = {
+        "version": 1,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items()
+                   if key not in ("only", "output", "compare", "verbose")},
+        "benchmarks": {},
+    }
+    try:
+        for name in selected:
+            print(f"▶ {name} ...", flush=True)
+            try:
+                with quiet(not args.verbose), Timer() as t:
+                    results["benchmarks"][name] = BENCHMARKS[name](ctx)
+                print(f"  完成，用时 {t.elapsed:.1f}s")
+            except Exception as e:
+                results["benchmarks"][name] = {"error": f"{type(e).__name__}: {e}"}
+                print(f"  ❌ 失败: {e}")
+        # 各阶段的追踪汇总（worker 子进程的记录也写在同一个临时数据目录下）
+        from tracing import read_spans, summarize as summarize_spans
+        results["stages"] = summarize_spans(read_spans())
+    finally:
+        ctx.close()
+
+    path = write_results(results, args.output)
+    print(json.dumps(results["benchmarks"], ensure_ascii=False, indent=2))
+    print(f"结果已写入: {path}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"与 {args.compare} 对比:")
+        regressions = compare(results, baseline, args.max_regression)
+        if regressions:
+            print(f"⚠️ {len(regressions)} 个指标变慢超过 {args.max_regression:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
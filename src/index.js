@@ -23,6 +23,7 @@ let keyboardManagerProcess = null;  // keyboard_manager.exe 进程
 let folderWatcher = null;  // 文件夹监听器
 let watchedFolderPath = null;  // 当前监听的文件夹路径
 let watchDebounceTimer = null;  // 防抖定时器
+let watchChangedPaths = new Set();  // 防抖期间累积的变化路径，交给增量索引
 let scheduleCheckInterval = null;  // 定时检查器
 let lastCheckedMinute = -1;  // 上次检查的分钟，避免重复触发
 
@@ -119,6 +120,238 @@ function stopKeyboardManager() {
   return { success: true, message: '未在运行' };
 }
 
+// ================= Python 常驻 Worker =================
+
+let pythonWorker = null;  // tools/worker.py 进程
+let workerStdoutBuffer = '';  // 未完成的 stdout 行
+let workerRequestId = 0;  // 自增请求 ID
+const workerPending = new Map();  // 请求 ID -> { resolve, reject, timer, onEvent }
+const jobWaiters = new Map();  // 任务 ID -> { onUpdate, settle }，runJob 等待结束的任务
+const finishedJobs = new Map();  // 任务 ID -> 结束时的状态（结束通知先于 job.submit 的响应到达时暂存）
+const FINISHED_JOBS_LIMIT = 50;
+const JOB_FINAL_STATUSES = ['done', 'failed', 'cancelled'];
+
+/**
+ * 启动 Python worker（已运行时直接返回）
+ * worker 常驻内存，复用已导入的模块和已初始化的 AIClient / ContentManager / ArxivRecommender
+ */
+function startPythonWorker() {
+  if (pythonWorker) {
+    return pythonWorker;
+  }
+
+  const toolsDir = path.join(__dirname, '..', 'tools');
+  console.log('🚀 启动 Python worker...');
+
+  const proc = spawn('python', [path.join(toolsDir, 'worker.py')], {
+    cwd: toolsDir,
+    stdio: ['pipe', 'pipe', 'pipe'],
+    windowsHide: true,
+    env: {
+      ...process.env,
+      PYTHONIOENCODING: 'utf-8',
+      PYTHONUTF8: '1',
+    },
+  });
+  pythonWorker = proc;
+  workerStdoutBuffer = '';
+
+  proc.stdout.on('data', (data) => {
+    workerStdoutBuffer += data.toString('utf-8');
+    let newlineIndex;
+    while ((newlineIndex = workerStdoutBuffer.indexOf('\n')) >= 0) {
+      const line = workerStdoutBuffer.slice(0, newlineIndex).trim();
+      workerStdoutBuffer = workerStdoutBuffer.slice(newlineIndex + 1);
+      if (line) handleWorkerMessage(line);
+    }
+  });
+
+  proc.stderr.on('data', (data) => {
+    const text = data.toString('utf-8').trim();
+    if (text) console.log(`[Worker] ${text}`);
+  });
+
+  const onExit = (reason) => {
+    if (pythonWorker !== proc) return;
+    pythonWorker = null;
+    // 进程退出时拒绝所有未完成的请求
+    for (const [id, pending] of workerPending) {
+      clearTimeout(pending.timer);
+      pending.reject(new Error(reason));
+    }
+    workerPending.clear();
+    // 任务本身已持久化，worker 下次启动时会继续执行，这里只结束本次等待
+    for (const [id, waiter] of jobWaiters) {
+      waiter.settle({ id, status: 'failed', error: reason });
+    }
+    jobWaiters.clear();
+  };
+
+  proc.on('close', (code) => {
+    console.log(`[Worker] 进程退出，退出码: ${code}`);
+    onExit(`Python worker 已退出 (code ${code})`);
+  });
+
+  proc.on('error', (err) => {
+    console.error('[Worker] 启动失败:', err);
+    onExit(err.message);
+  });
+
+  return proc;
+}
+
+/**
+ * 停止 Python worker
+ */
+function stopPythonWorker() {
+  if (pythonWorker) {
+    console.log('🛑 停止 Python worker...');
+    const proc = pythonWorker;
+    pythonWorker = null;
+    try {
+      proc.stdin.end();
+      proc.kill();
+    } catch (err) {
+      // 进程可能已经退出，忽略错误
+    }
+  }
+}
+
+/**
+ * 处理 worker 输出的一行 JSON 消息
+ */
+function handleWorkerMessage(line) {
+  let message;
+  try {
+    message = JSON.parse(line);
+  } catch (e) {
+    console.log(`[Worker] ${line}`);
+    return;
+  }
+
+  if (message.id === undefined || message.id === null) {
+    if (message.method === 'ready') {
+      console.log('✅ Python worker 已就绪，PID:', message.params && message.params.pid);
+      return;
+    }
+    if (message.method === 'job.update') {
+      handleJobUpdate(message.params);
+      return;
+    }
+    if (message.method === 'folders.changed') {
+      // 文件夹注册表有变化（新建、修改或其他进程写入），通知渲染进程刷新文件夹列表
+      if (mainWindow && !mainWindow.isDestroyed()) {
+        mainWindow.webContents.send('folder:configChanged', message.params);
+      }
+      return;
+    }
+    // 请求处理中的增量通知（例如 ai.chunk），转交给对应请求的回调
+    const target = message.params && workerPending.get(message.params.id);
+    if (target && target.onEvent) {
+      target.onEvent(message.method, message.params);
+    }
+    return;
+  }
+
+  const pending = workerPending.get(message.id);
+  if (!pending) return;
+
+  workerPending.delete(message.id);
+  clearTimeout(pending.timer);
+  if (message.error) {
+    pending.reject(new Error(message.error.message || '未知错误'));
+  } else {
+    pending.resolve(message.result);
+  }
+}
+
+/**
+ * 处理后台任务的状态通知：转发给渲染进程，并结束 runJob 中对应的等待
+ */
+function handleJobUpdate(job) {
+  if (mainWindow && !mainWindow.isDestroyed()) {
+    mainWindow.webContents.send('job:update', job);
+  }
+
+  const waiter = jobWaiters.get(job.id);
+  if (waiter && waiter.onUpdate) {
+    waiter.onUpdate(job);
+  }
+  if (!JOB_FINAL_STATUSES.includes(job.status)) return;
+
+  if (waiter) {
+    jobWaiters.delete(job.id);
+    waiter.settle(job);
+  } else {
+    finishedJobs.set(job.id, job);
+    if (finishedJobs.size > FINISHED_JOBS_LIMIT) {
+      finishedJobs.delete(finishedJobs.keys().next().value);
+    }
+  }
+}
+
+/**
+ * 以后台任务执行耗时操作并等待结束（不设超时，可通过 job:cancel 取消）
+ * @param {string} kind 任务类型，例如 'pdf.read'
+ * @param {object} params 任务参数
+ * @param {function} onUpdate 任务状态或进度变化时的回调 (job)
+ * @returns {Promise<any>} 任务结果
+ */
+async function runJob(kind, params = {}, onUpdate = null) {
+  const { job } = await callWorker('job.submit', { kind, params }, 10000);
+  return new Promise((resolve, reject) => {
+    const settle = (final) => {
+      if (final.status === 'done') {
+        resolve(final.result);
+      } else if (final.status === 'cancelled') {
+        reject(new Error('任务已取消'));
+      } else {
+        reject(new Error(final.error || '任务失败'));
+      }
+    };
+
+    const finished = finishedJobs.get(job.id);
+    if (finished) {
+      finishedJobs.delete(job.id);
+      settle(finished);
+      return;
+    }
+    jobWaiters.set(job.id, { onUpdate, settle });
+  });
+}
+
+/**
+ * 向 worker 发送一个 JSON-RPC 请求
+ * @param {string} method 方法名，例如 'ai.ask'
+ * @param {object} params 参数
+ * @param {number} timeoutMs 超时时间（毫秒），0 表示不超时；超时只放弃本次请求，不会杀掉 worker
+ * @param {function} onEvent 请求完成前收到增量通知时的回调 (method, params)
+ * @returns {Promise<any>} 请求结果
+ */
+function callWorker(method, params = {}, timeoutMs = 0, onEvent = null) {
+  return new Promise((resolve, reject) => {
+    let proc;
+    try {
+      proc = startPythonWorker();
+    } catch (err) {
+      reject(err);
+      return;
+    }
+
+    const id = ++workerRequestId;
+    let timer = null;
+    if (timeoutMs > 0) {
+      timer = setTimeout(() => {
+        workerPending.delete(id);
+        reject(new Error('操作超时'));
+      }, timeoutMs);
+    }
+    workerPending.set(id, { resolve, reject, timer, onEvent });
+
+    proc.stdin.write(JSON.stringify({ jsonrpc: '2.0', id, method, params }) + '\n', 'utf-8');
+  });
+}
+
 const createWindow = () => {
   // Create the browser window.
   mainWindow = new BrowserWindow({
@@ -143,7 +376,10 @@ const createWindow = () => {
 // Some APIs can only be used after this event occurs.
 app.whenReady().then(() => {
   createWindow();
-  
+
+  // 预热 Python worker，首次点击时无需再等待解释器启动
+  startPythonWorker();
+
   // 启动定时推荐检查器
   startScheduleChecker();
 
@@ -165,25 +401,29 @@ app.on('window-all-closed', () => {
   }
 });
 
-// 应用退出时停止 keyboard_manager
+// 应用退出时停止 keyboard_manager 和 Python worker
 app.on('will-quit', () => {
   stopKeyboardManager();
+  stopPythonWorker();
 });
 
 app.on('before-quit', () => {
   stopKeyboardManager();
+  stopPythonWorker();
 });
 
 // 处理进程信号（Ctrl+C 等）
 process.on('SIGINT', () => {
   console.log('\n收到 SIGINT 信号，正在清理...');
   stopKeyboardManager();
+  stopPythonWorker();
   app.quit();
 });
 
 process.on('SIGTERM', () => {
   console.log('收到 SIGTERM 信号，正在清理...');
   stopKeyboardManager();
+  stopPythonWorker();
   app.quit();
 });
 
@@ -191,6 +431,7 @@ process.on('SIGTERM', () => {
 if (process.platform === 'win32') {
   process.on('SIGHUP', () => {
     stopKeyboardManager();
+    stopPythonWorker();
     app.quit();
   });
 }
@@ -255,10 +496,21 @@ ipcMain.handle('folder:watch', async (event, folderPath) => {
     }
     
     watchedFolderPath = folderPath;
+    watchChangedPaths = new Set();
+    
+    // 开始监听时先做一次增量扫描，补上程序未运行期间的修改
+    callWorker('index.sync', {}).catch((err) => {
+      console.error('[Index] 增量扫描失败:', err.message);
+    });
     
     // 使用 fs.watch 监听文件夹（递归监听）
     folderWatcher = fs.watch(folderPath, { recursive: true }, (eventType, filename) => {
+      // 笔记日志和索引（笔记/.notes/）只由 worker 写入，不需要刷新界面或重新索引
+      if (filename && filename.toString().split(/[\\/]/).includes('.notes')) return;
       console.log(`[FileWatch] ${eventType}: ${filename}`);
+      if (filename) {
+        watchChangedPaths.add(path.join(folderPath, filename.toString()));
+      }
       
       // 防抖处理，避免频繁触发
       if (watchDebounceTimer) {
@@ -274,6 +526,15 @@ ipcMain.handle('folder:watch', async (event, folderPath) => {
             folderPath: watchedFolderPath
           });
         }
+        
+        // 只把变化的文件交给 worker 增量索引
+        const changed = Array.from(watchChangedPaths);
+        watchChangedPaths.clear();
+        if (changed.length > 0) {
+          callWorker('index.update', { paths: changed }).catch((err) => {
+            console.error('[Index] 增量索引失败:', err.message);
+          });
+        }
       }, 500);  // 500ms 防抖
     });
     
@@ -315,95 +576,61 @@ function getFileType(filename) {
 }
 
 // 创建子文件夹（调用 Python choose_to_save）
-ipcMain.handle('folder:create', async (event, folderName, basePath) => {
-  return new Promise((resolve) => {
-    const toolsDir = path.join(__dirname, '..', 'tools');
-    
-    // 转义文件夹名和路径中的特殊字符
-    const safeFolderName = folderName.replace(/'/g, "\\'").replace(/"/g, '\\"');
-    const safeBasePath = basePath.replace(/\\/g, '/').replace(/'/g, "\\'");
-    
-    // 使用 Python 调用 create_folder 方法
-    const pythonCode = `
-import sys
-import json
-sys.path.insert(0, r'${toolsDir.replace(/\\/g, '/')}')
-
-try:
-    from choose_to_save import ContentManager
-    manager = ContentManager()
-    result = manager.create_folder('${safeFolderName}', r'${safeBasePath}')
-    
-    if result:
-        # 获取刚创建的文件夹的描述
-        description = ""
-        for folder in manager.folder_config.get("folders", []):
-            if folder["name"] == '${safeFolderName}':
-                description = folder.get("description", "")
-                break
-        
-        output = {"success": True, "path": result, "description": description}
-        print("RESULT_JSON:" + json.dumps(output, ensure_ascii=False))
-    else:
-        print("RESULT_JSON:" + json.dumps({"success": False, "error": "创建失败"}))
-except Exception as e:
-    print("RESULT_JSON:" + json.dumps({"success": False, "error": str(e)}, ensure_ascii=False))
-`;
-    
-    console.log('[CreateFolder] 开始创建文件夹:', folderName, '在', basePath);
-    
-    const proc = spawn('python', ['-c', pythonCode], {
-      cwd: toolsDir,
-      env: {
-        ...process.env,
-        PYTHONIOENCODING: 'utf-8',
-        PYTHONUTF8: '1',
-      },
-    });
-    
-    let stdout = '';
-    let stderr = '';
-    
-    // 设置超时（30秒，因为需要 AI 生成描述）
-    const timeout = setTimeout(() => {
-      proc.kill();
-      resolve({ success: false, error: '操作超时' });
-    }, 30000);
-    
-    proc.stdout.on('data', (data) => {
-      stdout += data.toString('utf-8');
-      console.log(`[CreateFolder] ${data.toString('utf-8').trim()}`);
-    });
-    
-    proc.stderr.on('data', (data) => {
-      stderr += data.toString('utf-8');
-      console.error(`[CreateFolder Error] ${data.toString('utf-8').trim()}`);
-    });
-    
-    proc.on('close', (code) => {
-      clearTimeout(timeout);
-      
-      // 解析 JSON 结果
-      if (stdout.includes('RESULT_JSON:')) {
-        try {
-          const jsonStr = stdout.split('RESULT_JSON:')[1].split('\n')[0].trim();
-          const result = JSON.parse(jsonStr);
-          resolve(result);
-        } catch (e) {
-          console.error('[CreateFolder] JSON 解析失败:', e);
-          resolve({ success: false, error: '结果解析失败: ' + e.message });
-        }
-      } else {
-        resolve({ success: false, error: stderr || stdout || '未知错误' });
-      }
-    });
-    
-    proc.on('error', (err) => {
-      clearTimeout(timeout);
-      console.error('[CreateFolder] 进程错误:', err);
-      resolve({ success: false, error: err.message });
+ipcMain.handle('folder:create', async (event, folderName, basePath, parent) => {
+  console.log('[CreateFolder] 开始创建文件夹:', folderName, '在', basePath);
+  try {
+    // 需要 AI 生成描述，以后台任务执行，不设超时
+    const result = await runJob('folder.create', {
+      name: folderName,
+      base_path: basePath ? basePath.replace(/\\/g, '/') : null,
+      parent: parent || null,
     });
-  });
+    return { success: true, path: result.path, description: result.description };
+  } catch (err) {
+    console.error('[CreateFolder] 创建失败:', err);
+    return { success: false, error: err.message };
+  }
+});
+
+// 列出知识库文件夹配置
+ipcMain.handle('folder:list', async () => {
+  try {
+    const result = await callWorker('folder.list', {});
+    return { success: true, folders: result.folders, version: result.version };
+  } catch (err) {
+    return { success: false, error: err.message };
+  }
+});
+
+// 批量获取图片缩略图路径（文件夹视图显示图片网格时使用，不需要加载原图）
+ipcMain.handle('folder:thumbnails', async (event, imagePaths) => {
+  try {
+    const result = await callWorker('images.thumbnails', { paths: imagePaths });
+    return { success: true, thumbnails: result.thumbnails };
+  } catch (err) {
+    return { success: false, error: err.message };
+  }
+});
+
+// 读取文件夹最近的笔记条目（新的在前），before 为上一页最早条目的 id；
+// folderPath 为知识库文件夹路径（可选，不传时按名称在注册表中查找）
+ipcMain.handle('notes:recent', async (event, folderName, limit, before, folderPath) => {
+  try {
+    const result = await callWorker('notes.recent', { folder: folderName, limit, before, path: folderPath });
+    return { success: true, ...result };
+  } catch (err) {
+    return { success: false, error: err.message };
+  }
+});
+
+// 按 id 读取一条笔记
+ipcMain.handle('notes:get', async (event, folderName, id, folderPath) => {
+  try {
+    const result = await callWorker('notes.get', { folder: folderName, id, path: folderPath });
+    return { success: true, note: result.note };
+  } catch (err) {
+    return { success: false, error: err.message };
+  }
 });
 
 // 读取文件内容
@@ -423,218 +650,92 @@ ipcMain.handle('file:read', async (event, filePath) => {
 
 // 读取 PDF 文件内容（使用 OCR）
 ipcMain.handle('file:readPdf', async (event, filePath) => {
-  return new Promise((resolve) => {
-    const toolsDir = path.join(__dirname, '..', 'tools');
-    
-    // 转义文件路径
-    const safeFilePath = filePath.replace(/\\/g, '/').replace(/'/g, "\\'");
-    
-    // 使用 Python 调用 OCR 读取 PDF
-    const pythonCode = `
-import sys
-import os
-sys.path.insert(0, r'${toolsDir.replace(/\\/g, '/')}')
-
-try:
-    import fitz  # PyMuPDF
-    from PIL import Image
-    import io
-    from ask_ai import AIClient
-    
-    pdf_path = r'${safeFilePath}'
-    print(f"[Python] 正在读取 PDF: {pdf_path}", file=sys.stderr)
-    
-    if not os.path.exists(pdf_path):
-        print('PDF_ERROR:文件不存在')
-        sys.exit(1)
-    
-    # 打开 PDF
-    doc = fitz.open(pdf_path)
-    total_pages = len(doc)
-    print(f"[Python] PDF 共 {total_pages} 页", file=sys.stderr)
-    
-    all_text = []
-    max_pages = min(5, total_pages)  # 最多处理前5页
-    
-    for page_num in range(max_pages):
-        page = doc[page_num]
-        print(f"[Python] 正在处理第 {page_num + 1} 页...", file=sys.stderr)
-        
-        # 先尝试直接提取文本
-        text = page.get_text()
-        if text.strip():
-            all_text.append(f"--- 第 {page_num + 1} 页 ---")
-            all_text.append(text.strip())
-            print(f"[Python] 第 {page_num + 1} 页: 直接提取文本成功", file=sys.stderr)
-        else:
-            # 如果没有文本，使用 OCR
-            print(f"[Python] 第 {page_num + 1} 页: 无文本，使用 OCR...", file=sys.stderr)
-            # 将页面渲染为图片
-            mat = fitz.Matrix(2, 2)  # 2x 缩放以提高 OCR 精度
-            pix = page.get_pixmap(matrix=mat)
-            img_data = pix.tobytes("png")
-            
-            # 转为 PIL Image
-            img = Image.open(io.BytesIO(img_data))
-            
-            # 初始化 AI 客户端（用于 OCR）
-            client = AIClient(system_prompt="你是一个 OCR 助手，请准确识别图片中的所有文字内容，保持原有格式。")
-            
-            # 调用 OCR
-            ocr_text = client._ocr_image(img)
-            all_text.append(f"--- 第 {page_num + 1} 页 (OCR) ---")
-            all_text.append(ocr_text)
-            print(f"[Python] 第 {page_num + 1} 页: OCR 完成", file=sys.stderr)
-    
-    doc.close()
-    
-    if total_pages > max_pages:
-        all_text.append(f"\\n... (仅显示前 {max_pages} 页，共 {total_pages} 页)")
-    
-    result_text = "\\n\\n".join(all_text)
-    print(f"[Python] PDF 读取完成，内容长度: {len(result_text)}", file=sys.stderr)
-    print('PDF_CONTENT_START')
-    print(result_text)
-    print('PDF_CONTENT_END')
-    
-except ImportError as e:
-    print(f'[Python] 导入错误: {e}', file=sys.stderr)
-    print('PDF_ERROR:缺少 PyMuPDF 库，请运行: pip install PyMuPDF')
-except Exception as e:
-    import traceback
-    print(f'[Python] 异常: {e}', file=sys.stderr)
-    traceback.print_exc(file=sys.stderr)
-    print('PDF_ERROR:' + str(e))
-`;
-    
-    console.log('[PDF OCR] 开始读取 PDF:', filePath);
-    
-    const proc = spawn('python', ['-c', pythonCode], {
-      cwd: toolsDir,
-      env: {
-        ...process.env,
-        PYTHONIOENCODING: 'utf-8',
-        PYTHONUTF8: '1',
-      },
-    });
-    
-    let stdout = '';
-    let stderr = '';
-    
-    // 设置超时（60秒，OCR 可能较慢）
-    const timeout = setTimeout(() => {
-      proc.kill();
-      resolve({ success: false, error: 'PDF 读取超时' });
-    }, 60000);
-    
-    proc.stdout.on('data', (data) => {
-      stdout += data.toString('utf-8');
-    });
-    
-    proc.stderr.on('data', (data) => {
-      stderr += data.toString('utf-8');
-      console.error(`[PDF OCR Error] ${data.toString('utf-8').trim()}`);
-    });
-    
-    proc.on('close', (code) => {
-      clearTimeout(timeout);
-      
-      if (stdout.includes('PDF_CONTENT_START') && stdout.includes('PDF_CONTENT_END')) {
-        const content = stdout
-          .split('PDF_CONTENT_START')[1]
-          .split('PDF_CONTENT_END')[0]
-          .trim();
-        console.log('[PDF OCR] 读取成功，内容长度:', content.length);
-        resolve({ success: true, content });
-      } else if (stdout.includes('PDF_ERROR:')) {
-        const error = stdout.split('PDF_ERROR:')[1].split('\\n')[0].trim();
-        resolve({ success: false, error });
-      } else {
-        resolve({ success: false, error: stderr || '读取 PDF 失败' });
+  console.log('[PDF OCR] 开始读取 PDF:', filePath);
+  try {
+    // 读取整份文档，无文本层的页面并发 OCR；以后台任务执行，按页汇报进度
+    const result = await runJob('pdf.read', { path: filePath });
+    console.log('[PDF OCR] 读取成功，内容长度:', result.content.length);
+    return { success: true, content: result.content };
+  } catch (err) {
+    return { success: false, error: err.message };
+  }
+});
+
+// 流式读取 PDF：每页就绪后立即通过 file:pdfPage 事件推送，不在主进程缓存全文
+ipcMain.handle('file:readPdfStream', async (event, filePath) => {
+  console.log('[PDF OCR] 开始流式读取 PDF:', filePath);
+  try {
+    const result = await callWorker('pdf.read', { path: filePath, stream: true }, 0, (method, data) => {
+      if (method === 'pdf.page' && !event.sender.isDestroyed()) {
+        event.sender.send('file:pdfPage', {
+          filePath,
+          page: data.page,
+          totalPages: data.total_pages,
+          header: data.header,
+          text: data.text,
+          ocr: data.ocr,
+        });
       }
     });
-    
-    proc.on('error', (err) => {
-      clearTimeout(timeout);
-      resolve({ success: false, error: err.message });
-    });
-  });
+    console.log('[PDF OCR] 流式读取完成，共', result.pages_read, '页');
+    return { success: true, totalPages: result.total_pages, pagesRead: result.pages_read };
+  } catch (err) {
+    return { success: false, error: err.message };
+  }
 });
 
 // AI 问答（调用 Python ask_ai）
 ipcMain.handle('ai:ask', async (event, question, fileContent, fileName) => {
-  return new Promise((resolve) => {
-    const toolsDir = path.join(__dirname, '..', 'tools');
-    
-    // 构建提示词
-    let prompt = question;
-    if (fileContent && fileName) {
-      prompt = `我正在阅读文件《${fileName}》，内容如下：\n\n${fileContent.substring(0, 3000)}${fileContent.length > 3000 ? '\n...（内容已截断）' : ''}\n\n用户问题：${question}`;
-    }
-    
-    // 转义特殊字符用于 Python 字符串
-    const escapedPrompt = prompt
-      .replace(/\\/g, '\\\\')
-      .replace(/'/g, "\\'")
-      .replace(/"/g, '\\"')
-      .replace(/\n/g, '\\n')
-      .replace(/\r/g, '');
-    
-    const pythonCode = `
-import sys
-sys.path.insert(0, r'${toolsDir.replace(/\\/g, '/')}')
-from ask_ai import ask_ai
-
-try:
-    response = ask_ai(text="""${escapedPrompt}""")
-    print('AI_RESPONSE_START')
-    print(response)
-    print('AI_RESPONSE_END')
-except Exception as e:
-    print('AI_ERROR:' + str(e))
-`;
-    
-    const proc = spawn('python', ['-c', pythonCode], {
-      cwd: toolsDir,
-      env: {
-        ...process.env,
-        PYTHONIOENCODING: 'utf-8',
-        PYTHONUTF8: '1',
-      },
-    });
-    
-    let stdout = '';
-    let stderr = '';
-    
-    proc.stdout.on('data', (data) => {
-      stdout += data.toString('utf-8');
-      console.log(`[AI] ${data.toString('utf-8').trim()}`);
-    });
-    
-    proc.stderr.on('data', (data) => {
-      stderr += data.toString('utf-8');
-      console.error(`[AI Error] ${data.toString('utf-8').trim()}`);
-    });
-    
-    proc.on('close', (code) => {
-      if (stdout.includes('AI_RESPONSE_START') && stdout.includes('AI_RESPONSE_END')) {
-        const response = stdout
-          .split('AI_RESPONSE_START')[1]
-          .split('AI_RESPONSE_END')[0]
-          .trim();
-        resolve({ success: true, response });
-      } else if (stdout.includes('AI_ERROR:')) {
-        const error = stdout.split('AI_ERROR:')[1].trim();
-        resolve({ success: false, error });
-      } else {
-        resolve({ success: false, error: stderr || 'AI 调用失败' });
+  // 正在阅读文件时把全文交给 worker，由它按问题和 token 预算挑选相关片段组成提示词
+  const params = (fileContent && fileName)
+    ? { question, document: fileContent, file_name: fileName }
+    : { text: question };
+
+  try {
+    // 流式生成：每收到一段文本就转发给渲染进程，最终结果仍通过返回值给出完整回复
+    const result = await callWorker('ai.ask', params, 0, (method, data) => {
+      if (method === 'ai.chunk' && !event.sender.isDestroyed()) {
+        event.sender.send('ai:chunk', { delta: data.delta });
       }
     });
-    
-    proc.on('error', (err) => {
-      resolve({ success: false, error: err.message });
-    });
-  });
+    if (result.context) {
+      const ctx = result.context;
+      console.log(`[AI] 上下文: ${ctx.chunks}/${ctx.total_chunks} 个片段，约 ${ctx.tokens} tokens${ctx.complete ? '（全文）' : ''}`);
+    }
+    return { success: true, response: result.response };
+  } catch (err) {
+    console.error('[AI Error]', err.message);
+    return { success: false, error: err.message };
+  }
+});
+
+// ================= 知识库搜索 IPC =================
+
+// 搜索知识库（笔记、PDF 文本、OCR 结果）
+ipcMain.handle('search:query', async (event, query, options = {}) => {
+  try {
+    const result = await callWorker('search.query', {
+      query,
+      limit: options.limit || 20,
+      folder: options.folder || null,
+      kind: options.kind || null,
+    }, 10000);
+    return { success: true, results: result.results };
+  } catch (err) {
+    return { success: false, error: err.message };
+  }
+});
+
+// 重建知识库索引
+ipcMain.handle('search:rebuild', async () => {
+  console.log('[Search] 重建索引...');
+  try {
+    const result = await callWorker('search.rebuild', {});
+    console.log('[Search] 索引完成:', result);
+    return { success: true, ...result };
+  } catch (err) {
+    return { success: false, error: err.message };
+  }
 });
 
 // In this file you can include the rest of your app's specific main process
@@ -644,77 +745,15 @@ except Exception as e:
 
 // 搜索 Arxiv 论文
 ipcMain.handle('arxiv:search', async (event, query, maxResults = 5) => {
-  return new Promise((resolve) => {
-    const toolsDir = path.join(__dirname, '..', 'tools');
-    
-    const pythonCode = `
-import sys
-import json
-sys.path.insert(0, r'${toolsDir.replace(/\\/g, '/')}')
-
-try:
-    from research_article import ArxivRecommender
-    recommender = ArxivRecommender(max_results=${maxResults})
-    papers = recommender.get_latest_papers("""${query.replace(/"/g, '\\"')}""")
-    print('ARXIV_RESULT:' + json.dumps(papers, ensure_ascii=False))
-except Exception as e:
-    print('ARXIV_ERROR:' + str(e))
-`;
-    
-    console.log('[Arxiv] 搜索:', query);
-    
-    const proc = spawn('python', ['-c', pythonCode], {
-      cwd: toolsDir,
-      env: {
-        ...process.env,
-        PYTHONIOENCODING: 'utf-8',
-        PYTHONUTF8: '1',
-      },
-    });
-    
-    let stdout = '';
-    let stderr = '';
-    
-    // 设置超时（30秒）
-    const timeout = setTimeout(() => {
-      proc.kill();
-      resolve({ success: false, error: '搜索超时' });
-    }, 30000);
-    
-    proc.stdout.on('data', (data) => {
-      stdout += data.toString('utf-8');
-    });
-    
-    proc.stderr.on('data', (data) => {
-      stderr += data.toString('utf-8');
-    });
-    
-    proc.on('close', (code) => {
-      clearTimeout(timeout);
-      
-      if (stdout.includes('ARXIV_RESULT:')) {
-        try {
-          const jsonStr = stdout.split('ARXIV_RESULT:')[1].trim();
-          const papers = JSON.parse(jsonStr);
-          console.log('[Arxiv] 找到', papers.length, '篇论文');
-          resolve({ success: true, papers });
-        } catch (e) {
-          console.error('[Arxiv] JSON 解析失败:', e);
-          resolve({ success: false, error: '结果解析失败: ' + e.message });
-        }
-      } else if (stdout.includes('ARXIV_ERROR:')) {
-        const error = stdout.split('ARXIV_ERROR:')[1].trim();
-        resolve({ success: false, error });
-      } else {
-        resolve({ success: false, error: stderr || '搜索失败' });
-      }
-    });
-    
-    proc.on('error', (err) => {
-      clearTimeout(timeout);
-      resolve({ success: false, error: err.message });
-    });
-  });
+  console.log('[Arxiv] 搜索:', query);
+  try {
+    // 超时 30 秒
+    const result = await callWorker('arxiv.search', { query, max_results: maxResults }, 30000);
+    console.log('[Arxiv] 找到', result.papers.length, '篇论文');
+    return { success: true, papers: result.papers };
+  } catch (err) {
+    return { success: false, error: err.message };
+  }
 });
 
 // 下载 PDF 到临时文件夹
@@ -800,86 +839,85 @@ ipcMain.handle('arxiv:download', async (event, pdfUrl, title) => {
 
 // 将 PDF 保存到合适的文件夹（调用 choose_to_save）
 ipcMain.handle('arxiv:saveToFolder', async (event, pdfPath, description) => {
-  return new Promise((resolve) => {
-    const toolsDir = path.join(__dirname, '..', 'tools');
-    
-    const safePdfPath = pdfPath.replace(/\\/g, '/');
-    const safeDescription = description.replace(/'/g, "\\'").replace(/"/g, '\\"').replace(/\n/g, ' ');
-    
-    const pythonCode = `
-import sys
-import json
-sys.path.insert(0, r'${toolsDir.replace(/\\/g, '/')}')
-
-try:
-    from choose_to_save import ContentManager, InputType
-    manager = ContentManager()
-    
-    result_path = manager.save_content(
-        InputType.PDF,
-        r'${safePdfPath}',
-        description="""${safeDescription}""",
-        sub_folder="文章"
-    )
-    
-    if result_path:
-        print('SAVE_RESULT:' + json.dumps({"success": True, "path": result_path}, ensure_ascii=False))
-    else:
-        print('SAVE_RESULT:' + json.dumps({"success": False, "error": "保存失败"}))
-except Exception as e:
-    print('SAVE_RESULT:' + json.dumps({"success": False, "error": str(e)}, ensure_ascii=False))
-`;
-    
-    console.log('[SavePDF] 保存到合适文件夹:', pdfPath);
-    
-    const proc = spawn('python', ['-c', pythonCode], {
-      cwd: toolsDir,
-      env: {
-        ...process.env,
-        PYTHONIOENCODING: 'utf-8',
-        PYTHONUTF8: '1',
-      },
-    });
-    
-    let stdout = '';
-    let stderr = '';
-    
-    // 设置超时（30秒）
-    const timeout = setTimeout(() => {
-      proc.kill();
-      resolve({ success: false, error: '操作超时' });
-    }, 30000);
-    
-    proc.stdout.on('data', (data) => {
-      stdout += data.toString('utf-8');
-      console.log(`[SavePDF] ${data.toString('utf-8').trim()}`);
-    });
-    
-    proc.stderr.on('data', (data) => {
-      stderr += data.toString('utf-8');
+  console.log('[SavePDF] 保存到合适文件夹:', pdfPath);
+  try {
+    const result = await runJob('content.savePdf', {
+      path: pdfPath,
+      description,
+      sub_folder: '文章',
     });
-    
-    proc.on('close', (code) => {
-      clearTimeout(timeout);
-      
-      if (stdout.includes('SAVE_RESULT:')) {
-        try {
-          const jsonStr = stdout.split('SAVE_RESULT:')[1].trim();
-          const result = JSON.parse(jsonStr);
-          resolve(result);
-        } catch (e) {
-          resolve({ success: false, error: '结果解析失败' });
-        }
-      } else {
-        resolve({ success: false, error: stderr || '保存失败' });
+    return { success: true, path: result.path };
+  } catch (err) {
+    return { success: false, error: err.message };
+  }
+});
+
+// 批量下载论文并分类入库（并发下载、断点续传、跳过已入库的论文）
+ipcMain.handle('arxiv:ingest', async (event, papers, subFolder = '文章') => {
+  console.log('[Ingest] 批量入库', papers.length, '篇论文');
+  try {
+    const result = await runJob('arxiv.ingest', { papers, sub_folder: subFolder }, (job) => {
+      if (job.message === 'ingest.progress' && job.data && !event.sender.isDestroyed()) {
+        event.sender.send('arxiv:ingestProgress', job.data);
       }
     });
-    
-    proc.on('error', (err) => {
-      clearTimeout(timeout);
-      resolve({ success: false, error: err.message });
-    });
-  });
+    return { success: true, results: result.results };
+  } catch (err) {
+    console.error('[Ingest] 批量入库失败:', err.message);
+    return { success: false, error: err.message };
+  }
+});
+
+// ================= 后台任务 =================
+
+// 提交后台任务（不等待结束，状态通过 job:update 事件推送）
+ipcMain.handle('job:submit', async (event, kind, params = {}) => {
+  try {
+    const result = await callWorker('job.submit', { kind, params }, 10000);
+    return { success: true, job: result.job };
+  } catch (err) {
+    return { success: false, error: err.message };
+  }
+});
+
+// 查询任务状态和结果
+ipcMain.handle('job:get', async (event, jobId) => {
+  try {
+    const result = await callWorker('job.get', { id: jobId }, 10000);
+    return { success: true, job: result.job };
+  } catch (err) {
+    return { success: false, error: err.message };
+  }
+});
+
+// 取消任务
+ipcMain.handle('job:cancel', async (event, jobId) => {
+  try {
+    const result = await callWorker('job.cancel', { id: jobId }, 10000);
+    return { success: true, cancelled: result.cancelled };
+  } catch (err) {
+    return { success: false, error: err.message };
+  }
+});
+
+// 列出任务（status 为空时列出全部）
+ipcMain.handle('job:list', async (event, status = null, limit = 50) => {
+  try {
+    const result = await callWorker('job.list', { status, limit }, 10000);
+    return { success: true, jobs: result.jobs };
+  } catch (err) {
+    return { success: false, error: err.message };
+  }
+});
+
+// 按阶段汇总耗时和 token 用量（since 如 '24h' / '7d' / 'all'，by 为额外分组属性如 'provider'）
+ipcMain.handle('trace:summary', async (event, since = '24h', by = null) => {
+  try {
+    const result = await callWorker('trace.summary', { since, by }, 30000);
+    return { success: true, stages: result.stages };
+  } catch (err) {
+    return { success: false, error: err.message };
+  }
 });
 
 // ================= 定时推荐功能 =================
@@ -960,81 +998,48 @@ function checkScheduledTasks() {
 // 执行定时搜索并发送通知
 async function triggerScheduledSearch(schedule) {
   try {
-    // 调用 Arxiv 搜索
-    const toolsDir = path.join(__dirname, '..', 'tools');
-    
-    const pythonCode = `
-import sys
-import json
-sys.path.insert(0, r'${toolsDir.replace(/\\/g, '/')}')
-
-try:
-    from research_article import ArxivRecommender
-    recommender = ArxivRecommender(max_results=3)
-    papers = recommender.get_latest_papers("""${schedule.keyword.replace(/"/g, '\\"')}""")
-    print('ARXIV_RESULT:' + json.dumps(papers, ensure_ascii=False))
-except Exception as e:
-    print('ARXIV_ERROR:' + str(e))
-`;
-    
-    const proc = spawn('python', ['-c', pythonCode], {
-      cwd: toolsDir,
-      env: {
-        ...process.env,
-        PYTHONIOENCODING: 'utf-8',
-        PYTHONUTF8: '1',
-      },
+    // 调用 Arxiv 搜索：worker 只增量抓取，并只返回之前没有通知过的论文
+    const { new_papers: papers } = await callWorker('arxiv.search', {
+      query: schedule.keyword,
+      max_results: 3,
+      max_age: 0,
+      only_unnotified: true,
     });
-    
-    let stdout = '';
-    
-    proc.stdout.on('data', (data) => {
-      stdout += data.toString('utf-8');
-    });
-    
-    proc.on('close', (code) => {
-      if (stdout.includes('ARXIV_RESULT:')) {
-        try {
-          const jsonStr = stdout.split('ARXIV_RESULT:')[1].trim();
-          const papers = JSON.parse(jsonStr);
-          
-          if (papers.length > 0) {
-            // 发送系统通知
-            const notification = new Notification({
-              title: `📚 定时推荐: ${schedule.keyword}`,
-              body: `找到 ${papers.length} 篇新论文\n${papers[0].title.substring(0, 50)}...`,
-              icon: path.join(__dirname, '..', 'img', 'robot.png'),
-            });
-            
-            notification.on('click', () => {
-              // 点击通知时聚焦窗口并跳转到推荐页面
-              if (mainWindow) {
-                mainWindow.show();
-                mainWindow.focus();
-                mainWindow.webContents.send('schedule:notification', {
-                  keyword: schedule.keyword,
-                  papers: papers
-                });
-              }
-            });
-            
-            notification.show();
-            
-            // 同时发送到渲染进程显示应用内通知
-            if (mainWindow && !mainWindow.isDestroyed()) {
-              mainWindow.webContents.send('schedule:notification', {
-                keyword: schedule.keyword,
-                papers: papers,
-                showInApp: true
-              });
-            }
-          }
-        } catch (e) {
-          console.error('[Schedule] 解析结果失败:', e);
+
+    if (papers.length === 0) {
+      console.log('[Schedule] 没有新论文:', schedule.keyword);
+    } else {
+      // 发送系统通知
+      const notification = new Notification({
+        title: `📚 定时推荐: ${schedule.keyword}`,
+        body: `找到 ${papers.length} 篇新论文\n${papers[0].title.substring(0, 50)}...`,
+        icon: path.join(__dirname, '..', 'img', 'robot.png'),
+      });
+
+      notification.on('click', () => {
+        // 点击通知时聚焦窗口并跳转到推荐页面
+        if (mainWindow) {
+          mainWindow.show();
+          mainWindow.focus();
+          mainWindow.webContents.send('schedule:notification', {
+            keyword: schedule.keyword,
+            papers: papers
+          });
         }
+      });
+
+      notification.show();
+
+      // 同时发送到渲染进程显示应用内通知
+      if (mainWindow && !mainWindow.isDestroyed()) {
+        mainWindow.webContents.send('schedule:notification', {
+          keyword: schedule.keyword,
+          papers: papers,
+          showInApp: true
+        });
       }
-    });
-    
+    }
+
   } catch (err) {
     console.error('[Schedule] 定时搜索失败:', err);
   }
@@ -391,7 +391,7 @@ function convertToTreeData(items, basePath) {
     return [];
   }
   
-  return items.map(item => {
+  const treeItems = items.map(item => {
     const fullPath = item.path || `${basePath}/${item.name}`;
     
     if (item.type === 'folder') {
@@ -411,6 +411,76 @@ function convertToTreeData(items, basePath) {
       };
     }
   });
+  
+  // 缩略图在后台获取，拿到后重新渲染文件树
+  loadThumbnails(treeItems).then(updated => {
+    if (updated) renderFileTree();
+  });
+  return treeItems;
+}
+
+// ================= 图片缩略图 =================
+// 图片条目使用 worker 按内容哈希缓存的缩略图（images.thumbnails），文件树和图片网格都不解码原图
+
+const thumbnailCache = new Map(); // 原图路径 -> 缩略图路径
+const thumbnailRequests = new Map(); // 原图路径 -> 进行中的请求，避免重复请求
+
+function toFileUrl(filePath) {
+  return 'file:///' + filePath.replace(/\\/g, '/');
+}
+
+// 批量获取条目中图片的缩略图，返回是否拿到了新的缩略图
+async function loadThumbnails(items) {
+  const images = items.filter(item => item.type === 'file' && item.fileType === 'image' && !thumbnailCache.has(item.path));
+  const missing = images.map(item => item.path).filter(p => !thumbnailRequests.has(p));
+  if (missing.length > 0) {
+    const request = window.electronAPI.folder.thumbnails(missing).then(result => {
+      if (!result.success) {
+        console.warn('获取缩略图失败:', result.error);
+        return;
+      }
+      Object.entries(result.thumbnails).forEach(([imagePath, thumbPath]) => thumbnailCache.set(imagePath, thumbPath));
+    }).catch(error => {
+      console.error('获取缩略图失败:', error);
+    }).finally(() => {
+      missing.forEach(p => thumbnailRequests.delete(p));
+    });
+    missing.forEach(p => thumbnailRequests.set(p, request));
+  }
+  const pending = images.map(item => thumbnailRequests.get(item.path)).filter(Boolean);
+  if (pending.length === 0) return false;
+  await Promise.all(pending);
+  return images.some(item => thumbnailCache.has(item.path));
+}
+
+// 在中间区域以缩略图网格显示文件夹中的图片，点击后打开原图
+async function showImageGrid(folder) {
+  const images = (folder.children || []).filter(child => child.type === 'file' && child.fileType === 'image');
+  if (images.length === 0) return;
+  await loadThumbnails(images);
+  
+  hideTemplateView();
+  hideTemplateEditor();
+  const displayArea = document.getElementById('displayArea');
+  displayArea.style.display = 'flex';
+  
+  const grid = document.createElement('div');
+  grid.className = 'image-grid';
+  images.forEach(image => {
+    const tile = document.createElement('div');
+    tile.className = 'image-grid-item';
+    tile.title = image.name;
+    const img = document.createElement('img');
+    img.loading = 'lazy';
+    const thumb = thumbnailCache.get(image.path);
+    img.src = thumb ? toFileUrl(thumb) : '../../img/picture.png';
+    tile.appendChild(img);
+    tile.addEventListener('click', () => selectFile(image));
+    grid.appendChild(tile);
+  });
+  
+  displayArea.innerHTML = '';
+  displayArea.appendChild(grid);
 }
 
 // 创建子文件夹（使用 choose_to_save 的方法）
@@ -490,6 +560,14 @@ document.addEventListener('DOMContentLoaded', async () => {
   
   setupEventListeners();
   loadChatHistory();
+  
+  // 文件夹注册表变化（新建文件夹、其他进程或手动编辑 folder_structure.json）时刷新文件树
+  window.electronAPI.folder.removeConfigChangedListener();
+  window.electronAPI.folder.onConfigChanged(async (data) => {
+    if (isLazyLoading) return;
+    console.log('文件夹配置已变化:', data);
+    await refreshFileTree(true);
+  });
 });
 
 // Render file tree
@@ -557,6 +635,11 @@ function createTreeItem(item, level = 0) {
       
       // 保存展开状态
       saveFolderState();
+      
+      // 展开含图片的文件夹时显示缩略图网格
+      if (item.expanded) {
+        showImageGrid(item);
+      }
     });
     
     container.appendChild(folderItem);
@@ -579,14 +662,17 @@ function createTreeItem(item, level = 0) {
     fileItem.style.paddingLeft = `${20 + level * 20}px`;
     
     const icon = document.createElement('img');
-    if (item.fileType === 'image') {
+    const thumb = item.fileType === 'image' && thumbnailCache.get(item.path);
+    if (thumb) {
+      icon.src = toFileUrl(thumb);
+    } else if (item.fileType === 'image') {
       icon.src = '../../img/picture.png';
     } else if (item.fileType === 'pdf') {
       icon.src = '../../img/file.png';
     } else {
       icon.src = '../../img/file.png';
     }
-    icon.className = 'file-icon';
+    icon.className = thumb ? 'file-icon file-thumb' : 'file-icon';
     
     const name = document.createElement('span');
     name.className = 'file-name';
@@ -645,6 +731,8 @@ async function selectFile(file) {
       iframe.className = 'file-preview';
       displayArea.innerHTML = '';
       displayArea.appendChild(iframe);
+    } else if (isNoteSegment(file) && await renderNotesView(file)) {
+      // 笔记分段按条目分页显示；读取失败（文件夹不在注册表中等）时退回下面的整文件读取
     } else {
       // 读取文本文件内容
       let content = file.content || '文件内容预览';
@@ -680,6 +768,70 @@ async function selectFile(file) {
   // 不再自动添加 AI 消息，等待用户主动提问
 }
 
+// ================= 笔记分页视图 =================
+// 笔记分段（{文件夹名}_笔记_2024-05.md）由 worker 的笔记日志生成，查看时按条目读取最近 NOTES_PAGE_SIZE 条，
+// 向前翻页时用 before 读取更早的条目，不加载整个 markdown 文件
+
+const NOTES_PAGE_SIZE = 20;
+const NOTE_SEGMENT_PATTERN = /^(.+)_笔记_\d{4}-\d{2}\.md$/;
+
+function isNoteSegment(file) {
+  return file.fileType === 'markdown' && !!file.path && NOTE_SEGMENT_PATTERN.test(file.name);
+}
+
+async function renderNotesView(file) {
+  const folderName = file.name.match(NOTE_SEGMENT_PATTERN)[1];
+  // 分段位于 {知识库文件夹}/笔记/ 下
+  const folderPath = file.path.replace(/[\\/][^\\/]+[\\/][^\\/]+$/, '');
+  const result = await window.electronAPI.notes.recent(folderName, NOTES_PAGE_SIZE, null, folderPath);
+  if (!result.success) {
+    console.warn('按条目读取笔记失败，改为读取整个文件:', result.error);
+    return false;
+  }
+  
+  const div = document.createElement('div');
+  div.className = 'file-preview';
+  const content = document.createElement('div');
+  content.className = 'markdown-content';
+  content.innerHTML = `<h1>${escapeHtml(folderName)} 笔记</h1><p class="notes-summary">共 ${result.total} 条，新的在前</p>`;
+  const list = document.createElement('div');
+  const moreBtn = document.createElement('button');
+  moreBtn.className = 'action-btn notes-more-btn';
+  moreBtn.textContent = '加载更早的笔记';
+  content.appendChild(list);
+  content.appendChild(moreBtn);
+  div.appendChild(content);
+  
+  let oldestId = null;
+  const appendNotes = (notes) => {
+    notes.forEach(note => {
+      const item = document.createElement('div');
+      item.className = 'note-entry';
+      item.innerHTML = '<hr>' + renderMarkdown(note.text);
+      list.appendChild(item);
+      oldestId = note.id;
+    });
+    moreBtn.style.display = oldestId && oldestId > 1 ? '' : 'none';
+  };
+  appendNotes(result.notes);
+  
+  moreBtn.addEventListener('click', async () => {
+    moreBtn.disabled = true;
+    const page = await window.electronAPI.notes.recent(folderName, NOTES_PAGE_SIZE, oldestId, folderPath);
+    moreBtn.disabled = false;
+    if (page.success) {
+      appendNotes(page.notes);
+    } else {
+      showAlert('加载笔记失败: ' + (page.error || '未知错误'));
+    }
+  });
+  
+  const displayArea = document.getElementById('displayArea');
+  displayArea.innerHTML = '';
+  displayArea.appendChild(div);
+  return true;
+}
+
 // HTML 转义函数
 function escapeHtml(text) {
   const div = document.createElement('div');
@@ -1172,27 +1324,51 @@ async function callAI(userQuery) {
           console.warn('读取文件内容失败:', e);
         }
       } else if (currentFile.fileType === 'pdf') {
-        // PDF 文件使用 OCR 读取
+        // PDF 文件使用 OCR 读取，逐页接收并显示读取进度
+        const pdfPath = currentFile.path;
+        const pages = [];
         try {
-          console.log('正在使用 OCR 读取 PDF 文件:', currentFile.path);
-          const result = await window.electronAPI.file.readPdf(currentFile.path);
+          console.log('正在使用 OCR 读取 PDF 文件:', pdfPath);
+          window.electronAPI.file.removePdfPageListener();
+          window.electronAPI.file.onPdfPage((data) => {
+            if (data.filePath !== pdfPath) return;
+            pages.push(`${data.header}\n\n${data.text}`);
+            updateLoadingMessage(`📄 正在读取 PDF（${data.page}/${data.totalPages} 页）...`);
+          });
+          
+          const result = await window.electronAPI.file.readPdfStream(pdfPath);
           if (result.success) {
-            fileContent = result.content;
+            fileContent = pages.join('\n\n');
             console.log('PDF OCR 读取成功，内容长度:', fileContent.length);
           } else {
             console.warn('PDF OCR 读取失败:', result.error);
           }
         } catch (e) {
           console.warn('PDF OCR 调用失败:', e);
+        } finally {
+          window.electronAPI.file.removePdfPageListener();
+          updateLoadingMessage('🤔 正在思考中...');
         }
       }
     }
     
-    // 调用 AI API
+    // 调用 AI API（流式：回复生成过程中逐段显示）
+    let streamedText = '';
+    window.electronAPI.ai.removeChunkListener();
+    window.electronAPI.ai.onChunk((data) => {
+      if (!streamedText) {
+        removeLoadingMessage();
+      }
+      streamedText += data.delta;
+      updateStreamingMessage(streamedText);
+    });
+    
     const result = await window.electronAPI.ai.ask(userQuery, fileContent, fileName);
+    window.electronAPI.ai.removeChunkListener();
     
-    // 移除加载消息
+    // 移除加载消息和流式预览，改为正式消息
     removeLoadingMessage();
+    removeStreamingMessage();
     
     if (result.success) {
       addAIMessage(result.response);
@@ -1202,20 +1378,64 @@ async function callAI(userQuery) {
     
   } catch (error) {
     console.error('AI 调用失败:', error);
+    window.electronAPI.ai.removeChunkListener();
     removeLoadingMessage();
+    removeStreamingMessage();
     addAIMessage(`❌ AI 调用出错: ${error.message}`);
   }
 }
 
+// 更新加载中消息的文字
+function updateLoadingMessage(text) {
+  const chatMessages = document.getElementById('chatMessages');
+  const loadingMsg = chatMessages.querySelector('.message.ai:last-child');
+  if (loadingMsg && loadingMsg.classList.contains('is-loading')) {
+    const time = loadingMsg.querySelector('.message-time');
+    const content = loadingMsg.querySelector('.message-content');
+    content.innerHTML = formatMessageHtml(text);
+    if (time) content.appendChild(time);
+  }
+}
+
 // 移除加载中的消息
 function removeLoadingMessage() {
   const chatMessages = document.getElementById('chatMessages');
   const loadingMsg = chatMessages.querySelector('.message.ai:last-child');
-  if (loadingMsg && loadingMsg.textContent.includes('正在思考中')) {
+  if (loadingMsg && (loadingMsg.classList.contains('is-loading') || loadingMsg.textContent.includes('正在思考中'))) {
     loadingMsg.remove();
   }
 }
 
+// 更新流式生成中的 AI 消息（不写入聊天记录）
+function updateStreamingMessage(text) {
+  const chatMessages = document.getElementById('chatMessages');
+  let streamingMsg = chatMessages.querySelector('.message.ai.streaming');
+  if (!streamingMsg) {
+    renderMessage({
+      type: 'ai',
+      text: '',
+      time: new Date().toLocaleTimeString('zh-CN', { hour: '2-digit', minute: '2-digit' })
+    });
+    streamingMsg = chatMessages.lastElementChild;
+    streamingMsg.classList.add('streaming');
+  }
+  
+  const content = streamingMsg.querySelector('.message-content');
+  const time = content.querySelector('.message-time');
+  content.innerHTML = formatMessageHtml(text);
+  if (time) content.appendChild(time);
+  chatMessages.scrollTop = chatMessages.scrollHeight;
+}
+
+// 移除流式生成中的 AI 消息
+function removeStreamingMessage() {
+  const chatMessages = document.getElementById('chatMessages');
+  const streamingMsg = chatMessages.querySelector('.message.ai.streaming');
+  if (streamingMsg) {
+    streamingMsg.remove();
+  }
+}
+
 // Add user message
 function addUserMessage(text) {
   const message = {
@@ -1247,6 +1467,9 @@ function renderMessage(message) {
   const chatMessages = document.getElementById('chatMessages');
   const messageDiv = document.createElement('div');
   messageDiv.className = `message ${message.type}`;
+  if (message.isLoading) {
+    messageDiv.classList.add('is-loading');
+  }
   
   const avatar = document.createElement('div');
   avatar.className = 'message-avatar';
@@ -1258,10 +1481,7 @@ function renderMessage(message) {
   content.className = 'message-content';
   
   // Convert text to HTML with line breaks and formatting
-  let html = message.text.replace(/\n/g, '<br>');
-  html = html.replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>');
-  html = html.replace(/(\d+)\.\s/g, '<strong>$1.</strong> ');
-  content.innerHTML = html;
+  content.innerHTML = formatMessageHtml(message.text);
   
   const time = document.createElement('div');
   time.className = 'message-time';
@@ -1282,6 +1502,14 @@ function renderMessage(message) {
   chatMessages.scrollTop = chatMessages.scrollHeight;
 }
 
+// Convert message text to HTML
+function formatMessageHtml(text) {
+  let html = text.replace(/\n/g, '<br>');
+  html = html.replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>');
+  html = html.replace(/(\d+)\.\s/g, '<strong>$1.</strong> ');
+  return html;
+}
+
 // Save chat history
 function saveChatHistory() {
   localStorage.setItem('chatHistory', JSON.stringify(chatHistory));
@@ -505,8 +505,23 @@ function renderItemsToElement(items, recentList) {
 // 分类数据
 let categories = [];
 
-// 获取分类数据（占位）
+// 获取分类数据：已注册的知识库文件夹，注册表不可用时使用占位数据
 async function fetchCategories() {
+  try {
+    const result = await window.electronAPI.folder.list();
+    if (result.success && result.folders.length > 0) {
+      return result.folders.map((folder, index) => ({
+        id: index + 1,
+        name: folder.name,
+        count: null,
+        description: folder.description || folder.path,
+        color: folder.parent ? null : '#4ade80'
+      }));
+    }
+  } catch (error) {
+    console.error('获取文件夹列表失败:', error);
+  }
+  
   // TODO: 后续接入实际的数据接口
   return [
     {
@@ -571,8 +586,8 @@ async function renderCategories() {
         <div class="category-card ${hasColorLine ? 'has-color-line' : ''}" data-id="${category.id}" ${colorStyle}>
           <div class="category-card-header">
             <div style="flex: 1;">
-              <div class="category-count">${category.count}个知识条目</div>
-              <div class="category-title">${category.name}</div>
+              <div class="category-count">${category.count === null ? escapeCategoryText(category.description) : `${category.count}个知识条目`}</div>
+              <div class="category-title">${escapeCategoryText(category.name)}</div>
             </div>
             <button class="category-menu-btn" title="更多选项">⋯</button>
           </div>
@@ -611,6 +626,13 @@ async function renderCategories() {
   }
 }
 
+// 文件夹名称和描述来自用户输入，渲染前转义
+function escapeCategoryText(text) {
+  const div = document.createElement('div');
+  div.textContent = text || '';
+  return div.innerHTML;
+}
+
 // 当前选中的分类
 let currentCategory = null;
 
@@ -714,13 +736,15 @@ async function fetchKnowledgeItems(categoryId) {
 // 渲染分类摘要
 function renderCategorySummary(category) {
   // 更新分类名称和条目数量
-  document.getElementById('categoryItemCount').textContent = `${category.count}个知识条目`;
+  document.getElementById('categoryItemCount').textContent =
+    category.count === null ? category.description : `${category.count}个知识条目`;
   document.getElementById('categoryName').textContent = category.name;
   document.getElementById('knowledgeItemsTitle').textContent = `知识条目分类管理: ${category.name}`;
   
   // 计算文档和图片数量（模拟数据，后续接入实际计算）
-  const docCount = Math.floor(category.count * 0.65); // 假设65%是文档
-  const imageCount = category.count - docCount;
+  const itemCount = category.count || 0;
+  const docCount = Math.floor(itemCount * 0.65); // 假设65%是文档
+  const imageCount = itemCount - docCount;
   
   document.getElementById('categoryDocCount').textContent = docCount;
   document.getElementById('categoryImageCount').textContent = imageCount;
@@ -860,6 +884,13 @@ document.addEventListener('DOMContentLoaded', () => {
     renderRecentItems();
     renderCategories();
   }, 100);
+  
+  // 文件夹注册表变化时刷新分类列表
+  window.electronAPI.folder.removeConfigChangedListener();
+  window.electronAPI.folder.onConfigChanged((data) => {
+    console.log('文件夹配置已变化:', data);
+    renderCategories();
+  });
 });
 
 // Load user avatar from localStorage
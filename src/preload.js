@@ -16,7 +16,9 @@ contextBridge.exposeInMainWorld('electronAPI', {
   folder: {
     open: () => ipcRenderer.invoke('folder:open'),
     read: (folderPath) => ipcRenderer.invoke('folder:read', folderPath),
-    create: (folderName, basePath) => ipcRenderer.invoke('folder:create', folderName, basePath),
+    create: (folderName, basePath, parent) => ipcRenderer.invoke('folder:create', folderName, basePath, parent),
+    list: () => ipcRenderer.invoke('folder:list'),
+    thumbnails: (imagePaths) => ipcRenderer.invoke('folder:thumbnails', imagePaths),
     watch: (folderPath) => ipcRenderer.invoke('folder:watch', folderPath),
     unwatch: () => ipcRenderer.invoke('folder:unwatch'),
     onUpdate: (callback) => {
@@ -25,17 +27,48 @@ contextBridge.exposeInMainWorld('electronAPI', {
     removeUpdateListener: () => {
       ipcRenderer.removeAllListeners('folder:updated');
     },
+    onConfigChanged: (callback) => {
+      ipcRenderer.on('folder:configChanged', (event, data) => callback(data));
+    },
+    removeConfigChangedListener: () => {
+      ipcRenderer.removeAllListeners('folder:configChanged');
+    },
+  },
+  
+  // 笔记（按条目读取，不加载整个 markdown 文件）
+  notes: {
+    recent: (folderName, limit, before, folderPath) => ipcRenderer.invoke('notes:recent', folderName, limit, before, folderPath),
+    get: (folderName, id, folderPath) => ipcRenderer.invoke('notes:get', folderName, id, folderPath),
   },
   
   // 文件操作
   file: {
     read: (filePath) => ipcRenderer.invoke('file:read', filePath),
     readPdf: (filePath) => ipcRenderer.invoke('file:readPdf', filePath),
+    readPdfStream: (filePath) => ipcRenderer.invoke('file:readPdfStream', filePath),
+    onPdfPage: (callback) => {
+      ipcRenderer.on('file:pdfPage', (event, data) => callback(data));
+    },
+    removePdfPageListener: () => {
+      ipcRenderer.removeAllListeners('file:pdfPage');
+    },
   },
   
   // AI 问答
   ai: {
     ask: (question, fileContent, fileName) => ipcRenderer.invoke('ai:ask', question, fileContent, fileName),
+    onChunk: (callback) => {
+      ipcRenderer.on('ai:chunk', (event, data) => callback(data));
+    },
+    removeChunkListener: () => {
+      ipcRenderer.removeAllListeners('ai:chunk');
+    },
+  },
+  
+  // 知识库搜索
+  search: {
+    query: (query, options) => ipcRenderer.invoke('search:query', query, options),
+    rebuild: () => ipcRenderer.invoke('search:rebuild'),
   },
   
   // Arxiv 文献搜索
@@ -43,6 +76,32 @@ contextBridge.exposeInMainWorld('electronAPI', {
     search: (query, maxResults) => ipcRenderer.invoke('arxiv:search', query, maxResults),
     download: (pdfUrl, title) => ipcRenderer.invoke('arxiv:download', pdfUrl, title),
     saveToFolder: (pdfPath, description) => ipcRenderer.invoke('arxiv:saveToFolder', pdfPath, description),
+    ingest: (papers, subFolder) => ipcRenderer.invoke('arxiv:ingest', papers, subFolder),
+    onIngestProgress: (callback) => {
+      ipcRenderer.on('arxiv:ingestProgress', (event, data) => callback(data));
+    },
+    removeIngestProgressListener: () => {
+      ipcRenderer.removeAllListeners('arxiv:ingestProgress');
+    },
+  },
+
+  // 后台任务（耗时的 AI 操作，可查看进度和取消）
+  jobs: {
+    submit: (kind, params) => ipcRenderer.invoke('job:submit', kind, params),
+    get: (jobId) => ipcRenderer.invoke('job:get', jobId),
+    cancel: (jobId) => ipcRenderer.invoke('job:cancel', jobId),
+    list: (status, limit) => ipcRenderer.invoke('job:list', status, limit),
+    onUpdate: (callback) => {
+      ipcRenderer.on('job:update', (event, job) => callback(job));
+    },
+    removeUpdateListener: () => {
+      ipcRenderer.removeAllListeners('job:update');
+    },
+  },
+  
+  // 性能追踪（各阶段耗时 p50 / p95 和 token 用量）
+  trace: {
+    summary: (since, by) => ipcRenderer.invoke('trace:summary', since, by),
   },
   
   // 定时推荐
@@ -10,6 +10,9 @@ let currentQuery = '';
 const PAGE_SIZE = 5;
 const MAX_RESULTS = 50; // 最多获取50条结果用于分页
 
+// 下载按钮：arXiv ID -> 按钮元素，用于根据批量入库进度更新状态
+const downloadButtons = new Map();
+
 // Initialize
 document.addEventListener('DOMContentLoaded', () => {
   loadSearchHistory();
@@ -18,6 +21,7 @@ document.addEventListener('DOMContentLoaded', () => {
   setupEventListeners();
   setupScheduleListeners();
   setupPaginationListeners();
+  setupIngestListeners();
   renderSearchHistory();
   renderArticles();
   loadScheduledTasks();
@@ -40,6 +44,7 @@ document.addEventListener('DOMContentLoaded', () => {
         abstract: paper.summary,
         url: paper.url,
         pdfUrl: paper.pdf_url,
+        arxivId: paper.arxiv_id,
         expanded: false
       }));
       currentQuery = data.keyword;
@@ -139,6 +144,7 @@ async function performSearch(query, page = 1) {
         abstract: paper.summary,
         url: paper.url,
         pdfUrl: paper.pdf_url,
+        arxivId: paper.arxiv_id,
         expanded: false
       }));
       
@@ -329,6 +335,7 @@ function formatDate(date) {
 function renderArticles() {
   const articlesList = document.getElementById('articlesList');
   articlesList.innerHTML = '';
+  downloadButtons.clear();
   
   if (recommendedArticles.length === 0) {
     articlesList.innerHTML = `
@@ -440,6 +447,9 @@ function createArticleCard(article) {
       e.stopPropagation();
       await downloadAndSavePaper(article, downloadBtn);
     });
+    if (article.arxivId) {
+      downloadButtons.set(article.arxivId, downloadBtn);
+    }
     actions.appendChild(downloadBtn);
   }
   
@@ -552,6 +562,101 @@ async function downloadAndSavePaper(article, button) {
   }
 }
 
+// 转换为批量入库接口需要的论文格式
+function toIngestPaper(article) {
+  return {
+    arxiv_id: article.arxivId,
+    title: article.title,
+    authors: article.authors,
+    summary: article.abstract,
+    pdf_url: article.pdfUrl,
+  };
+}
+
+// 设置下载按钮状态
+function setDownloadButtonState(button, state) {
+  const labels = {
+    queued: '排队中...',
+    downloaded: 'AI分类中...',
+    saved: '已保存',
+    skipped: '已存在',
+    failed: '失败',
+  };
+  
+  if (state === 'saved' || state === 'skipped') {
+    button.innerHTML = `
+      <svg viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
+        <polyline points="20 6 9 17 4 12"></polyline>
+      </svg>
+      <span>${labels[state]}</span>
+    `;
+    button.classList.add('success');
+    button.disabled = true;
+  } else if (state === 'failed') {
+    button.innerHTML = `
+      <svg viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
+        <line x1="18" y1="6" x2="6" y2="18"></line>
+        <line x1="6" y1="6" x2="18" y2="18"></line>
+      </svg>
+      <span>${labels[state]}</span>
+    `;
+    button.classList.add('error');
+    button.disabled = false;
+  } else {
+    button.innerHTML = `
+      <div class="btn-spinner"></div>
+      <span>${labels[state]}</span>
+    `;
+    button.disabled = true;
+  }
+}
+
+// 监听批量入库进度
+function setupIngestListeners() {
+  window.electronAPI.arxiv.onIngestProgress((data) => {
+    const button = downloadButtons.get(data.arxiv_id);
+    if (button && button.isConnected) {
+      setDownloadButtonState(button, data.status);
+    }
+  });
+  
+  document.getElementById('saveAllBtn')?.addEventListener('click', saveAllPapers);
+}
+
+// 批量保存当前页的所有论文
+async function saveAllPapers() {
+  const saveAllBtn = document.getElementById('saveAllBtn');
+  const articles = recommendedArticles.filter(a => a.pdfUrl && a.arxivId);
+  if (articles.length === 0) return;
+  
+  saveAllBtn.disabled = true;
+  articles.forEach((article) => {
+    const button = downloadButtons.get(article.arxivId);
+    if (button && !button.classList.contains('success')) {
+      setDownloadButtonState(button, 'queued');
+    }
+  });
+  
+  try {
+    const result = await window.electronAPI.arxiv.ingest(articles.map(toIngestPaper));
+    if (!result.success) {
+      throw new Error(result.error || '保存失败');
+    }
+    const failed = result.results.filter(r => r.status === 'failed').length;
+    console.log(`批量保存完成: ${result.results.length - failed} 篇成功, ${failed} 篇失败`);
+  } catch (error) {
+    console.error('批量保存失败:', error);
+    articles.forEach((article) => {
+      const button = downloadButtons.get(article.arxivId);
+      if (button && button.disabled && !button.classList.contains('success')) {
+        setDownloadButtonState(button, 'failed');
+      }
+    });
+  } finally {
+    saveAllBtn.disabled = false;
+  }
+}
+
 // Toggle favorite
 function toggleFavorite(articleId) {
   if (favoriteArticles.has(articleId)) {
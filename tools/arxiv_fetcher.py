@@ -0,0 +1,356 @@
+import os
+import re
+import threading
+from concurrent.futures import Future
+from datetime import timezone
+from typing import Optional
+
+import arxiv
+
+from paper_store import PaperStore, split_arxiv_id
+from tracing import span
+
+
+# ================= 默认配置 =================
+
+ARXIV_DELAY_SECONDS = float(os.environ.get("ARXIV_DELAY_SECONDS", "3.0"))  # arXiv API 要求的请求间隔，全进程共用
+ARXIV_API_URL = os.environ.get("ARXIV_API_URL")  # 覆盖 arXiv API 地址（例如指向本地模拟服务）
+ARXIV_PAGE_SIZE = 100  # 每次请求的条数，合并查询时一页能覆盖多个关键词
+MAX_BATCH_QUERIES = 8  # 单次合并的关键词上限，避免查询 URL 过长
+MAX_MERGED_RESULTS = 300  # 合并查询最多翻阅的论文数，翻到上限仍未完成的关键词才单独补抓
+
+# arXiv 查询语法中本地可以判断的字段
+_FIELDS = {"ti": ("title",), "au": ("authors",), "abs": ("summary",),
+           "all": ("title", "authors", "summary")}
+_TOKEN_RE = re.compile(r'\(|\)|[A-Za-z]+:"[^"]*"|"[^"]*"|[^\s()"]+')
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+# ================= 共享 Client =================
+# arxiv.Client 自身会在相邻请求间等待 delay_seconds，但不是线程安全的；
+# 全进程只用一个 Client 并串行访问，所有搜索共享同一份限速额度
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_shared_client() -> arxiv.Client:
+    global _client
+    if _client is None:
+        _client = arxiv.Client(page_size=ARXIV_PAGE_SIZE, delay_seconds=ARXIV_DELAY_SECONDS, num_retries=3)
+        if ARXIV_API_URL:
+            _client.query_url_format = ARXIV_API_URL + "?{}"
+    return _client
+
+
+def iter_results(search: arxiv.Search):
+    """在全局锁内逐条产出搜索结果（调用方提前停止时不再请求后续页）"""
+    with _client_lock:
+        yield from get_shared_client().results(search)
+
+
+def newest_first(query: str, max_results: int) -> arxiv.Search:
+    """按提交时间倒序的搜索"""
+    return arxiv.Search(
+        query=query,
+        max_results=max_results,
+        sort_by=arxiv.SortCriterion.SubmittedDate,
+        sort_order=arxiv.SortOrder.Descending
+    )
+
+
+def to_paper_info(r: arxiv.Result) -> dict:
+    """提取并清洗单篇论文的数据"""
+    arxiv_id, version = split_arxiv_id(r.get_short_id())
+    return {
+        "arxiv_id": arxiv_id,
+        "version": version,
+        "title": r.title.replace('\n', ' '),
+        "authors": ", ".join([a.name for a in r.authors]),
+        "published": r.published.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "published_date": r.published.strftime("%Y-%m-%d"),
+        "summary": r.summary.replace('\n', ' '),  # 去除摘要中的换行符
+        "url": r.entry_id,
+        "pdf_url": r.pdf_url
+    }
+
+
+# ================= 本地查询匹配 =================
+# 合并查询返回的结果需要分发回各个关键词，这里在本地近似执行 arXiv 查询语法
+
+class _Unsupported(Exception):
+    """查询中有本地无法判断的部分（如 cat: 分类），该关键词改为单独查询"""
+
+
+def _stem(word: str) -> str:
+    """粗略词干：去掉常见英文词尾，按前缀匹配以近似 arXiv 的词干检索"""
+    for suffix in ("ing", "es", "ed", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def _term_matcher(term: str, fields: tuple):
+    wildcard = term.endswith("*")
+    words = _WORD_RE.findall(term.strip('"').lower())
+    if not words:
+        raise _Unsupported(term)
+    stems = words if wildcard else [_stem(w) for w in words]
+
+    def match(paper: dict) -> bool:
+        for field in fields:
+            text = _WORD_RE.findall(paper.get(field, "").lower())
+            for i in range(len(text) - len(stems) + 1):
+                if all(text[i + j].startswith(s) for j, s in enumerate(stems)):
+                    return True
+        return False
+
+    return match
+
+
+def _parse_query(query: str):
+    """
+    解析 arXiv 查询为匹配函数，支持：词、"短语"、ti:/au:/abs:/all: 字段、AND / OR / ANDNOT / NOT 和括号
+    相邻的词之间没有运算符时按 AND 处理
+    """
+    tokens = _TOKEN_RE.findall(query)
+    pos = 0
+
+    def peek():
+        return tokens[pos] if pos < len(tokens) else None
+
+    def take():
+        nonlocal pos
+        pos += 1
+        return tokens[pos - 1]
+
+    def parse_or():
+        left = parse_and()
+        while peek() == "OR":
+            take()
+            right = parse_and()
+            left = (lambda a, b: lambda p: a(p) or b(p))(left, right)
+        return left
+
+    def parse_and():
+        left = parse_unary()
+        while peek() not in (None, "OR", ")"):
+            negate = False
+            if peek() == "AND":
+                take()
+            elif peek() == "ANDNOT":
+                take()
+                negate = True
+            right = parse_unary()
+            if negate:
+                left = (lambda a, b: lambda p: a(p) and not b(p))(left, right)
+            else:
+                left = (lambda a, b: lambda p: a(p) and b(p))(left, right)
+        return left
+
+    def parse_unary():
+        token = peek()
+        if token is None or token in ("AND", "OR", "ANDNOT", ")"):
+            raise _Unsupported(query)
+        take()
+        if token == "NOT":
+            inner = parse_unary()
+            return lambda p: not inner(p)
+        if token == "(":
+            inner = parse_or()
+            if peek() != ")":
+                raise _Unsupported(query)
+            take()
+            return inner
+        if ":" in token and not token.startswith('"'):
+            field, term = token.split(":", 1)
+            if field.lower() not in _FIELDS:
+                raise _Unsupported(token)
+            return _term_matcher(term, _FIELDS[field.lower()])
+        return _term_matcher(token, _FIELDS["all"])
+
+    matcher = parse_or()
+    if pos != len(tokens):
+        raise _Unsupported(query)
+    return matcher
+
+
+def compile_query(query: str):
+    """
+    把 arXiv 查询编译为本地匹配函数
+
+    :return: match(paper) -> bool，查询无法在本地判断时返回 None
+    """
+    try:
+        return _parse_query(query)
+    except _Unsupported:
+        return None
+
+
+# ================= 批量抓取 =================
+
+class _FetchRequest:
+    def __init__(self, query: str, last_published: Optional[str], limit: int):
+        self.query = query
+        self.last_published = last_published
+        self.limit = limit
+        self.futures = []
+        self.papers = []
+        self.done = False
+
+
+class ArxivFetcher:
+    """
+    合并抓取调度器
+    - 空闲时提交的查询立即抓取；抓取进行中到达的查询排队，当前批次结束后合并为下一批，
+      相同关键词只抓一次（同时触发的定时搜索因此自然合并，交互搜索不需要等待）
+    - 可在本地匹配的关键词用 OR 合并为一次按时间倒序的搜索，结果按关键词分发，
+      N 个关键词通常只需要一两页请求，而不是 N 次完整搜索；一页不够时继续翻页，
+      直到每个关键词都完成或达到 MAX_MERGED_RESULTS，之后才对剩下的关键词单独补抓
+    - 所有请求共用一个 arxiv.Client，受同一个请求间隔约束
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._flushing = False  # 是否有调度线程正在处理批次
+        self._lock = threading.Lock()
+        self.fallbacks = 0  # 合并查询翻到上限后改为单独补抓的关键词数
+
+    def fetch(self, query: str, last_published: str = None, limit: int = 5) -> list:
+        """
+        抓取关键词下的最新论文（阻塞直到所在批次完成）
+
+        :param query: arXiv 查询
+        :param last_published: 只要比该提交时间更新的论文，None 表示取最新的 limit 篇
+        :param limit: 最多返回的论文数
+        :return: 论文字典列表，按提交时间倒序
+        """
+        future = Future()
+        key = PaperStore.normalize_query(query)
+        with self._lock:
+            request = self._pending.get(key)
+            if request is None:
+                request = self._pending[key] = _FetchRequest(query, last_published, limit)
+            else:
+                # 相同关键词的多个订阅者：取更宽的范围，结果各自截取
+                if last_published is None or (request.last_published and last_published < request.last_published):
+                    request.last_published = last_published
+                request.limit = max(request.limit, limit)
+            request.futures.append(future)
+            start = not self._flushing
+            self._flushing = True
+        if start:
+            threading.Thread(target=self._drain, name="arxiv-fetcher", daemon=True).start()
+
+        papers = future.result()
+        if last_published is not None:
+            papers = [p for p in papers if p["published"] >= last_published]
+        return papers[:limit]
+
+    def _drain(self):
+        """依次处理排队的批次，直到没有待抓取的查询"""
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._flushing = False
+                    return
+                requests = list(self._pending.values())
+                self._pending = {}
+            try:
+                self._flush(requests)
+            except Exception as e:
+                for request in requests:
+                    for future in request.futures:
+                        if not future.done():
+                            future.set_exception(e)
+
+    def _flush(self, requests: list):
+        mergeable, single = [], []
+        for request in requests:
+            (mergeable if compile_query(request.query) else single).append(request)
+        groups = [mergeable[i:i + MAX_BATCH_QUERIES] for i in range(0, len(mergeable), MAX_BATCH_QUERIES)]
+        if len(groups) == 1 and len(groups[0]) == 1:
+            single.extend(groups.pop())
+
+        for group in groups:
+            self._run(self._fetch_merged, group)
+        for request in single:
+            self._run(self._fetch_single, [request])
+
+    def _run(self, func, requests: list):
+        try:
+            mode = "merged" if func == self._fetch_merged else "single"
+            with span("arxiv.fetch", mode=mode, queries=len(requests)) as trace:
+                func(requests)
+                trace.set(papers=sum(len(request.papers) for request in requests))
+            for request in requests:
+                for future in request.futures:
+                    future.set_result(list(request.papers))
+        except Exception as e:
+            for request in requests:
+                for future in request.futures:
+                    future.set_exception(e)
+
+    @staticmethod
+    def _accept(request: _FetchRequest, paper: dict) -> bool:
+        """判断论文是否还在请求范围内；越过 last_published 或数量够了即标记完成"""
+        if request.last_published is not None and paper["published"] < request.last_published:
+            request.done = True
+            return False
+        return True
+
+    def _fetch_single(self, requests: list):
+        request = requests[0]
+        for r in iter_results(newest_first(request.query, request.limit)):
+            paper = to_paper_info(r)
+            if not self._accept(request, paper):
+                break
+            request.papers.append(paper)
+
+    def _fetch_merged(self, requests: list):
+        matchers = [compile_query(r.query) for r in requests]
+        combined = " OR ".join(f"({r.query})" for r in requests)
+
+        # 按页翻阅（iter_results 提前停止时不再请求后续页），不按 limit 之和截断：
+        # 高频关键词占满第一页时，其余关键词在后面的页中继续收集
+        seen = 0
+        for r in iter_results(newest_first(combined, MAX_MERGED_RESULTS)):
+            seen += 1
+            paper = to_paper_info(r)
+            for request, match in zip(requests, matchers):
+                if request.done or not self._accept(request, paper):
+                    continue
+                if match(paper):
+                    request.papers.append(paper)
+                    if len(request.papers) >= request.limit:
+                        request.done = True
+            if all(request.done for request in requests):
+                break
+
+        # 翻到上限仍未完成的关键词（命中很少的关键词被高频关键词挤出），单独补抓；
+        # 没翻到上限说明结果已经取完，未完成的关键词也没有更多论文
+        fallbacks = 0
+        if seen >= MAX_MERGED_RESULTS:
+            for request in requests:
+                if not request.done:
+                    fallbacks += 1
+                    request.papers = []
+                    self._fetch_single([request])
+        with self._lock:
+            self.fallbacks += fallbacks
+        print(f"[Arxiv] 合并抓取 {len(requests)} 个关键词，共翻阅 {seen} 篇，单独补抓 {fallbacks} 个")
+
+
+# ================= 全局实例 =================
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_fetcher() -> ArxivFetcher:
+    """进程内共享的抓取调度器"""
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = ArxivFetcher()
+        return _fetcher
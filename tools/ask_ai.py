@@ -1,8 +1,11 @@
 import os
 import sys
-import base64
-import io
 import re
+import json
+import time
+import hashlib
+import threading
+from typing import Iterator
 
 # ================= Windows 编码修复 =================
 # 解决 PyInstaller 打包后 emoji 输出乱码问题
@@ -18,16 +21,26 @@ if sys.platform == 'win32':
         sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, errors='replace')
 
 from openai import OpenAI
-from PIL import Image
+
+from provider_router import get_router
+from tracing import current_span, detached_span, payload_bytes, span, traced
+
+# 服务商地址，可用 SILICONFLOW_BASE_URL / GITHUB_MODELS_BASE_URL 环境变量覆盖（例如指向本地模拟服务）
+SILICONFLOW_ENDPOINT = "https://api.siliconflow.cn/v1"
+GITHUB_MODELS_ENDPOINT = "https://models.github.ai/inference"
+
 
 # ================= 路径工具 =================
 
 def get_app_dir():
     """
     获取应用程序所在目录
+    - 设置了 YANZHI_APP_DIR 时: 返回该目录（基准测试等场景用临时目录隔离配置和缓存）
     - 开发时: 返回脚本所在目录
     - 打包后: 返回 exe 所在目录
     """
+    if os.environ.get("YANZHI_APP_DIR"):
+        return os.environ["YANZHI_APP_DIR"]
     if getattr(sys, 'frozen', False):
         # PyInstaller 打包后
         return os.path.dirname(sys.executable)
@@ -78,8 +91,149 @@ def load_env_file(env_path: str = None):
 load_env_file()
 
 
+# ================= API 健康缓存 =================
+
+HEALTH_CACHE_TTL = 6 * 60 * 60  # 健康记录有效期（秒）
+
+
+class ProviderHealthCache:
+    """
+    持久化的 API 健康状态缓存
+    以 endpoint + 模型名 + token 哈希为键，记录最近一次检查结果，跨进程复用，
+    避免每个进程启动时都发送一次测试请求
+    """
+    
+    def __init__(self, path: str = None, ttl: float = HEALTH_CACHE_TTL):
+        if path is None:
+            path = os.path.join(get_app_dir(), "api_health.json")
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def make_key(config: dict) -> str:
+        """生成缓存键（token 只保存哈希，不落盘明文）"""
+        token_hash = hashlib.sha256(config['token'].encode('utf-8')).hexdigest()[:16]
+        return f"{config['endpoint']}|{config['model_name']}|{token_hash}"
+    
+    def _load(self) -> dict:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def get(self, config: dict):
+        """
+        查询健康状态
+        
+        :return: True 可用 / False 不可用 / None 未知或已过期
+        """
+        entry = self._load().get(self.make_key(config))
+        if not entry or time.time() - entry.get('checked_at', 0) > self.ttl:
+            return None
+        return bool(entry.get('ok'))
+    
+    def record(self, config: dict, ok: bool, error: str = None):
+        """写入一次检查结果（原子替换文件）"""
+        with self._lock:
+            data = self._load()
+            data[self.make_key(config)] = {
+                'name': config.get('name'),
+                'ok': ok,
+                'checked_at': time.time(),
+                'error': error,
+            }
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"⚠️ 写入 API 健康缓存失败: {e}")
+    
+    def mark_healthy(self, config: dict):
+        """记录为可用（已有有效的可用记录时不重复写盘）"""
+        if self.get(config) is not True:
+            self.record(config, True)
+
+
+_health_cache = ProviderHealthCache()
+
+
+def _is_provider_error(error: Exception) -> bool:
+    """判断异常是否说明 API 本身不可用（网络、鉴权、模型不存在、服务端错误）"""
+    from openai import APIConnectionError, APIStatusError
+    
+    if isinstance(error, APIConnectionError):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code in (401, 403, 404) or error.status_code >= 500
+    return False
+
+
+def probe_config(config: dict, client: OpenAI = None) -> bool:
+    """
+    向指定 API 发送一次最小的测试请求，并把结果写入健康缓存
+    
+    :return: 是否可用
+    """
+    try:
+        print(f"🔍 测试 {config['name']} API...")
+        client = client or get_shared_client(config['endpoint'], config['token'])
+        with span("api.probe", provider=config['name'], model=config['model_name']) as trace:
+            response = client.chat.completions.create(
+                messages=[
+                    {"role": "user", "content": "hi"}
+                ],
+                temperature=0.1,
+                max_tokens=5,
+                model=config['model_name']
+            )
+            trace.add_usage(response)
+        print(f"✅ {config['name']} API 可用")
+        _health_cache.record(config, True)
+        return True
+    except Exception as e:
+        print(f"❌ {config['name']} API 不可用: {e}")
+        _health_cache.record(config, False, str(e))
+        return False
+
+
+def probe_in_background(configs: list):
+    """在后台线程中依次探测 API，不阻塞调用方"""
+    def _run():
+        for config in configs:
+            probe_config(config)
+    
+    threading.Thread(target=_run, name="api-probe", daemon=True).start()
+
+
+# ================= 共享 HTTP 客户端 =================
+
+_shared_clients = {}
+_shared_clients_lock = threading.Lock()
+
+
+def get_shared_client(endpoint: str, token: str) -> OpenAI:
+    """
+    获取某个 endpoint 共享的同步 OpenAI 客户端
+    同一进程内复用同一个 HTTP 连接池，避免每次请求重新建立连接
+    """
+    key = (endpoint, hashlib.sha256(token.encode('utf-8')).hexdigest())
+    with _shared_clients_lock:
+        client = _shared_clients.get(key)
+        if client is None:
+            client = OpenAI(base_url=endpoint, api_key=token)
+            _shared_clients[key] = client
+        return client
+
+
 # ================= AI 客户端类 =================
 
+OCR_PROMPT = "请识别并输出图片中的所有文字内容，保持原有格式和结构。如果图片中包含公式、代码或表格，请尽量保持其格式。"
+
+
 class AIClient:
     """
     多模态 AI 客户端，支持文本和图片输入
@@ -106,21 +260,18 @@ class AIClient:
         优先级：
         1. SILICONFLOW_API_KEY (硅基流动 - Qwen，速度快)
         2. GITHUB_TOKEN (GitHub Models - GPT-4o)
+        
+        不再在初始化时发送测试请求：优先使用磁盘缓存中仍在有效期内的健康记录，
+        没有记录的 API 会被直接选用，由第一次真实请求兼作健康检查
         """
         self.system_prompt = system_prompt
         
         # 如果已有验证过的配置，直接使用
         if AIClient._verified_config:
-            config = AIClient._verified_config
-            self.token = config['token']
-            self.endpoint = config['endpoint']
-            self.model_name = config['model_name']
-            self.is_vlm = config.get('is_vlm', False)
-            self.client = OpenAI(base_url=self.endpoint, api_key=self.token)
+            self._activate(AIClient._verified_config)
             return
         
-        # 首次初始化：测试可用的 API
-        self._init_with_test()
+        self._select_config()
     
     def _is_vlm_model(self, model_name: str) -> bool:
         """检查模型是否支持视觉（VLM）"""
@@ -130,17 +281,16 @@ class AIClient:
                 return True
         return False
     
-    def _init_with_test(self):
-        """测试并初始化可用的 API"""
-        
-        # API 配置列表（按优先级排序）
+    @staticmethod
+    def _get_api_configs() -> list:
+        """根据环境变量生成 API 配置列表（按优先级排序）"""
         api_configs = []
         # 1. SiliconFlow (备用 - Qwen2.5-7B 是纯文本模型)
         if os.environ.get("SILICONFLOW_API_KEY"):
             api_configs.append({
                 'name': 'SiliconFlow',
                 'token': os.environ.get("SILICONFLOW_API_KEY"),
-                'endpoint': "https://api.siliconflow.cn/v1",
+                'endpoint': os.environ.get("SILICONFLOW_BASE_URL") or SILICONFLOW_ENDPOINT,
                 'model_name': "Qwen/Qwen2.5-7B-Instruct",
                 'display': "🚀 硅基流动 Qwen2.5-7B + OCR",
                 'is_vlm': False
@@ -150,56 +300,108 @@ class AIClient:
             api_configs.append({
                 'name': 'GitHub',
                 'token': os.environ.get("GITHUB_TOKEN"),
-                'endpoint': "https://models.github.ai/inference",
+                'endpoint': os.environ.get("GITHUB_MODELS_BASE_URL") or GITHUB_MODELS_ENDPOINT,
                 'model_name': "openai/gpt-4o",
                 'display': "🐙 GitHub GPT-4o (VLM)",
                 'is_vlm': True
             })
-
+        return api_configs
+    
+    def _activate(self, config: dict, client: OpenAI = None):
+        """切换当前实例使用的 API 配置"""
+        self.token = config['token']
+        self.endpoint = config['endpoint']
+        self.model_name = config['model_name']
+        self.is_vlm = config.get('is_vlm', False)
+        self.client = client or get_shared_client(self.endpoint, self.token)
+        self._config = config
+        
+        # 缓存配置
+        AIClient._verified_config = config
+        AIClient._current_model_display = config['display']
+        
+        # 如果不是 VLM，初始化 OCR 配置
+        if not self.is_vlm and not AIClient._ocr_config:
+            self._init_ocr()
+    
+    def _select_config(self, exclude: set = None):
+        """
+        选择一个 API 配置，不发送任何网络请求
         
+        健康缓存中记录为不可用的配置会被跳过；记录为可用或没有记录的配置按优先级选用。
+        没有记录的配置会在后台补充探测，结果写入磁盘供后续进程使用
+        
+        :param exclude: 本进程内已确认失败、需要跳过的 endpoint 集合
+        """
+        api_configs = self._get_api_configs()
         if not api_configs:
             raise ValueError("请设置环境变量: SILICONFLOW_API_KEY 或 GITHUB_TOKEN")
         
-        # 逐个测试 API
-        for config in api_configs:
-            try:
-                print(f"🔍 测试 {config['name']} API...")
-                client = OpenAI(base_url=config['endpoint'], api_key=config['token'])
-                
-                # 发送测试请求
-                response = client.chat.completions.create(
-                    messages=[
-                        {"role": "user", "content": "hi"}
-                    ],
-                    temperature=0.1,
-                    max_tokens=5,
-                    model=config['model_name']
-                )
-                
-                # 测试成功
-                print(f"✅ {config['name']} API 可用")
-                
-                self.token = config['token']
-                self.endpoint = config['endpoint']
-                self.model_name = config['model_name']
-                self.is_vlm = config.get('is_vlm', False)
-                self.client = client
-                
-                # 缓存配置
-                AIClient._verified_config = config
-                AIClient._current_model_display = config['display']
-                
-                # 如果不是 VLM，初始化 OCR 配置
-                if not self.is_vlm:
-                    self._init_ocr()
-                
-                return
-                
-            except Exception as e:
-                print(f"❌ {config['name']} API 不可用: {e}")
+        exclude = exclude or set()
+        candidates = [c for c in api_configs if c['endpoint'] not in exclude]
+        if not candidates:
+            raise RuntimeError("所有 API 均不可用，请检查网络或 API Key")
+        
+        selected = None
+        for config in candidates:
+            if _health_cache.get(config) is False:
+                print(f"⏭️ {config['name']} API 近期不可用，跳过")
                 continue
+            selected = config
+            break
+        
+        # 全部被标记为不可用时，仍然尝试优先级最高的那个（缓存可能已过时）
+        self._activate(selected or candidates[0])
         
-        raise RuntimeError("所有 API 均不可用，请检查网络或 API Key")
+        # 后台探测其余状态未知的配置，便于失败时快速切换
+        others = [c for c in candidates if c is not self._config and _health_cache.get(c) is None]
+        if others:
+            probe_in_background(others)
+    
+    def _route_configs(self) -> list:
+        """
+        交给路由的候选配置：当前配置在前，健康缓存中记录为不可用的排在最后
+        （路由有足够的统计数据后会按实际延迟和错误率重新排序）
+        """
+        current = ProviderHealthCache.make_key(self._config)
+        others = [c for c in self._get_api_configs() if ProviderHealthCache.make_key(c) != current]
+        others.sort(key=lambda c: _health_cache.get(c) is False)
+        return [self._config] + others
+    
+    def _routed_request(self, create):
+        """
+        包装一次请求供路由调用：失败时把服务商不可用的情况写入健康缓存
+        
+        :param create: create(config, client) -> 响应
+        """
+        def request(config):
+            try:
+                return create(config, get_shared_client(config['endpoint'], config['token']))
+            except Exception as e:
+                if _is_provider_error(e):
+                    _health_cache.record(config, False, str(e))
+                raise
+        return request
+    
+    def _on_routed(self, config: dict):
+        """请求完成后：记录健康状态，并在换了服务商时切换当前配置"""
+        _health_cache.mark_healthy(config)
+        if ProviderHealthCache.make_key(config) != ProviderHealthCache.make_key(self._config):
+            print(f"🔁 已切换到 {config['name']} API")
+            self._activate(config)
+    
+    def _messages_for(self, config: dict, messages: list, text, image) -> list:
+        """备用服务商的视觉能力与当前不同时，按它的能力重新构建 messages"""
+        if image is None or config.get('is_vlm', False) == self.is_vlm:
+            return messages
+        return self._build_messages(text, image, is_vlm=config.get('is_vlm', False))
+    
+    def probe(self) -> bool:
+        """主动发送一次测试请求检查当前 API，并写入健康缓存"""
+        ok = probe_config(self._config, client=self.client)
+        if not ok:
+            AIClient._verified_config = None
+        return ok
     
     def _init_ocr(self):
         """初始化 OCR 模型（用于非 VLM 模型处理图片）"""
@@ -207,111 +409,151 @@ class AIClient:
         if os.environ.get("SILICONFLOW_API_KEY"):
             AIClient._ocr_config = {
                 'token': os.environ.get("SILICONFLOW_API_KEY"),
-                'endpoint': "https://api.siliconflow.cn/v1",
+                'endpoint': os.environ.get("SILICONFLOW_BASE_URL") or SILICONFLOW_ENDPOINT,
                 'model_name': "deepseek-ai/DeepSeek-OCR"
             }
             print("📷 已配置 DeepSeek-OCR 用于图片文字识别")
         else:
             print("⚠️ 未配置 SILICONFLOW_API_KEY，图片识别功能不可用")
     
+    @traced("ocr")
     def _ocr_image(self, image) -> str:
         """
         使用 OCR 模型识别图片中的文字
         
-        :param image: PIL.Image 对象或图片文件路径
+        :param image: PIL.Image 对象、图片文件路径、PyMuPDF Pixmap 或已编码的 image_prep.EncodedImage
         :return: 识别出的文字内容
         """
         if not AIClient._ocr_config:
             return "[OCR 未配置，无法识别图片内容]"
         
+        from response_cache import get_response_cache
+        
+        trace = current_span()
+        trace.set(provider="SiliconFlow", model=AIClient._ocr_config['model_name'])
+        cache = get_response_cache()
+        cache_key = None
+        if cache.should_cache(temperature=0):
+            cache_key = self._ocr_cache_key(image)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                print(f"💾 OCR 命中缓存，{len(cached)} 字符")
+                trace.set(cache="hit", chars=len(cached))
+                return cached
+            trace.set(cache="miss")
+        
         try:
-            # 转换图片为 base64
-            data_url = self._image_to_base64(image)
+            # 预处理后按图块逐个识别（普通图片只有一块）
+            data_urls = self._image_to_data_urls(image, "ocr", AIClient._ocr_config['model_name'])
             
-            # 创建 OCR 客户端
-            ocr_client = OpenAI(
-                base_url=AIClient._ocr_config['endpoint'],
-                api_key=AIClient._ocr_config['token']
+            # 复用 OCR 服务的共享客户端
+            ocr_client = get_shared_client(
+                AIClient._ocr_config['endpoint'],
+                AIClient._ocr_config['token']
             )
             
             # 调用 OCR 模型
-            response = ocr_client.chat.completions.create(
-                model=AIClient._ocr_config['model_name'],
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": data_url
-                                }
-                            },
-                            {
-                                "type": "text",
-                                "text": "请识别并输出图片中的所有文字内容，保持原有格式和结构。如果图片中包含公式、代码或表格，请尽量保持其格式。"
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=4096
-            )
+            parts = []
+            for data_url in data_urls:
+                response = ocr_client.chat.completions.create(
+                    model=AIClient._ocr_config['model_name'],
+                    messages=self._ocr_messages(data_url),
+                    max_tokens=4096
+                )
+                trace.add_usage(response)
+                parts.append(response.choices[0].message.content)
             
-            ocr_text = response.choices[0].message.content
-            print(f"📷 OCR 识别完成，识别到 {len(ocr_text)} 字符")
-            print(f"--- OCR 识别内容 开始 ---\n{ocr_text}\n--- OCR 识别内容 结束 ---")
+            ocr_text = "\n".join(parts)
+            print(f"📷 OCR 识别完成（{len(data_urls)} 块），识别到 {len(ocr_text)} 字符")
+            trace.set(tiles=len(data_urls), bytes=sum(len(url) for url in data_urls), chars=len(ocr_text))
+            if cache_key:
+                cache.put(cache_key, "ocr", ocr_text)
             return ocr_text
             
         except Exception as e:
             print(f"❌ OCR 识别失败: {e}")
+            trace.set(ok=False, error=f"{type(e).__name__}: {e}"[:300])
             return f"[OCR 识别失败: {e}]"
     
+    @staticmethod
+    def _ocr_messages(data_url: str) -> list:
+        """构建 OCR 请求的 messages"""
+        return [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": data_url
+                        }
+                    },
+                    {
+                        "type": "text",
+                        "text": OCR_PROMPT
+                    }
+                ]
+            }
+        ]
+    
+    @staticmethod
+    def _ocr_cache_key(image) -> str:
+        """OCR 结果的缓存键（按图片原始字节计算，命中时无需重新编码图片）"""
+        from response_cache import ResponseCache, image_digest
+        from image_prep import prep_signature
+        
+        model_name = AIClient._ocr_config['model_name']
+        return ResponseCache.make_key("ocr", model_name,
+                                      prompt=OCR_PROMPT, max_tokens=4096,
+                                      image=image_digest(image),
+                                      prep=prep_signature("ocr", model_name))
+    
+    def _chat_cache_key(self, messages: list, temperature: float, max_tokens: int) -> str:
+        """对话请求的缓存键"""
+        from response_cache import ResponseCache
+        
+        return ResponseCache.make_key("chat", self.model_name, messages=messages,
+                                      temperature=temperature, max_tokens=max_tokens)
+    
     @classmethod
     def get_current_model_display(cls) -> str:
         """获取当前使用的模型显示名称"""
         return cls._current_model_display or "未初始化"
     
-    def _image_to_base64(self, image) -> str:
+    def _image_to_data_urls(self, image, purpose: str = "vlm", model: str = None) -> list:
         """
-        将图片转换为 base64 编码的 data URL
-        
+        将图片预处理（缩放、切块、按内容选择编码）后转换为 data URL
+
         :param image: PIL.Image 对象或图片文件路径
-        :return: data URL 字符串
+        :param purpose: "ocr" 或 "vlm"，见 image_prep.prepare_image
+        :param model: 目标模型名称，默认为当前模型
+        :return: data URL 列表（长图切块时有多个）
         """
-        if isinstance(image, str):
-            # 如果是文件路径，先加载图片
-            image = Image.open(image)
-        
-        # 转换为 RGB 避免 RGBA 问题
-        if image.mode in ('RGBA', 'LA'):
-            background = Image.new('RGB', image.size, (255, 255, 255))
-            background.paste(image, image.split()[-1] if image.mode == 'RGBA' else None)
-            image = background
-        elif image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        buffered = io.BytesIO()
-        image.save(buffered, format="JPEG", quality=85)
-        img_base64 = base64.b64encode(buffered.getvalue()).decode("utf-8")
-        return f"data:image/jpeg;base64,{img_base64}"
+        from image_prep import prepare_image
+
+        model = model or getattr(self, 'model_name', None)
+        with span("image.encode", purpose=purpose, model=model) as trace:
+            encoded = prepare_image(image, purpose, model)
+            trace.set(tiles=len(encoded), bytes=sum(len(e) for e in encoded))
+        return [e.to_data_url() for e in encoded]
     
-    def ask(self, text: str = None, image = None, 
-            temperature: float = 0.7, max_tokens: int = 2000) -> str:
+    def _build_messages(self, text: str = None, image = None, ocr_text: str = None,
+                        is_vlm: bool = None) -> list:
         """
-        向 AI 发送请求，支持文本和/或图片输入
+        构建 chat.completions 请求的 messages
+        当前模型不支持视觉时，先用 OCR 把图片转换为文字
         
         :param text: 文本输入（可选）
         :param image: 图片输入，可以是 PIL.Image 对象或图片路径（可选）
-        :param temperature: 生成温度，控制随机性
-        :param max_tokens: 最大生成 token 数
-        :return: AI 的回复文本
+        :param ocr_text: 已经识别好的图片文字（可选，提供时不再调用 OCR）
+        :param is_vlm: 目标模型是否支持视觉，默认取当前配置
+        :return: messages 列表
         """
-        if text is None and image is None:
-            raise ValueError("text 和 image 至少需要提供一个")
+        if is_vlm is None:
+            is_vlm = getattr(self, 'is_vlm', False)
         
         # 如果有图片但当前模型不是 VLM，使用 OCR 提取文字
-        ocr_text = None
-        if image and not getattr(self, 'is_vlm', False):
+        if image and not is_vlm:
             print("📷 当前模型不支持视觉，使用 OCR 识别图片...")
             ocr_text = self._ocr_image(image)
             # OCR 后不再需要图片
@@ -341,15 +583,15 @@ class AIClient:
                 })
         
         # 如果是 VLM 且有图片，添加图片
-        if image and getattr(self, 'is_vlm', False):
+        if image and is_vlm:
             try:
-                data_url = self._image_to_base64(image)
-                content.append({
-                    "type": "image_url",
-                    "image_url": {
-                        "url": data_url
-                    }
-                })
+                for data_url in self._image_to_data_urls(image, "vlm"):
+                    content.append({
+                        "type": "image_url",
+                        "image_url": {
+                            "url": data_url
+                        }
+                    })
             except Exception as e:
                 print(f"⚠️ 图片处理失败: {e}")
         
@@ -359,34 +601,159 @@ class AIClient:
         else:
             user_content = content
         
+        return [
+            {
+                "role": "system",
+                "content": self.system_prompt,
+            },
+            {
+                "role": "user",
+                "content": user_content,
+            }
+        ]
+    
+    @traced("ai.ask")
+    def ask(self, text: str = None, image = None, 
+            temperature: float = 0.7, max_tokens: int = 2000,
+            use_cache: bool = None) -> str:
+        """
+        向 AI 发送请求，支持文本和/或图片输入
+        
+        :param text: 文本输入（可选）
+        :param image: 图片输入，可以是 PIL.Image 对象或图片路径（可选）
+        :param temperature: 生成温度，控制随机性
+        :param max_tokens: 最大生成 token 数
+        :param use_cache: 是否使用响应缓存，None 表示按默认策略（见 ResponseCache.should_cache）
+        :return: AI 的回复文本
+        """
+        if text is None and image is None:
+            raise ValueError("text 和 image 至少需要提供一个")
+        
+        from response_cache import get_response_cache
+        
+        messages = self._build_messages(text, image)
+        trace = current_span()
+        trace.set(provider=self._config['name'], model=self.model_name, bytes=payload_bytes(messages))
+        
+        cache = get_response_cache()
+        cache_key = None
+        if cache.should_cache(temperature, use_cache):
+            cache_key = self._chat_cache_key(messages, temperature, max_tokens)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                print("💾 AI 请求命中缓存")
+                trace.set(cache="hit")
+                return cached
+            trace.set(cache="miss")
+        
+        # 由路由选择当前最快且健康的服务商，失败时自动换下一个
+        cache_model = self.model_name
+        request = self._routed_request(lambda config, client: client.chat.completions.create(
+            messages=self._messages_for(config, messages, text, image),
+            temperature=temperature,
+            max_tokens=max_tokens,
+            model=config['model_name']
+        ))
         try:
-            response = self.client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": self.system_prompt,
-                    },
-                    {
-                        "role": "user",
-                        "content": user_content,
-                    }
-                ],
-                temperature=temperature,
-                max_tokens=max_tokens,
-                model=self.model_name
-            )
-            return response.choices[0].message.content
+            config, response = get_router().call(self._route_configs(), request)
         except Exception as e:
             raise RuntimeError(f"AI 请求失败: {e}")
+        
+        # 第一次真实请求成功即视为健康检查通过
+        self._on_routed(config)
+        trace.set(provider=config['name'], model=config['model_name'])
+        trace.add_usage(response)
+        
+        answer = response.choices[0].message.content
+        # 换了模型时不写入按原模型计算的缓存键
+        if cache_key and answer and config['model_name'] == cache_model:
+            cache.put(cache_key, "chat", answer)
+        return answer
+    
+    def ask_stream(self, text: str = None, image = None, 
+                   temperature: float = 0.7, max_tokens: int = 2000) -> Iterator[str]:
+        """
+        流式版本的 ask()，模型每生成一段文本就 yield 一次
+        
+        :param text: 文本输入（可选）
+        :param image: 图片输入，可以是 PIL.Image 对象或图片路径（可选）
+        :param temperature: 生成温度，控制随机性
+        :param max_tokens: 最大生成 token 数
+        :return: 逐段生成的回复文本
+        
+        使用示例:
+            for delta in client.ask_stream(text="什么是深度学习？"):
+                print(delta, end="", flush=True)
+        """
+        if text is None and image is None:
+            raise ValueError("text 和 image 至少需要提供一个")
+        
+        # 生成器在 yield 期间会交出控制权，耗时段不设为当前耗时段，结束（或调用方提前停止）时写入
+        trace = detached_span("ai.stream", provider=self._config['name'], model=self.model_name)
+        error = None
+        try:
+            yield from self._ask_stream(text, image, temperature, max_tokens, trace)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            trace.finish(error)
+    
+    def _ask_stream(self, text, image, temperature: float, max_tokens: int, trace) -> Iterator[str]:
+        messages = self._build_messages(text, image)
+        trace.set(bytes=payload_bytes(messages))
+        
+        # 流式请求只按首包时间统计，不做对冲（两个流无法合并）
+        request = self._routed_request(lambda config, client: client.chat.completions.create(
+            messages=self._messages_for(config, messages, text, image),
+            temperature=temperature,
+            max_tokens=max_tokens,
+            model=config['model_name'],
+            stream=True
+        ))
+        try:
+            config, stream = get_router().call(self._route_configs(), request, hedge=False, metric="stream")
+        except Exception as e:
+            raise RuntimeError(f"AI 请求失败: {e}")
+        
+        self._on_routed(config)
+        trace.set(provider=config['name'], model=config['model_name'])
+        
+        chunks = 0
+        try:
+            for chunk in stream:
+                # 部分服务商在最后一段附带 usage
+                trace.add_usage(chunk)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if chunks == 0:
+                        trace.set(first_chunk_ms=round(trace.elapsed_ms(), 2))
+                    chunks += 1
+                    trace.set(chunks=chunks)
+                    yield delta
+        except Exception as e:
+            raise RuntimeError(f"AI 流式响应中断: {e}")
 
 
 # ================= 便捷函数 =================
 
 _default_client = None
 
+def _get_default_client(system_prompt: str) -> AIClient:
+    """获取（必要时重建）模块级默认客户端"""
+    global _default_client
+    
+    if _default_client is None or _default_client.system_prompt != system_prompt:
+        _default_client = AIClient(system_prompt=system_prompt)
+    return _default_client
+
+
 def ask_ai(text: str = None, image = None, 
            system_prompt: str = "你是一个乐于助人的AI助手。",
-           temperature: float = 0.7, max_tokens: int = 2000) -> str:
+           temperature: float = 0.7, max_tokens: int = 2000,
+           use_cache: bool = None) -> str:
     """
     便捷函数：向 AI 发送请求
     
@@ -395,6 +762,7 @@ def ask_ai(text: str = None, image = None,
     :param system_prompt: 系统提示词
     :param temperature: 生成温度
     :param max_tokens: 最大生成 token 数
+    :param use_cache: 是否使用响应缓存，None 表示按默认策略
     :return: AI 的回复文本
     
     使用示例:
@@ -411,13 +779,21 @@ def ask_ai(text: str = None, image = None,
         img = Image.open("chart.png")
         response = ask_ai(text="解释这个图表", image=img)
     """
-    global _default_client
-    
-    if _default_client is None or _default_client.system_prompt != system_prompt:
-        _default_client = AIClient(system_prompt=system_prompt)
+    return _get_default_client(system_prompt).ask(text=text, image=image, 
+                                                  temperature=temperature, max_tokens=max_tokens,
+                                                  use_cache=use_cache)
+
+
+def ask_ai_stream(text: str = None, image = None, 
+                  system_prompt: str = "你是一个乐于助人的AI助手。",
+                  temperature: float = 0.7, max_tokens: int = 2000) -> Iterator[str]:
+    """
+    便捷函数：以流式方式向 AI 发送请求，参数同 ask_ai()
     
-    return _default_client.ask(text=text, image=image, 
-                                temperature=temperature, max_tokens=max_tokens)
+    :return: 逐段生成的回复文本
+    """
+    return _get_default_client(system_prompt).ask_stream(text=text, image=image, 
+                                                         temperature=temperature, max_tokens=max_tokens)
 
 
 # ================= 测试入口 =================
@@ -430,6 +806,7 @@ if __name__ == "__main__":
         print("=" * 50)
         
         client = AIClient()
+        client.probe()
         print(f"\n✅ 初始化成功！当前模型: {AIClient.get_current_model_display()}")
         print(f"   是否 VLM: {client.is_vlm}")
         
@@ -0,0 +1,337 @@
+import time
+import asyncio
+import random
+import weakref
+from typing import Optional
+
+import httpx
+from openai import (AsyncOpenAI, DefaultAsyncHttpxClient,
+                    APIConnectionError, APIStatusError, RateLimitError)
+
+from ask_ai import AIClient, _health_cache, _is_provider_error
+from provider_router import classify_error, get_router
+from tracing import current_span, payload_bytes, traced
+
+
+# ================= 默认配置 =================
+
+DEFAULT_CONCURRENCY = 4  # ask_many / ocr_many 默认并发数
+MAX_CONNECTIONS = 16  # 每个 endpoint 连接池上限
+MAX_RETRIES = 4  # 限流或临时错误的最大重试次数
+BACKOFF_BASE = 1.0  # 指数退避的基础等待时间（秒）
+BACKOFF_MAX = 30.0  # 单次等待上限（秒）
+
+
+# ================= 共享异步 HTTP 客户端 =================
+
+# AsyncOpenAI 内部的 httpx 连接池与事件循环绑定，因此按事件循环分别缓存
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_shared_async_client(endpoint: str, token: str) -> AsyncOpenAI:
+    """
+    获取当前事件循环中某个 endpoint 共享的 AsyncOpenAI 客户端
+    同一 endpoint 的所有并发请求复用一个连接池；重试由本模块统一处理，关闭 SDK 自带重试
+    """
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.setdefault(loop, {})
+    key = (endpoint, token)
+    client = clients.get(key)
+    if client is None:
+        http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS,
+                                max_keepalive_connections=MAX_CONNECTIONS)
+        )
+        client = AsyncOpenAI(base_url=endpoint, api_key=token,
+                             http_client=http_client, max_retries=0)
+        clients[key] = client
+    return client
+
+
+async def close_shared_async_clients():
+    """关闭当前事件循环中缓存的所有客户端（事件循环结束前调用）"""
+    clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.close()
+
+
+async def _run_sync(func, *args):
+    """在线程池中执行阻塞函数（图片编码、缓存读写等），不阻塞事件循环"""
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+def _is_retryable(error: Exception) -> bool:
+    """限流、网络错误和服务端错误可以重试"""
+    if isinstance(error, (RateLimitError, APIConnectionError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code >= 500
+    return False
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """计算重试等待时间：优先使用服务端给出的 Retry-After，否则指数退避加随机抖动"""
+    response = getattr(error, 'response', None)
+    if response is not None:
+        retry_after = response.headers.get('retry-after')
+        if retry_after:
+            try:
+                return min(float(retry_after), BACKOFF_MAX)
+            except ValueError:
+                pass
+    delay = min(BACKOFF_BASE * (2 ** attempt), BACKOFF_MAX)
+    return delay * (0.5 + random.random() / 2)
+
+
+# ================= 异步 AI 客户端 =================
+
+class AsyncAIClient:
+    """
+    异步多模态 AI 客户端
+    API 选择、健康缓存、服务商路由、消息构建和响应缓存沿用 AIClient，网络请求改为 AsyncOpenAI，
+    适合批量分类截图、批量 OCR 等需要大量并发请求的场景
+    """
+
+    def __init__(self, system_prompt: str = "你是一个乐于助人的AI助手。",
+                 max_concurrency: int = DEFAULT_CONCURRENCY):
+        """
+        :param system_prompt: 系统提示词
+        :param max_concurrency: ask_many / ocr_many 的默认并发数
+        """
+        self._sync = AIClient(system_prompt=system_prompt)
+        self.max_concurrency = max_concurrency
+
+    @property
+    def system_prompt(self) -> str:
+        return self._sync.system_prompt
+
+    @property
+    def model_name(self) -> str:
+        return self._sync.model_name
+
+    @property
+    def is_vlm(self) -> bool:
+        return self._sync.is_vlm
+
+    async def _create_with_retry(self, config: dict, retry: bool = True, **kwargs):
+        """
+        向某个服务商发送请求，每次尝试的耗时和成败都记入路由统计
+
+        :param config: API 配置
+        :param retry: 遇到限流或临时错误时是否退避重试（还有其他服务商可换时不重试，直接交给调用方切换）
+        """
+        router = get_router()
+        client = get_shared_async_client(config['endpoint'], config['token'])
+        for attempt in range(MAX_RETRIES + 1):
+            start = time.monotonic()
+            try:
+                response = await client.chat.completions.create(**kwargs)
+            except Exception as e:
+                router.record_failure(config, e)
+                if not retry or attempt >= MAX_RETRIES or not _is_retryable(e):
+                    raise
+                current_span().add("retries", 1)
+                delay = _retry_delay(e, attempt)
+                print(f"⏳ 请求失败（{e.__class__.__name__}），{delay:.1f}s 后第 {attempt + 1} 次重试")
+                await asyncio.sleep(delay)
+                continue
+            router.record_success(config, time.monotonic() - start)
+            return response
+
+    async def _routed_create(self, text, image, messages: list, **kwargs) -> tuple:
+        """
+        按路由排序依次尝试服务商，服务商本身的问题（classify_error 不为 None）时换下一个，
+        只有最后一个候选才退避重试
+
+        :return: (实际完成请求的配置, 响应)
+        """
+        configs = get_router().order(self._sync._route_configs())
+        errors = []
+        for index, config in enumerate(configs):
+            config_messages = await _run_sync(self._sync._messages_for, config, messages, text, image)
+            try:
+                response = await self._create_with_retry(
+                    config,
+                    retry=index == len(configs) - 1,
+                    messages=config_messages,
+                    model=config['model_name'],
+                    **kwargs
+                )
+            except Exception as e:
+                if _is_provider_error(e):
+                    _health_cache.record(config, False, str(e))
+                if classify_error(e) is None:
+                    raise
+                errors.append(e)
+                continue
+            return config, response
+        if not errors:
+            raise RuntimeError("没有可用的 API 配置")
+        raise errors[-1]
+
+    @traced("ocr")
+    async def ocr_image(self, image) -> str:
+        """
+        异步 OCR，结果与 AIClient._ocr_image 共用缓存
+
+        :param image: PIL.Image 对象或图片文件路径
+        :return: 识别出的文字内容
+        """
+        config = AIClient._ocr_config
+        if not config:
+            return "[OCR 未配置，无法识别图片内容]"
+
+        from response_cache import get_response_cache
+
+        trace = current_span()
+        trace.set(provider="SiliconFlow", model=config['model_name'])
+        cache = get_response_cache()
+        cache_key = None
+        if cache.should_cache(temperature=0):
+            cache_key = await _run_sync(self._sync._ocr_cache_key, image)
+            cached = await _run_sync(cache.get, cache_key)
+            if cached is not None:
+                trace.set(cache="hit", chars=len(cached))
+                return cached
+            trace.set(cache="miss")
+
+        try:
+            data_urls = await _run_sync(self._sync._image_to_data_urls, image, "ocr", config['model_name'])
+            # 长图的多个图块并发识别，按顺序拼接
+            responses = await asyncio.gather(*[
+                self._create_with_retry(
+                    config,
+                    model=config['model_name'],
+                    messages=AIClient._ocr_messages(data_url),
+                    max_tokens=4096
+                )
+                for data_url in data_urls
+            ])
+            for response in responses:
+                trace.add_usage(response)
+            ocr_text = "\n".join(r.choices[0].message.content for r in responses)
+            print(f"📷 OCR 识别完成，识别到 {len(ocr_text)} 字符")
+            trace.set(tiles=len(data_urls), bytes=sum(len(url) for url in data_urls), chars=len(ocr_text))
+            if cache_key:
+                await _run_sync(cache.put, cache_key, "ocr", ocr_text)
+            return ocr_text
+        except Exception as e:
+            print(f"❌ OCR 识别失败: {e}")
+            trace.set(ok=False, error=f"{type(e).__name__}: {e}"[:300])
+            return f"[OCR 识别失败: {e}]"
+
+    @traced("ai.ask")
+    async def ask(self, text: str = None, image = None,
+                  temperature: float = 0.7, max_tokens: int = 2000,
+                  use_cache: bool = None) -> str:
+        """
+        异步发送请求，参数同 AIClient.ask()
+
+        :return: AI 的回复文本
+        """
+        if text is None and image is None:
+            raise ValueError("text 和 image 至少需要提供一个")
+
+        from response_cache import get_response_cache
+
+        ocr_text = None
+        if image is not None and not self.is_vlm:
+            ocr_text = await self.ocr_image(image)
+            image = None
+        messages = await _run_sync(self._sync._build_messages, text, image, ocr_text)
+        trace = current_span()
+        trace.set(provider=self._sync._config['name'], model=self.model_name, bytes=payload_bytes(messages))
+
+        cache = get_response_cache()
+        cache_key = None
+        if cache.should_cache(temperature, use_cache):
+            cache_key = self._sync._chat_cache_key(messages, temperature, max_tokens)
+            cached = await _run_sync(cache.get, cache_key)
+            if cached is not None:
+                trace.set(cache="hit")
+                return cached
+            trace.set(cache="miss")
+
+        # 与 AIClient.ask 相同：由路由选择当前最快且健康的服务商，失败时自动换下一个
+        cache_model = self.model_name
+        try:
+            config, response = await self._routed_create(
+                text, image, messages, temperature=temperature, max_tokens=max_tokens
+            )
+        except Exception as e:
+            raise RuntimeError(f"AI 请求失败: {e}")
+        self._sync._on_routed(config)
+        trace.set(provider=config['name'], model=config['model_name'])
+        trace.add_usage(response)
+
+        answer = response.choices[0].message.content
+        # 换了模型时不写入按原模型计算的缓存键
+        if cache_key and answer and config['model_name'] == cache_model:
+            await _run_sync(cache.put, cache_key, "chat", answer)
+        return answer
+
+    async def _gather(self, coroutine_factories: list, max_concurrency: Optional[int],
+                      return_exceptions: bool) -> list:
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_concurrency)
+
+        async def _run(factory):
+            async with semaphore:
+                return await factory()
+
+        return await asyncio.gather(*[_run(f) for f in coroutine_factories],
+                                    return_exceptions=return_exceptions)
+
+    async def ask_many(self, requests: list, max_concurrency: int = None,
+                       return_exceptions: bool = True) -> list:
+        """
+        并发发送多个请求，结果顺序与输入一致
+
+        :param requests: 请求列表，每项为 ask() 的关键字参数字典，或直接是文本字符串
+        :param max_concurrency: 并发上限，默认使用构造时的 max_concurrency
+        :param return_exceptions: 为 True 时失败的请求在结果中以异常对象返回，不影响其他请求
+        :return: 回复文本列表
+
+        使用示例:
+            client = AsyncAIClient(system_prompt="你是一个文件分类助手。")
+            answers = asyncio.run(client.ask_many([
+                {"text": "描述这张图", "image": "a.png"},
+                "什么是 GAN？",
+            ]))
+        """
+        factories = []
+        for request in requests:
+            kwargs = {"text": request} if isinstance(request, str) else dict(request)
+            factories.append(lambda kwargs=kwargs: self.ask(**kwargs))
+        return await self._gather(factories, max_concurrency, return_exceptions)
+
+    async def ocr_many(self, images: list, max_concurrency: int = None) -> list:
+        """
+        并发 OCR 多张图片，结果顺序与输入一致（失败的图片返回错误说明文字）
+
+        :param images: PIL.Image 对象或图片路径列表
+        """
+        factories = [lambda image=image: self.ocr_image(image) for image in images]
+        return await self._gather(factories, max_concurrency, return_exceptions=False)
+
+
+# ================= 便捷函数 =================
+
+def ask_many(requests: list, system_prompt: str = "你是一个乐于助人的AI助手。",
+             max_concurrency: int = DEFAULT_CONCURRENCY) -> list:
+    """
+    便捷函数：在同步代码中并发发送多个请求
+
+    :param requests: 同 AsyncAIClient.ask_many()
+    :param system_prompt: 系统提示词
+    :param max_concurrency: 并发上限
+    :return: 回复文本列表（失败项为异常对象）
+    """
+    client = AsyncAIClient(system_prompt=system_prompt, max_concurrency=max_concurrency)
+
+    async def _run():
+        try:
+            return await client.ask_many(requests)
+        finally:
+            await close_shared_async_clients()
+
+    return asyncio.run(_run())
@@ -2,12 +2,29 @@ import os
 import sys
 import json
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from enum import Enum
 from typing import Optional, Union
 from PIL import Image
 
 from ask_ai import AIClient, get_app_dir
+from tracing import span, traced
+
+
+CLASSIFY_BATCH_SIZE = 20  # 批量分类时每次 AI 调用包含的内容条数
+CLASSIFY_DESC_CHARS = 300  # 批量分类时每条内容描述的最大长度
+IMAGE_DESCRIBE_PROMPT = "请简要描述这张图片的内容，用于文件分类。"
+
+
+def _parse_json_response(result_text: str):
+    """解析模型返回的 JSON（处理可能的 markdown 代码块）"""
+    if "```json" in result_text:
+        result_text = result_text.split("```json")[1].split("```")[0].strip()
+    elif "```" in result_text:
+        result_text = result_text.split("```")[1].split("```")[0].strip()
+    return json.loads(result_text)
 
 
 class InputType(Enum):
@@ -22,39 +39,38 @@ class ContentManager:
     内容管理器：根据输入内容自动分类并保存到合适的文件夹
     """
     
-    def __init__(self, config_path: str = None):
+    def __init__(self, config_path: str = None, registry=None):
         """
         初始化内容管理器
         
-        :param config_path: 文件夹结构配置文件路径，默认为 exe/脚本 同目录下的 folder_structure.json
+        :param config_path: 兼容用的文件夹结构配置文件路径，默认为 exe/脚本 同目录下的 folder_structure.json
+        :param registry: 文件夹注册表，默认使用进程内共享的注册表
         """
-        if config_path is None:
-            config_path = os.path.join(get_app_dir(), "folder_structure.json")
-        self.config_path = config_path
-        self.folder_config = self._load_folder_config()
+        from folder_registry import FolderRegistry, get_folder_registry
+        
+        if registry is None:
+            if config_path is None:
+                registry = get_folder_registry()
+            else:
+                db_path = os.path.join(os.path.dirname(os.path.abspath(config_path)), "folders.sqlite3")
+                registry = FolderRegistry(db_path, json_path=config_path)
+        self.registry = registry
+        self.config_path = registry.json_path
         self.ai_client = AIClient(system_prompt="你是一个文件分类和内容管理助手。")
+        self._router = None
+        self._router_signature = None
+        self._note_stores = {}
+        self._note_stores_lock = threading.Lock()
     
-    def _load_folder_config(self) -> dict:
-        """加载文件夹结构配置"""
-        try:
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            print(f"⚠️ 配置文件 {self.config_path} 不存在，将创建空配置")
-            return {"folders": []}
-        except json.JSONDecodeError as e:
-            print(f"❌ 配置文件格式错误: {e}")
-            return {"folders": []}
+    @property
+    def folder_config(self) -> dict:
+        """当前文件夹配置（与 folder_structure.json 格式一致）"""
+        return {"folders": self.registry.list()}
     
     def reload_config(self):
-        """重新加载配置文件（用于获取最新的文件夹列表）"""
-        self.folder_config = self._load_folder_config()
-        print(f"🔄 已重新加载配置，当前有 {len(self.folder_config.get('folders', []))} 个文件夹")
-    
-    def _save_folder_config(self):
-        """保存文件夹结构配置"""
-        with open(self.config_path, 'w', encoding='utf-8') as f:
-            json.dump(self.folder_config, f, ensure_ascii=False, indent=4)
+        """获取其他进程对文件夹的最新修改（注册表未变化时不读取磁盘）"""
+        if self.registry.refresh():
+            print(f"🔄 文件夹配置已更新，当前有 {len(self.registry.list())} 个文件夹")
     
     def _get_folder_descriptions(self) -> str:
         """获取所有文件夹的描述文本"""
@@ -63,9 +79,46 @@ class ContentManager:
             descriptions.append(f"- {folder['name']}: {folder['description']}")
         return "\n".join(descriptions)
     
+    def _get_router(self):
+        """获取与当前文件夹配置匹配的本地向量路由器（配置变化时重建）"""
+        try:
+            from embedding_router import EmbeddingRouter
+        except ImportError:
+            return None
+        
+        folders = self.folder_config.get("folders", [])
+        signature = EmbeddingRouter.signature(folders)
+        if self._router is None or self._router_signature != signature:
+            self._router = EmbeddingRouter(folders)
+            self._router_signature = signature
+        return self._router
+    
+    def _route_locally(self, content_description: str) -> Optional[dict]:
+        """
+        先用本地向量相似度分类，结果足够明确时直接返回，否则返回 None 交给 LLM
+        
+        :return: 分类结果 {"folder_name": ..., "reason": ...}
+        """
+        router = self._get_router()
+        if router is None:
+            return None
+        
+        with span("classify.local") as trace:
+            route = router.route(content_description)
+            trace.set(confident=bool(route and route["confident"]))
+        if not route or not route["confident"]:
+            return None
+        
+        print(f"⚡ 本地向量分类: {route['folder_name']} (相似度 {route['score']:.3f}, 领先 {route['margin']:.3f})")
+        return {
+            "folder_name": route["folder_name"],
+            "reason": f"与文件夹描述最相似（本地向量匹配，相似度 {route['score']:.2f}）"
+        }
+    
     def _classify_content(self, content_description: str) -> Optional[dict]:
         """
-        使用 AI 对内容进行分类，选择最合适的文件夹
+        对内容进行分类，选择最合适的文件夹
+        优先使用本地向量路由，只有前两名相似度接近时才调用 AI
         
         :param content_description: 内容描述（文本内容/图片描述/PDF标题摘要）
         :return: 分类结果 {"folder_name": ..., "reason": ...}
@@ -74,6 +127,10 @@ class ContentManager:
             print("⚠️ 没有可用的文件夹配置")
             return None
         
+        local_result = self._route_locally(content_description)
+        if local_result:
+            return local_result
+        
         folder_names = [f["name"] for f in self.folder_config["folders"]]
         folders_text = self._get_folder_descriptions()
         
@@ -94,82 +151,114 @@ class ContentManager:
             """
         
         try:
-            result_text = self.ai_client.ask(text=prompt, temperature=0.3, max_tokens=200)
-            
-            # 处理可能的 markdown 代码块
-            if "```json" in result_text:
-                result_text = result_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in result_text:
-                result_text = result_text.split("```")[1].split("```")[0].strip()
-            
-            return json.loads(result_text)
+            with span("classify.llm"):
+                result_text = self.ai_client.ask(text=prompt, temperature=0.3, max_tokens=200)
+                return _parse_json_response(result_text)
         except Exception as e:
             print(f"❌ AI 分类失败: {e}")
             return None
     
-    def _find_or_create_md_file(self, folder_path: str, folder_name: str) -> str:
+    def get_note_store(self, folder_name: str, folder_path: str = None):
         """
-        查找或创建文件夹下的 markdown 文件
+        获取文件夹的笔记存储（笔记/ 下按月分段的 markdown），同一文件夹复用同一个实例
         
-        :param folder_path: 文件夹路径
         :param folder_name: 文件夹名称
-        :return: markdown 文件路径
+        :param folder_path: 文件夹路径，None 时按名称从配置中查找
+        :return: NoteStore，文件夹不在配置中时返回 None
         """
-        # 优先查找笔记文件夹下的 md 文件
-        notes_dir = os.path.join(folder_path, "笔记")
-        if os.path.exists(notes_dir):
-            md_files = [f for f in os.listdir(notes_dir) if f.endswith('.md')]
-            if md_files:
-                return os.path.join(notes_dir, md_files[0])
-        
-        # 查找根目录下的同名 md 文件
-        root_md = os.path.join(folder_path, f"{folder_name}.md")
-        if os.path.exists(root_md):
-            return root_md
+        from note_store import NoteStore
         
-        # 如果都不存在，在笔记文件夹创建一个
-        if not os.path.exists(notes_dir):
-            os.makedirs(notes_dir)
-        
-        new_md_path = os.path.join(notes_dir, f"{folder_name}_笔记.md")
-        with open(new_md_path, 'w', encoding='utf-8') as f:
-            f.write(f"# {folder_name} 笔记\n\n")
-        
-        return new_md_path
-    
-    def _append_to_md(self, md_path: str, content: str):
-        """向 markdown 文件末尾追加内容"""
-        with open(md_path, 'a', encoding='utf-8') as f:
-            f.write(f"\n{content}\n")
+        if folder_path is None:
+            folder_path = self._get_folder_path(folder_name)
+            if folder_path is None:
+                return None
+        notes_dir = os.path.join(folder_path, "笔记")
+        with self._note_stores_lock:
+            store = self._note_stores.get(notes_dir)
+            if store is None:
+                os.makedirs(notes_dir, exist_ok=True)
+                store = self._note_stores[notes_dir] = NoteStore(notes_dir, folder_name)
+            return store
     
     def _save_image_and_get_md_ref(self, image: Union[str, Image.Image], folder_path: str) -> tuple:
         """
-        保存图片并返回 markdown 引用格式
+        保存图片并返回 markdown 引用格式（按内容哈希命名，像素完全相同的图片复用已有文件）
         
         :return: (保存路径, markdown引用文本)
         """
-        # 创建 images 子文件夹
-        images_dir = os.path.join(folder_path, "images")
-        if not os.path.exists(images_dir):
-            os.makedirs(images_dir)
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"image_{timestamp}.png"
-        save_path = os.path.join(images_dir, filename)
-        
-        if isinstance(image, str):
-            # 如果是路径，复制文件
-            shutil.copy(image, save_path)
-        else:
-            # 如果是 PIL Image，保存
-            image.save(save_path, format="PNG")
-        
-        # 返回相对路径的 markdown 引用
-        relative_path = f"images/{filename}"
-        md_ref = f"![image]({relative_path})"
-        
-        return save_path, md_ref
+        from image_store import get_image_store
+        
+        saved = get_image_store().save(image, folder_path)
+        if saved["duplicate"]:
+            print(f"♻️ 与已保存的图片完全相同，复用: {saved['relative_path']}")
+        elif saved["near_of"]:
+            print(f"🔍 与已保存的图片相似（{os.path.basename(saved['near_of'])}），仍单独保存: {saved['relative_path']}")
+        
+        md_ref = f"![image]({saved['relative_path']})"
+        return saved["path"], md_ref
+    
+    def _describe_content(self, input_type: InputType, content: Union[str, Image.Image],
+                          description: str = None) -> Optional[str]:
+        """准备用于分类的内容描述，不支持的类型返回 None"""
+        if description:
+            return description
+        if input_type == InputType.TEXT:
+            return content[:500] if len(content) > 500 else content
+        if input_type == InputType.IMAGE:
+            # 用 AI 描述图片
+            try:
+                return self.ai_client.ask(
+                    text=IMAGE_DESCRIBE_PROMPT,
+                    image=content,
+                    max_tokens=200
+                )
+            except:
+                return "一张图片"
+        if input_type == InputType.PDF:
+            return f"PDF文件: {os.path.basename(content) if isinstance(content, str) else 'unknown.pdf'}"
+        return None
+    
+    def _get_folder_path(self, folder_name: str) -> Optional[str]:
+        """根据文件夹名称查找路径"""
+        folder = self.registry.get(folder_name)
+        return folder["path"] if folder else None
+    
+    @staticmethod
+    def _text_entry(content: str, reason: str) -> str:
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
+        return f"### 📝 {timestamp}\n\n{content}\n\n> 🤖 AI 分类说明: {reason}"
+    
+    @staticmethod
+    def _image_entry(md_ref: str, description: Optional[str], reason: str) -> str:
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
+        # 如果 description 较长（超过100字符），将其作为图片解释一起插入
+        if description and len(description) > 100:
+            return f"### 🖼️ {timestamp}\n\n{md_ref}\n\n#### 💡 AI 解读\n\n{description}\n\n> 🤖 AI 分类说明: {reason}"
+        return f"### 🖼️ {timestamp}\n\n{md_ref}\n\n> 🤖 AI 分类说明: {reason}"
+    
+    @staticmethod
+    def _copy_pdf(pdf_path: str, target_folder: str, sub_folder: str) -> str:
+        """PDF：保存到文章/博客子文件夹，返回保存路径"""
+        if sub_folder not in ["文章", "博客"]:
+            sub_folder = "文章"
+        
+        dest_dir = os.path.join(target_folder, sub_folder)
+        os.makedirs(dest_dir, exist_ok=True)
+        
+        original_filename = os.path.basename(pdf_path)
+        dest_path = os.path.join(dest_dir, original_filename)
+        
+        # 如果目标文件已存在，添加时间戳
+        if os.path.exists(dest_path):
+            name, ext = os.path.splitext(original_filename)
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            dest_path = os.path.join(dest_dir, f"{name}_{timestamp}{ext}")
+        
+        with span("write.pdf", bytes=os.path.getsize(pdf_path)):
+            shutil.copy(pdf_path, dest_path)
+        return dest_path
     
+    @traced("save.content")
     def save_content(self, input_type: InputType, content: Union[str, Image.Image], 
                      description: str = None, sub_folder: str = "文章") -> Optional[str]:
         """
@@ -201,23 +290,8 @@ class ContentManager:
         self.reload_config()
         
         # 1. 准备内容描述用于分类
-        if description:
-            content_desc = description
-        elif input_type == InputType.TEXT:
-            content_desc = content[:500] if len(content) > 500 else content
-        elif input_type == InputType.IMAGE:
-            # 用 AI 描述图片
-            try:
-                content_desc = self.ai_client.ask(
-                    text="请简要描述这张图片的内容，用于文件分类。",
-                    image=content,
-                    max_tokens=200
-                )
-            except:
-                content_desc = "一张图片"
-        elif input_type == InputType.PDF:
-            content_desc = f"PDF文件: {os.path.basename(content) if isinstance(content, str) else 'unknown.pdf'}"
-        else:
+        content_desc = self._describe_content(input_type, content, description)
+        if content_desc is None:
             print("❌ 不支持的输入类型")
             return None
         
@@ -236,11 +310,7 @@ class ContentManager:
         print(f"   原因: {reason}")
         
         # 3. 查找目标文件夹路径
-        target_folder = None
-        for folder in self.folder_config["folders"]:
-            if folder["name"] == folder_name:
-                target_folder = folder["path"]
-                break
+        target_folder = self._get_folder_path(folder_name)
         
         if not target_folder:
             print(f"⚠️ 未找到文件夹: {folder_name}")
@@ -248,64 +318,194 @@ class ContentManager:
         
         # 4. 根据类型处理内容
         if input_type == InputType.TEXT:
-            # 文本：追加到 md 文件
-            md_path = self._find_or_create_md_file(target_folder, folder_name)
-            
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
-            entry = f"\n---\n### 📝 {timestamp}\n\n{content}\n\n> 🤖 AI 分类说明: {reason}\n"
-            
-            self._append_to_md(md_path, entry)
-            print(f"✅ 文本已保存到: {md_path}")
-            return md_path
+            # 文本：追加为一条笔记
+            note = self.get_note_store(folder_name, target_folder).append(self._text_entry(content, reason))
+            print(f"✅ 文本已保存到: {note['path']} (#{note['id']})")
+            return note["path"]
         
         elif input_type == InputType.IMAGE:
-            # 图片：保存图片并在 md 中插入引用
-            md_path = self._find_or_create_md_file(target_folder, folder_name)
+            # 图片：保存图片并追加一条引用它的笔记
             save_path, md_ref = self._save_image_and_get_md_ref(content, target_folder)
-            
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
-            
-            # 如果 description 较长（超过100字符），将其作为图片解释一起插入
-            if description and len(description) > 100:
-                entry = f"\n---\n### 🖼️ {timestamp}\n\n{md_ref}\n\n#### 💡 AI 解读\n\n{description}\n\n> 🤖 AI 分类说明: {reason}\n"
-            else:
-                entry = f"\n---\n### 🖼️ {timestamp}\n\n{md_ref}\n\n> 🤖 AI 分类说明: {reason}\n"
-            
-            self._append_to_md(md_path, entry)
+            note = self.get_note_store(folder_name, target_folder).append(
+                self._image_entry(md_ref, description, reason), kind="image")
             print(f"✅ 图片已保存到: {save_path}")
-            print(f"✅ 引用已添加到: {md_path}")
+            print(f"✅ 引用已添加到: {note['path']} (#{note['id']})")
             return save_path
         
         elif input_type == InputType.PDF:
-            # PDF：保存到文章/博客子文件夹
-            if sub_folder not in ["文章", "博客"]:
-                sub_folder = "文章"
-            
-            dest_dir = os.path.join(target_folder, sub_folder)
-            if not os.path.exists(dest_dir):
-                os.makedirs(dest_dir)
-            
-            original_filename = os.path.basename(content)
-            dest_path = os.path.join(dest_dir, original_filename)
-            
-            # 如果目标文件已存在，添加时间戳
-            if os.path.exists(dest_path):
-                name, ext = os.path.splitext(original_filename)
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                dest_path = os.path.join(dest_dir, f"{name}_{timestamp}{ext}")
-            
-            shutil.copy(content, dest_path)
+            dest_path = self._copy_pdf(content, target_folder, sub_folder)
             print(f"✅ PDF 已保存到: {dest_path}")
             return dest_path
         
         return None
     
-    def create_folder(self, folder_name: str, base_path: str = None) -> Optional[str]:
+    # ---------- 批量保存 ----------
+    
+    def _classify_batch(self, descriptions: list) -> list:
+        """
+        用一次 AI 调用对多条内容分类
+        
+        :param descriptions: 内容描述列表
+        :return: 与输入顺序一致的分类结果列表，模型漏掉或返回无效文件夹的项为 None
+        """
+        folder_names = [f["name"] for f in self.folder_config["folders"]]
+        folders_text = self._get_folder_descriptions()
+        items_text = "\n".join(
+            f"[{i}] {desc[:CLASSIFY_DESC_CHARS].replace(chr(10), ' ')}" for i, desc in enumerate(descriptions, 1)
+        )
+        
+        prompt = f"""请根据以下多条内容描述，分别从给定的文件夹中选择最合适的一个进行分类。
+
+            内容列表:
+            {items_text}
+
+            可选文件夹:
+            {folders_text}
+
+            请只返回一个 JSON 数组，每条内容对应一个对象，包含以下字段：
+            - index: 内容编号
+            - folder_name: 选择的文件夹名称（必须是 {folder_names} 中的一个）
+            - reason: 选择该文件夹的原因（简短说明）
+
+            示例返回格式：
+            [{{"index": 1, "folder_name": "GAN", "reason": "该内容与生成对抗网络相关"}}]
+            """
+        
+        results = [None] * len(descriptions)
+        try:
+            with span("classify.batch", items=len(descriptions)) as trace:
+                result_text = self.ai_client.ask(text=prompt, temperature=0.3,
+                                                 max_tokens=100 + 80 * len(descriptions))
+                for item in _parse_json_response(result_text):
+                    index = int(item.get("index", 0)) - 1
+                    if 0 <= index < len(results) and item.get("folder_name") in folder_names:
+                        results[index] = {"folder_name": item["folder_name"], "reason": item.get("reason", "")}
+                trace.set(classified=sum(1 for r in results if r))
+        except Exception as e:
+            print(f"❌ AI 批量分类失败: {e}")
+        return results
+    
+    def _classify_many(self, descriptions: list) -> list:
+        """
+        批量分类：先本地向量路由，剩余的每 CLASSIFY_BATCH_SIZE 条合并为一次 AI 调用，
+        批量结果中缺失的项再逐条分类
+        """
+        results = [self._route_locally(desc) for desc in descriptions]
+        pending = [i for i, r in enumerate(results) if r is None]
+        
+        for start in range(0, len(pending), CLASSIFY_BATCH_SIZE):
+            chunk = pending[start:start + CLASSIFY_BATCH_SIZE]
+            print(f"🤖 AI 正在批量分类 {len(chunk)} 条内容...")
+            for i, result in zip(chunk, self._classify_batch([descriptions[i] for i in chunk])):
+                results[i] = result
+        
+        for i in pending:
+            if results[i] is None:
+                results[i] = self._classify_content(descriptions[i])
+        return results
+    
+    def _describe_images(self, items: list, indices: list) -> dict:
+        """并发生成多张图片的描述，返回 {序号: 描述}"""
+        if not indices:
+            return {}
+        from async_ai import ask_many
+        
+        requests = [{"text": IMAGE_DESCRIBE_PROMPT, "image": items[i]["content"], "max_tokens": 200}
+                    for i in indices]
+        answers = ask_many(requests, system_prompt=self.ai_client.system_prompt)
+        return {i: (a if isinstance(a, str) and a else "一张图片") for i, a in zip(indices, answers)}
+    
+    @traced("save.many")
+    def save_many(self, items: list, max_workers: int = 4) -> list:
+        """
+        批量保存多条内容（文本 / 图片 / PDF 可混合）
+        - 只加载一次配置
+        - 多条内容合并到一次 AI 调用中分类，没有描述的图片并发生成描述
+        - 图片保存、PDF 复制并发执行，写入同一个 md 文件的条目合并为一次追加
+        
+        :param items: 内容列表，每项为 {"type": InputType, "content": ..., "description": 可选, "sub_folder": 可选}
+        :param max_workers: 文件写入的并发数
+        :return: 每项保存的文件路径，失败为 None，顺序与输入一致
+        
+        使用示例:
+            manager = ContentManager()
+            manager.save_many([
+                {"type": InputType.TEXT, "content": "关于 GAN 的笔记..."},
+                {"type": InputType.PDF, "content": "paper.pdf", "description": "扩散模型综述"},
+            ])
+        """
+        self.reload_config()
+        if not self.folder_config.get("folders"):
+            print("⚠️ 没有可用的文件夹配置")
+            return [None] * len(items)
+        
+        # 1. 准备内容描述（图片描述并发生成）
+        image_indices = [i for i, item in enumerate(items)
+                         if item["type"] == InputType.IMAGE and not item.get("description")]
+        image_descs = self._describe_images(items, image_indices)
+        descriptions = [image_descs.get(i) or self._describe_content(item["type"], item["content"], item.get("description"))
+                        for i, item in enumerate(items)]
+        
+        # 2. 批量分类
+        valid = [i for i, desc in enumerate(descriptions) if desc is not None]
+        classifications = [None] * len(items)
+        for i, result in zip(valid, self._classify_many([descriptions[i] for i in valid])):
+            classifications[i] = result
+        
+        # 3. 并发写入图片和 PDF，笔记条目按文件夹分组后一次提交
+        note_entries = {}
+        results = [None] * len(items)
+        
+        def write(i):
+            item, classification = items[i], classifications[i]
+            folder_name = classification["folder_name"]
+            target_folder = self._get_folder_path(folder_name)
+            if not target_folder:
+                print(f"⚠️ 未找到文件夹: {folder_name}")
+                return None, None, None
+            reason = classification.get("reason", "")
+            
+            if item["type"] == InputType.PDF:
+                return self._copy_pdf(item["content"], target_folder, item.get("sub_folder", "文章")), None, None
+            store = self.get_note_store(folder_name, target_folder)
+            if item["type"] == InputType.TEXT:
+                return None, store, {"text": self._text_entry(item["content"], reason), "kind": "text"}
+            save_path, md_ref = self._save_image_and_get_md_ref(item["content"], target_folder)
+            return save_path, store, {"text": self._image_entry(md_ref, item.get("description"), reason),
+                                      "kind": "image"}
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {i: pool.submit(write, i) for i, c in enumerate(classifications) if c}
+            for i, future in futures.items():
+                try:
+                    results[i], store, entry = future.result()
+                    if store:
+                        note_entries.setdefault(store, []).append((i, entry))
+                except Exception as e:
+                    print(f"❌ 第 {i + 1} 项保存失败: {e}")
+        
+        for store, pending in note_entries.items():
+            try:
+                notes = store.append_many([entry for _, entry in pending])
+            except Exception as e:
+                print(f"❌ 写入笔记失败 ({store.title}): {e}")
+                for i, _ in pending:
+                    results[i] = None
+                continue
+            for (i, entry), note in zip(pending, notes):
+                if entry["kind"] == "text":
+                    results[i] = note["path"]
+        
+        print(f"✅ 批量保存完成: {sum(1 for r in results if r)}/{len(items)} 项")
+        return results
+    
+    def create_folder(self, folder_name: str, base_path: str = None, parent: str = None) -> Optional[str]:
         """
         方法二：新建文件夹，自动创建子文件夹结构并更新配置
         
         :param folder_name: 文件夹名称
-        :param base_path: 基础路径，默认为当前工作目录
+        :param base_path: 基础路径，默认为父文件夹路径或当前工作目录
+        :param parent: 父文件夹名称（需已在配置中）
         :return: 创建的文件夹路径，失败返回 None
         
         自动创建的结构:
@@ -320,8 +520,12 @@ class ContentManager:
             manager.create_folder("Transformer", base_path="D:/CODE/yanzhi")
         """
         
+        parent_folder = self.registry.get(parent) if parent else None
+        if parent and parent_folder is None:
+            print(f"❌ 父文件夹不在配置中: {parent}")
+            return None
         if base_path is None:
-            base_path = os.getcwd()
+            base_path = parent_folder["path"] if parent_folder else os.getcwd()
         
         folder_path = os.path.join(base_path, folder_name)
         
@@ -329,10 +533,9 @@ class ContentManager:
         if os.path.exists(folder_path):
             print(f"⚠️ 文件夹已存在: {folder_path}")
             # 检查是否已在配置中
-            for f in self.folder_config.get("folders", []):
-                if f["name"] == folder_name:
-                    print("   已在配置中，无需重复创建")
-                    return folder_path
+            if self.registry.get(folder_name):
+                print("   已在配置中，无需重复创建")
+                return folder_path
         
         # 2. 创建文件夹结构
         print(f"📁 正在创建文件夹: {folder_name}")
@@ -376,17 +579,10 @@ class ContentManager:
         
         print(f"   📝 描述: {description}")
         
-        # 4. 更新配置文件
-        new_folder_config = {
-            "name": folder_name,
-            "path": folder_path.replace("\\", "/"),
-            "description": description
-        }
-        
-        self.folder_config["folders"].append(new_folder_config)
-        self._save_folder_config()
+        # 4. 写入文件夹注册表
+        self.registry.add(folder_name, folder_path, description, parent=parent)
         
-        print(f"   ✅ 已更新配置文件: {self.config_path}")
+        print(f"   ✅ 已更新文件夹配置: {self.registry.path}")
         print(f"\n✅ 文件夹创建完成: {folder_path}")
         
         return folder_path
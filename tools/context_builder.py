@@ -0,0 +1,264 @@
+import re
+import math
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+
+from embedding_router import tokenize
+
+
+# ================= 默认配置 =================
+
+DEFAULT_TOKEN_BUDGET = 4000  # 文档上下文的 token 预算（不含问题和系统提示词）
+# 各模型的上下文预算：按输入上限留出问题和回答的空间，预算越大首字延迟越高
+MODEL_TOKEN_BUDGET = {
+    "Qwen/Qwen2.5-7B-Instruct": 6000,
+    "openai/gpt-4o": 5000,  # GitHub Models 免费额度单次输入上限 8000 token
+}
+CHUNK_TOKENS = 300  # 单个片段的目标长度
+CACHE_DOCUMENTS = 16  # 缓存最近多少个文档的切分结果和 BM25 统计
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_PAGE_HEADER_RE = re.compile(r"^--- 第 (\d+) 页")
+_CJK_CHAR_RE = re.compile(r"[　-〿一-鿿＀-￯]")
+# 句末位置（零宽，切分后原样拼接即可还原）：中文句末标点之后，或英文句号后紧跟空白
+_SENTENCE_END_RE = re.compile(r"(?<=[。！？；!?;])|(?<=\.)(?=\s)")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算 token 数（不依赖具体模型的分词器）：
+    中文及全角字符约 1 字 1 token，其余约 4 字符 1 token
+    """
+    cjk = len(_CJK_CHAR_RE.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def budget_for(model: str = None) -> int:
+    """模型对应的文档上下文预算"""
+    return MODEL_TOKEN_BUDGET.get(model or "", DEFAULT_TOKEN_BUDGET)
+
+
+# ================= 文档切分 =================
+
+def _split_oversized(paragraph: str, max_tokens: int) -> list:
+    """
+    把超过 max_tokens 的段落切成不超过 max_tokens 的片段：先按行，超长的行再按句子，
+    单句仍超长时按 max_tokens 个字符切分（任何文本每个字符最多约 1 token，一定不超过预算）
+    同一行内相邻的句子合并为尽量长的片段，句子之间的原有空白保持不变
+    """
+    pieces = []
+    for line in paragraph.split("\n"):
+        if estimate_tokens(line) <= max_tokens:
+            pieces.append(line)
+            continue
+        current, current_tokens = "", 0
+        for sentence in _SENTENCE_END_RE.split(line):
+            if estimate_tokens(sentence) <= max_tokens:
+                windows = [sentence]
+            else:
+                windows = [sentence[i:i + max_tokens] for i in range(0, len(sentence), max_tokens)]
+            for window in windows:
+                window_tokens = estimate_tokens(window)
+                if current and current_tokens + window_tokens > max_tokens:
+                    pieces.append(current)
+                    current, current_tokens = "", 0
+                current += window
+                current_tokens += window_tokens
+        if current:
+            pieces.append(current)
+    return [piece.strip() for piece in pieces if piece.strip()]
+
+
+def split_chunks(text: str, max_tokens: int = CHUNK_TOKENS) -> list:
+    """
+    按段落把文档切成约 max_tokens 的片段，记录每个片段所在页码（来自 PDF 的页面分隔标题）
+
+    :return: [{"index", "page", "text", "tokens"}]
+    """
+    chunks = []
+    current, current_tokens, page, chunk_page = [], 0, None, None
+
+    def flush():
+        nonlocal current, current_tokens
+        if current:
+            body = "\n\n".join(current)
+            chunks.append({"index": len(chunks), "page": chunk_page, "text": body, "tokens": current_tokens})
+        current, current_tokens = [], 0
+
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        header = _PAGE_HEADER_RE.match(paragraph)
+        if header:
+            page = int(header.group(1))
+            flush()
+            chunk_page = page
+            continue
+
+        tokens = estimate_tokens(paragraph)
+        # 超长段落按行、句子（必要时按固定字符数）再切
+        oversized = tokens > max_tokens
+        pieces = _split_oversized(paragraph, max_tokens) if oversized else [paragraph]
+        for piece in pieces:
+            piece_tokens = estimate_tokens(piece) if oversized else tokens
+            if current and current_tokens + piece_tokens > max_tokens:
+                flush()
+            if not current:
+                chunk_page = page
+            current.append(piece)
+            current_tokens += piece_tokens
+    flush()
+    return chunks
+
+
+# ================= BM25 =================
+
+class DocumentIndex:
+    """单个文档的片段和 BM25 统计"""
+
+    def __init__(self, text: str, chunk_tokens: int = CHUNK_TOKENS):
+        self.total_tokens = estimate_tokens(text)
+        self.chunks = split_chunks(text, chunk_tokens)
+        self.term_freqs = [Counter(tokenize(c["text"])) for c in self.chunks]
+        self.lengths = [sum(tf.values()) for tf in self.term_freqs]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+        df = Counter()
+        for tf in self.term_freqs:
+            df.update(tf.keys())
+        n = len(self.chunks)
+        self.idf = {term: math.log(1 + (n - count + 0.5) / (count + 0.5)) for term, count in df.items()}
+
+    def scores(self, query: str) -> list:
+        """每个片段对问题的 BM25 得分"""
+        terms = [t for t in set(tokenize(query)) if t in self.idf]
+        result = []
+        for tf, length in zip(self.term_freqs, self.lengths):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / (self.avg_length or 1))
+            score = 0.0
+            for term in terms:
+                freq = tf.get(term)
+                if freq:
+                    score += self.idf[term] * freq * (BM25_K1 + 1) / (freq + norm)
+            result.append(score)
+        return result
+
+
+# ================= 上下文构建 =================
+
+class ContextBuilder:
+    """
+    文档问答的上下文构建
+    - 文档不超过预算时原样放入
+    - 超过预算时按 BM25 选出与问题最相关的片段及其前后片段，始终保留开头（标题、摘要），
+      按原文顺序拼接，不超过预算
+    - 问题与文档没有共同词（例如“总结一下”）时，改为在全文中均匀选取片段
+    - 切分结果和 BM25 统计按文档内容哈希缓存，对同一文档连续提问时不再重复计算
+    """
+
+    def __init__(self, cache_size: int = CACHE_DOCUMENTS):
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_index(self, text: str) -> DocumentIndex:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            index = self._cache.get(digest)
+            if index is not None:
+                self._cache.move_to_end(digest)
+                return index
+
+        index = DocumentIndex(text)
+        with self._lock:
+            self._cache[digest] = index
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return index
+
+    @staticmethod
+    def _spread(chunks: list, budget: int, selected: set) -> list:
+        """在全文中均匀挑选片段（按步长遍历，直到预算用完）"""
+        remaining = budget - sum(chunks[i]["tokens"] for i in selected)
+        picks = []
+        step = max(1, len(chunks) * CHUNK_TOKENS // max(budget, 1))
+        for i in range(0, len(chunks), step):
+            if i in selected:
+                continue
+            if chunks[i]["tokens"] > remaining:
+                continue
+            picks.append(i)
+            remaining -= chunks[i]["tokens"]
+        return picks
+
+    def select(self, question: str, text: str, budget: int) -> dict:
+        """
+        选出放入上下文的片段
+
+        :return: {"chunks": 选中的片段（按原文顺序）, "total_chunks": 片段总数,
+                  "tokens": 选中片段的 token 数, "complete": 是否包含全文}
+        """
+        index = self._get_index(text)
+        chunks = index.chunks
+        if index.total_tokens <= budget:
+            return {"chunks": chunks, "total_chunks": len(chunks),
+                    "tokens": index.total_tokens, "complete": True}
+
+        selected = {0} if chunks and chunks[0]["tokens"] <= budget else set()
+        used = sum(chunks[i]["tokens"] for i in selected)
+
+        scores = index.scores(question)
+        ranked = sorted((i for i, s in enumerate(scores) if s > 0), key=lambda i: -scores[i])
+        for i in ranked:
+            if i in selected:
+                continue
+            if used + chunks[i]["tokens"] > budget:
+                continue  # 跳过放不下的长片段，继续尝试得分较低但更短的
+            selected.add(i)
+            used += chunks[i]["tokens"]
+
+        # 剩余预算补上命中片段的前后片段，避免答案所在段落被从中间切断
+        for i in ranked:
+            for j in (i - 1, i + 1):
+                if 0 <= j < len(chunks) and j not in selected and used + chunks[j]["tokens"] <= budget:
+                    selected.add(j)
+                    used += chunks[j]["tokens"]
+
+        if not ranked:
+            picks = self._spread(chunks, budget, selected)
+            selected.update(picks)
+            used += sum(chunks[i]["tokens"] for i in picks)
+
+        ordered = [chunks[i] for i in sorted(selected)]
+        return {"chunks": ordered, "total_chunks": len(chunks), "tokens": used, "complete": False}
+
+    def build_prompt(self, question: str, text: str, file_name: str, budget: int = DEFAULT_TOKEN_BUDGET) -> dict:
+        """
+        生成文档问答的提示词
+
+        :return: {"prompt": 提示词, "context": {"chunks", "total_chunks", "tokens", "complete"} 统计}
+        """
+        selection = self.select(question, text, budget)
+        if selection["complete"]:
+            body = text
+            intro = f"我正在阅读文件《{file_name}》，内容如下："
+        else:
+            parts, previous = [], -1
+            for chunk in selection["chunks"]:
+                if chunk["index"] != previous + 1:
+                    parts.append("……（省略）……")
+                label = f"[第 {chunk['page']} 页] " if chunk["page"] else ""
+                parts.append(label + chunk["text"])
+                previous = chunk["index"]
+            if previous != selection["total_chunks"] - 1:
+                parts.append("……（省略）……")
+            body = "\n\n".join(parts)
+            intro = f"我正在阅读文件《{file_name}》，以下是文件中与问题相关的片段（按原文顺序）："
+
+        stats = {key: selection[key] for key in ("total_chunks", "tokens", "complete")}
+        stats["chunks"] = len(selection["chunks"])
+        return {"prompt": f"{intro}\n\n{body}\n\n用户问题：{question}", "context": stats}
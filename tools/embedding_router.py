@@ -0,0 +1,139 @@
+import re
+import zlib
+import hashlib
+import json
+from typing import Optional
+
+import numpy as np
+
+
+# ================= 默认配置 =================
+
+EMBEDDING_DIM = 4096  # 哈希向量维度
+ROUTER_MIN_SCORE = 0.08  # 最高相似度低于该值时认为没有可靠匹配
+ROUTER_MIN_MARGIN = 0.03  # 第一名与第二名相似度差低于该值时交给 LLM 判断
+
+_WORD_RE = re.compile(r"[a-z0-9]+(?:[-_.][a-z0-9]+)*")
+_CJK_RE = re.compile(r"[一-鿿]+")
+
+
+# ================= 本地向量化 =================
+
+def tokenize(text: str) -> list:
+    """
+    切分为适合中英文混合文本的特征：
+    - 英文/数字按单词切分
+    - 中文按单字和相邻二字切分（无需分词词典）
+    """
+    text = text.lower()
+    tokens = _WORD_RE.findall(text)
+    for run in _CJK_RE.findall(text):
+        tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class HashingEmbedder:
+    """
+    基于特征哈希的本地文本向量化（纯 NumPy，离线、无 token 消耗）
+    fit() 根据语料计算 IDF 权重，使 "论文"、"相关" 这类在所有文件夹描述中都出现的词权重降低
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+        self.idf = np.ones(dim, dtype=np.float32)
+
+    def _index(self, token: str) -> int:
+        return zlib.crc32(token.encode("utf-8")) % self.dim
+
+    def _counts(self, text: str) -> np.ndarray:
+        indices = [self._index(t) for t in tokenize(text)]
+        return np.bincount(np.asarray(indices, dtype=np.int64), minlength=self.dim).astype(np.float32)
+
+    def fit(self, corpus: list) -> "HashingEmbedder":
+        """根据语料计算平滑 IDF"""
+        if not corpus:
+            return self
+        df = np.zeros(self.dim, dtype=np.float32)
+        for text in corpus:
+            df += self._counts(text) > 0
+        self.idf = np.log((1 + len(corpus)) / (1 + df)).astype(np.float32) + 1.0
+        return self
+
+    def embed(self, texts: list) -> np.ndarray:
+        """
+        批量向量化
+
+        :param texts: 文本列表
+        :return: 形状为 (len(texts), dim) 的 L2 归一化矩阵
+        """
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            counts = self._counts(text)
+            matrix[i] = np.log1p(counts) * self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+# ================= 文件夹路由 =================
+
+class EmbeddingRouter:
+    """
+    根据文件夹描述预先计算向量，按余弦相似度把内容路由到最合适的文件夹
+    """
+
+    def __init__(self, folders: list, embedder: HashingEmbedder = None,
+                 min_score: float = ROUTER_MIN_SCORE, min_margin: float = ROUTER_MIN_MARGIN):
+        """
+        :param folders: folder_structure.json 中的 folders 列表
+        :param embedder: 向量化器，默认使用 HashingEmbedder 并在文件夹描述上拟合 IDF
+        :param min_score: 最低可信相似度
+        :param min_margin: 第一名与第二名的最小相似度差
+        """
+        self.folders = folders
+        self.names = [f["name"] for f in folders]
+        self.min_score = min_score
+        self.min_margin = min_margin
+
+        corpus = [self.folder_text(f) for f in folders]
+        self.embedder = embedder or HashingEmbedder().fit(corpus)
+        self.vectors = self.embedder.embed(corpus) if corpus else np.zeros((0, self.embedder.dim), np.float32)
+
+    @staticmethod
+    def folder_text(folder: dict) -> str:
+        """用于向量化的文件夹文本（名称重复两次以提高权重）"""
+        return f"{folder['name']} {folder['name']} {folder.get('description', '')}"
+
+    @staticmethod
+    def signature(folders: list) -> str:
+        """文件夹配置的签名，配置变化时需要重建路由器"""
+        payload = json.dumps([[f["name"], f.get("description", "")] for f in folders], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def scores(self, text: str) -> np.ndarray:
+        """内容与每个文件夹的余弦相似度"""
+        if not self.names:
+            return np.zeros(0, dtype=np.float32)
+        return self.vectors @ self.embedder.embed([text])[0]
+
+    def route(self, text: str) -> Optional[dict]:
+        """
+        计算最匹配的文件夹
+
+        :return: {"folder_name", "score", "margin", "confident"}，没有文件夹时返回 None
+        """
+        scores = self.scores(text)
+        if scores.size == 0:
+            return None
+
+        order = np.argsort(scores)[::-1]
+        best = float(scores[order[0]])
+        second = float(scores[order[1]]) if scores.size > 1 else 0.0
+        margin = best - second
+        return {
+            "folder_name": self.names[order[0]],
+            "score": best,
+            "margin": margin,
+            "confident": best >= self.min_score and margin >= self.min_margin,
+        }
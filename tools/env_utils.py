@@ -0,0 +1,13 @@
+import os
+
+
+# ================= 环境变量开关 =================
+# 单独成模块、不依赖其他 tools 模块：ask_ai 导入 provider_router / tracing 时，
+# 它们也能在模块加载阶段读取开关而不形成循环导入
+
+def env_flag(name: str, default: bool) -> bool:
+    """读取布尔型环境变量，未设置时返回 default；0 / false / no / off / 空字符串视为关闭"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() not in ("0", "false", "no", "off", "")
@@ -0,0 +1,390 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Callable, Optional
+
+from ask_ai import get_app_dir
+
+
+# ================= 文件夹注册表 =================
+
+class FolderRegistry:
+    """
+    知识库文件夹注册表（取代整文件重写的 folder_structure.json）
+    - SQLite 保存文件夹，name 和 path 都有唯一索引；写入使用 BEGIN IMMEDIATE 事务，
+      Electron 的 worker 和 keyboard_manager 等多个进程同时写入也不会互相覆盖
+    - 进程内缓存按名称和路径建立字典，查找为 O(1)；通过 PRAGMA data_version 判断
+      其他连接（包括其他进程）是否提交过修改，没有变化时不访问磁盘读取数据
+    - 支持多级文件夹：每个文件夹可以有一个父文件夹
+    - changes 表记录每次修改，subscribe() 注册的回调在本进程发现变化时触发
+    - 首次使用时导入 folder_structure.json；每次修改后导出一份快照供旧版本工具读取，
+      JSON 比注册表最近一次修改更新时（用户或旧工具编辑过），下次刷新按 JSON 对齐：
+      新增、修改描述/路径/父文件夹，JSON 中已删除的文件夹也从注册表删除
+    """
+
+    def __init__(self, path: str = None, json_path: str = None):
+        """
+        :param path: 数据库文件路径，默认为 exe/脚本 同目录下的 folders.sqlite3
+        :param json_path: 兼容用的 folder_structure.json 路径，None 表示同目录下的默认文件
+        """
+        if path is None:
+            path = os.path.join(get_app_dir(), "folders.sqlite3")
+        if json_path is None:
+            json_path = os.path.join(get_app_dir(), "folder_structure.json")
+        self.path = path
+        self.json_path = json_path
+
+        self._lock = threading.RLock()
+        self._conn = None
+        self._data_version = None
+        self._version = -1
+        self._json_mtime = None
+        self._folders = []  # 按创建顺序
+        self._by_name = {}
+        self._by_path = {}
+        self._listeners = []
+
+    # ---------- 数据库 ----------
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS folders (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL UNIQUE,
+                    path TEXT NOT NULL UNIQUE,
+                    description TEXT NOT NULL DEFAULT '',
+                    parent_id INTEGER REFERENCES folders(id) ON DELETE SET NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_folders_parent ON folders(parent_id);
+                CREATE TABLE IF NOT EXISTS changes (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    op TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    changed_at REAL NOT NULL
+                );
+            """)
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def normalize_path(path: str) -> str:
+        """统一使用正斜杠、去掉末尾斜杠（与 folder_structure.json 中的写法一致）"""
+        return path.replace("\\", "/").rstrip("/")
+
+    def _write(self, func):
+        """在写事务中执行 func(conn)，提交后刷新缓存、导出 JSON 快照并通知订阅者"""
+        with self._lock:
+            conn = self._connect()
+            self.refresh()  # 先合并 JSON 中用户或旧工具做的修改
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(conn)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            self.refresh(force=True)
+            self._export_json()
+            return result
+
+    @staticmethod
+    def _log(conn: sqlite3.Connection, op: str, name: str):
+        conn.execute("INSERT INTO changes (op, name, changed_at) VALUES (?, ?, ?)", (op, name, time.time()))
+
+    # ---------- folder_structure.json 兼容 ----------
+
+    def _json_folders(self) -> Optional[list]:
+        """读取 JSON 中的文件夹列表；文件不存在或无法解析时返回 None（不能当作"全部删除"）"""
+        try:
+            with open(self.json_path, 'r', encoding='utf-8') as f:
+                folders = json.load(f).get("folders", [])
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"⚠️ 读取 {self.json_path} 失败: {e}")
+            return None
+        if not isinstance(folders, list) or \
+                not all(isinstance(f, dict) and f.get("name") and f.get("path") for f in folders):
+            print(f"⚠️ {self.json_path} 格式不正确，忽略本次修改")
+            return None
+        return folders
+
+    def _json_changed(self) -> bool:
+        try:
+            mtime = os.path.getmtime(self.json_path)
+        except OSError:
+            return False
+        return mtime != self._json_mtime
+
+    def _import_json(self) -> int:
+        """
+        JSON 比注册表最近一次修改更新时，按 JSON 对齐注册表（以名称为键）：
+        - JSON 中新增的文件夹插入注册表
+        - 描述、路径、父文件夹与注册表不同时更新
+        - 注册表中有而 JSON 中没有的文件夹视为已删除
+        路径与其他文件夹冲突的修改会被跳过并打印警告
+
+        :return: 变化的文件夹数
+        """
+        if not self._json_changed():
+            return 0
+        try:
+            self._json_mtime = os.path.getmtime(self.json_path)
+        except OSError:
+            return 0
+        conn = self._conn
+        # JSON 早于注册表最近一次修改时是过期快照（例如其他进程刚删除文件夹、还没导出），不导入
+        last_change = conn.execute("SELECT MAX(changed_at) FROM changes").fetchone()[0]
+        if last_change is not None and self._json_mtime <= last_change:
+            return 0
+        folders = self._json_folders()
+        if folders is None:
+            return 0
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            added = removed = 0
+            updated = set()
+            now = time.time()
+            existing = {name: (path, description) for name, path, description in
+                        conn.execute("SELECT name, path, description FROM folders")}
+            names = {folder["name"] for folder in folders}
+            # 先删除，被删除文件夹的路径才能给 JSON 中的其他文件夹使用
+            for name in existing:
+                if name not in names:
+                    conn.execute("DELETE FROM folders WHERE name = ?", (name,))
+                    self._log(conn, "remove", name)
+                    removed += 1
+            for folder in folders:
+                name = folder["name"]
+                path = self.normalize_path(folder["path"])
+                description = folder.get("description", "")
+                try:
+                    if name not in existing:
+                        conn.execute(
+                            "INSERT INTO folders (name, path, description, created_at, updated_at) "
+                            "VALUES (?, ?, ?, ?, ?)", (name, path, description, now, now)
+                        )
+                        self._log(conn, "import", name)
+                        added += 1
+                    elif existing[name] != (path, description):
+                        conn.execute(
+                            "UPDATE folders SET path = ?, description = ?, updated_at = ? WHERE name = ?",
+                            (path, description, now, name)
+                        )
+                        self._log(conn, "update", name)
+                        updated.add(name)
+                except sqlite3.IntegrityError:
+                    print(f"⚠️ {os.path.basename(self.json_path)} 中文件夹 {name} 的路径已被其他文件夹使用，忽略: {path}")
+            for folder in folders:
+                cursor = conn.execute(
+                    "UPDATE folders SET parent_id = (SELECT id FROM folders WHERE name = ?) "
+                    "WHERE name = ? AND parent_id IS NOT (SELECT id FROM folders WHERE name = ?)",
+                    (folder.get("parent"), folder["name"], folder.get("parent"))
+                )
+                if cursor.rowcount and folder["name"] in existing and folder["name"] not in updated:
+                    self._log(conn, "update", folder["name"])
+                    updated.add(folder["name"])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if added or updated or removed:
+            print(f"📥 从 {os.path.basename(self.json_path)} 同步文件夹："
+                  f"新增 {added}，修改 {len(updated)}，删除 {removed}")
+        return added + len(updated) + removed
+
+    def _export_json(self):
+        """导出 JSON 快照（写临时文件后原子替换），供仍直接读取 folder_structure.json 的工具使用"""
+        data = {"folders": [dict(f) for f in self._folders]}
+        for folder in data["folders"]:
+            if folder["parent"] is None:
+                del folder["parent"]
+        tmp_path = f"{self.json_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=4)
+            os.replace(tmp_path, self.json_path)
+            self._json_mtime = os.path.getmtime(self.json_path)
+        except OSError as e:
+            print(f"⚠️ 导出 {self.json_path} 失败: {e}")
+
+    # ---------- 缓存 ----------
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        其他连接提交过修改时重新加载缓存（未变化时只执行一次 PRAGMA，不读取数据）
+
+        :param force: 本连接刚提交过修改（data_version 只反映其他连接的提交）
+        :return: 缓存是否有变化
+        """
+        with self._lock:
+            conn = self._connect()
+            force = self._import_json() > 0 or force
+            data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            stale = force or data_version != self._data_version or self._version < 0
+            version = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0] \
+                if stale else self._version
+            self._data_version = data_version
+            if version == self._version:
+                return False
+
+            rows = conn.execute(
+                "SELECT f.name, f.path, f.description, p.name FROM folders f "
+                "LEFT JOIN folders p ON p.id = f.parent_id ORDER BY f.id"
+            ).fetchall()
+            self._folders = [{"name": name, "path": path, "description": description, "parent": parent}
+                             for name, path, description, parent in rows]
+            self._by_name = {f["name"]: f for f in self._folders}
+            self._by_path = {f["path"]: f for f in self._folders}
+            first_load = self._version < 0
+            self._version = version
+            listeners = list(self._listeners)
+
+        if not first_load:
+            for callback in listeners:
+                try:
+                    callback(version)
+                except Exception as e:
+                    print(f"⚠️ 文件夹变更通知失败: {e}")
+        return True
+
+    def version(self) -> int:
+        """注册表版本号（每次修改递增）"""
+        self.refresh()
+        return self._version
+
+    def subscribe(self, callback: Callable[[int], None]):
+        """注册变更回调 callback(version)，本进程发现注册表变化（包括其他进程的修改）时调用"""
+        with self._lock:
+            self._listeners.append(callback)
+
+    # ---------- 查询 ----------
+
+    def list(self) -> list:
+        """所有文件夹 [{"name", "path", "description", "parent"}]，按创建顺序"""
+        self.refresh()
+        return [dict(f) for f in self._folders]
+
+    def get(self, name: str) -> Optional[dict]:
+        """按名称查找"""
+        self.refresh()
+        folder = self._by_name.get(name)
+        return dict(folder) if folder else None
+
+    def get_by_path(self, path: str) -> Optional[dict]:
+        """按路径查找"""
+        self.refresh()
+        folder = self._by_path.get(self.normalize_path(path))
+        return dict(folder) if folder else None
+
+    def children(self, name: str) -> list:
+        """直接子文件夹"""
+        self.refresh()
+        return [dict(f) for f in self._folders if f["parent"] == name]
+
+    # ---------- 修改 ----------
+
+    def add(self, name: str, path: str, description: str = "", parent: str = None) -> dict:
+        """
+        注册文件夹；同名文件夹已存在时返回已有记录
+
+        :param parent: 父文件夹名称（需已注册）
+        """
+        path = self.normalize_path(path)
+
+        def insert(conn):
+            parent_id = None
+            if parent:
+                row = conn.execute("SELECT id FROM folders WHERE name = ?", (parent,)).fetchone()
+                if row is None:
+                    raise ValueError(f"父文件夹不存在: {parent}")
+                parent_id = row[0]
+            if conn.execute("SELECT 1 FROM folders WHERE name = ?", (name,)).fetchone():
+                return
+            owner = conn.execute("SELECT name FROM folders WHERE path = ?", (path,)).fetchone()
+            if owner:
+                raise ValueError(f"路径已注册为文件夹 {owner[0]}: {path}")
+            now = time.time()
+            conn.execute(
+                "INSERT INTO folders (name, path, description, parent_id, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (name, path, description, parent_id, now, now)
+            )
+            self._log(conn, "add", name)
+
+        self._write(insert)
+        return self.get(name)
+
+    def update(self, name: str, description: str = None, path: str = None, parent: str = None) -> Optional[dict]:
+        """修改文件夹的描述、路径或父文件夹（为 None 的字段保持不变）"""
+        def apply(conn):
+            fields, args = [], []
+            if description is not None:
+                fields.append("description = ?")
+                args.append(description)
+            if path is not None:
+                fields.append("path = ?")
+                args.append(self.normalize_path(path))
+            if parent is not None:
+                fields.append("parent_id = (SELECT id FROM folders WHERE name = ?)")
+                args.append(parent)
+            if not fields:
+                return
+            cursor = conn.execute(
+                f"UPDATE folders SET {', '.join(fields)}, updated_at = ? WHERE name = ?",
+                args + [time.time(), name]
+            )
+            if cursor.rowcount:
+                self._log(conn, "update", name)
+
+        self._write(apply)
+        return self.get(name)
+
+    def remove(self, name: str) -> bool:
+        """取消注册（不删除磁盘上的文件夹），子文件夹变为顶层"""
+        def delete(conn):
+            cursor = conn.execute("DELETE FROM folders WHERE name = ?", (name,))
+            if cursor.rowcount:
+                self._log(conn, "remove", name)
+            return cursor.rowcount > 0
+
+        return self._write(delete)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_folder_registry() -> FolderRegistry:
+    """获取进程内共享的文件夹注册表"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = FolderRegistry()
+        return _registry
+
+
+# ================= 测试入口 =================
+
+if __name__ == "__main__":
+    registry = get_folder_registry()
+    for folder in registry.list():
+        parent = f" (父文件夹: {folder['parent']})" if folder["parent"] else ""
+        print(f"- {folder['name']}{parent}: {folder['path']}")
+    print(f"共 {len(registry.list())} 个文件夹，版本 {registry.version()}")
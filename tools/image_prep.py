@@ -0,0 +1,335 @@
+import os
+import io
+import base64
+from typing import List
+
+from PIL import Image, ImageOps, features
+
+from env_utils import env_flag
+
+
+# ================= 默认配置 =================
+
+PREP_ENABLED = env_flag("IMAGE_PREP_ENABLED", True)  # 关闭后退回原来的全尺寸 JPEG q85，便于对比效果
+BINARIZE = env_flag("IMAGE_PREP_BINARIZE", False)  # 纯文字图片是否进一步二值化（体积更小，对浅色文字可能有损）
+
+DEFAULT_MAX_SIDE = int(os.environ.get("IMAGE_MAX_SIDE", "1536"))
+# 各模型推荐的最长边（超过后服务端也会缩小或切块，上传更大的图片只增加传输和排队时间）
+# 键为完整模型 id；查不到时再用去掉服务商前缀后的名称查找（同一模型在不同平台上的前缀不同）
+MODEL_MAX_SIDE = {
+    "deepseek-ai/DeepSeek-OCR": 1280,
+    "openai/gpt-4o": 2048,
+    "gpt-4o": 2048,
+}
+
+TILE_ASPECT = 2.0  # 长边与短边之比超过该值时按短边缩放后切块，而不是整体缩小到看不清
+TILE_OVERLAP = 48  # 相邻图块的重叠像素，避免把一行文字切成两半
+MAX_TILES = 8
+
+DOCUMENT_RATIO = 0.92  # 接近纯白或纯黑的像素占比达到该值，视为纯文字（文档、代码截图）
+DOCUMENT_MAX_SATURATION = 24  # 纯文字图片的平均饱和度上限
+ANALYSIS_SIZE = 512  # 判断内容类型时的采样尺寸
+GRAY_BITS = 4  # 纯文字图片保留的灰度位数
+
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+
+PREP_VERSION = 1  # 预处理规则变化时递增，使 OCR 缓存失效
+
+
+# ================= 编码结果 =================
+
+class EncodedImage:
+    """编码好的待上传图片"""
+
+    __slots__ = ("data", "mime")
+
+    def __init__(self, data: bytes, mime: str):
+        self.data = data
+        self.mime = mime
+
+    def to_data_url(self) -> str:
+        return f"data:{self.mime};base64,{base64.b64encode(self.data).decode('utf-8')}"
+
+    def __len__(self):
+        return len(self.data)
+
+
+# ================= 图片分析 =================
+
+def is_pixmap(image) -> bool:
+    """是否为 PyMuPDF 的 Pixmap（按属性判断，本模块不依赖 fitz）"""
+    return hasattr(image, "samples_mv") and hasattr(image, "stride")
+
+
+def from_pixmap(pix) -> Image.Image:
+    """
+    把 Pixmap 包装为 PIL 图片，直接引用 Pixmap 的像素内存，不复制、不经过 PNG 编解码
+    （返回的图片只能在 Pixmap 存活期间使用）
+    """
+    if pix.alpha:
+        raise ValueError("不支持带透明通道的 Pixmap，渲染时请传 alpha=False")
+    mode = {1: "L", 3: "RGB"}.get(pix.n)
+    if mode is None:
+        raise ValueError(f"不支持的 Pixmap 通道数: {pix.n}")
+    return Image.frombuffer(mode, (pix.width, pix.height), pix.samples_mv, "raw", mode, pix.stride, 1)
+
+
+def load_image(image) -> Image.Image:
+    """把图片路径、Pixmap 或 PIL 图片统一为 PIL 图片"""
+    if isinstance(image, str):
+        image = Image.open(image)
+        image.load()
+        return image
+    if is_pixmap(image):
+        return from_pixmap(image)
+    return image
+
+
+def flatten(image: Image.Image) -> Image.Image:
+    """去掉透明通道（铺白底），统一为 RGB 或 L"""
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        return background
+    if image.mode not in ("RGB", "L"):
+        return image.convert("RGB")
+    return image
+
+
+def is_document(image: Image.Image) -> bool:
+    """
+    是否为纯文字图片：几乎没有颜色，且像素集中在黑白两端
+    在最近邻采样的小图上统计（不做平滑，文字笔画不会被糊成灰色），开销与原图大小无关
+    """
+    scale = min(1.0, ANALYSIS_SIZE / max(image.size))
+    thumb = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+                         Image.NEAREST)
+
+    if thumb.mode == "RGB":
+        saturation = thumb.convert("HSV").getchannel("S")
+        histogram = saturation.histogram()
+        mean_saturation = sum(i * n for i, n in enumerate(histogram)) / max(sum(histogram), 1)
+        if mean_saturation > DOCUMENT_MAX_SATURATION:
+            return False
+
+    histogram = thumb.convert("L").histogram()
+    extreme = sum(histogram[:64]) + sum(histogram[192:])
+    return extreme / max(sum(histogram), 1) >= DOCUMENT_RATIO
+
+
+def otsu_threshold(gray: Image.Image) -> int:
+    """Otsu 法计算二值化阈值（只用 256 级直方图）"""
+    histogram = gray.histogram()
+    total = sum(histogram)
+    sum_all = sum(i * n for i, n in enumerate(histogram))
+
+    best, threshold = -1.0, 128
+    weight_bg = sum_bg = 0
+    for i, n in enumerate(histogram):
+        weight_bg += n
+        if weight_bg == 0:
+            continue
+        weight_fg = total - weight_bg
+        if weight_fg == 0:
+            break
+        sum_bg += i * n
+        mean_bg = sum_bg / weight_bg
+        mean_fg = (sum_all - sum_bg) / weight_fg
+        variance = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        if variance > best:
+            best, threshold = variance, i
+    return threshold
+
+
+def max_side_for(model: str = None) -> int:
+    """模型推荐的最长边（支持带服务商前缀的 id，如 openai/gpt-4o）"""
+    model = model or ""
+    if model in MODEL_MAX_SIDE:
+        return MODEL_MAX_SIDE[model]
+    return MODEL_MAX_SIDE.get(model.rsplit("/", 1)[-1], DEFAULT_MAX_SIDE)
+
+
+def fit_scale(width: float, height: float, max_side: int) -> float:
+    """
+    按 split_tiles 的规则计算缩放比例：普通图片限制最长边，长图限制短边（之后再切块）
+    渲染 PDF 时据此直接按上传尺寸渲染，省去一次缩放
+    """
+    long_side, short_side = max(width, height), min(width, height)
+    if long_side / max(short_side, 1) <= TILE_ASPECT:
+        return max_side / long_side
+    return max_side / max(short_side, 1)
+
+
+# ================= 缩放与切块 =================
+
+def _resize(image: Image.Image, scale: float) -> Image.Image:
+    if scale >= 1:
+        return image  # 不放大
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.LANCZOS)
+
+
+def split_tiles(image: Image.Image, max_side: int) -> List[Image.Image]:
+    """
+    缩放并在需要时沿长边切块
+
+    - 普通图片：整体缩小到最长边不超过 max_side
+    - 长图（长宽比超过 TILE_ASPECT）：短边缩小到 max_side 以内，再沿长边切成带重叠的图块，
+      保证文字大小不随图片长度变小；图块过多时整体再缩小
+    """
+    long_side, short_side = max(image.size), min(image.size)
+    if long_side / max(short_side, 1) <= TILE_ASPECT:
+        return [_resize(image, fit_scale(image.width, image.height, max_side))]
+
+    scale = min(1.0, fit_scale(image.width, image.height, max_side))
+    step = max_side - TILE_OVERLAP
+    tiles_needed = -(-(long_side * scale - TILE_OVERLAP) // step)
+    if tiles_needed > MAX_TILES:
+        scale = (MAX_TILES * step + TILE_OVERLAP) / long_side
+    image = _resize(image, scale)
+
+    vertical = image.height >= image.width
+    length = image.height if vertical else image.width
+    tiles = []
+    start = 0
+    while True:
+        end = min(start + max_side, length)
+        box = (0, start, image.width, end) if vertical else (start, 0, end, image.height)
+        tiles.append(image.crop(box))
+        if end >= length:
+            return tiles
+        start = end - TILE_OVERLAP
+
+
+# ================= 编码 =================
+
+def encode(image: Image.Image, document: bool) -> EncodedImage:
+    """
+    按内容选择编码：纯文字用 PNG（无损、灰度或二值图压缩率高，笔画边缘不会出现 JPEG 噪点），
+    照片和图表用 WebP（不支持时用 JPEG）
+    """
+    buffered = io.BytesIO()
+    if document:
+        image.save(buffered, format="PNG", optimize=image.mode == "1")
+        return EncodedImage(buffered.getvalue(), "image/png")
+
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    if features.check("webp"):
+        image.save(buffered, format="WEBP", quality=WEBP_QUALITY, method=4)
+        return EncodedImage(buffered.getvalue(), "image/webp")
+    image.save(buffered, format="JPEG", quality=JPEG_QUALITY)
+    return EncodedImage(buffered.getvalue(), "image/jpeg")
+
+
+def encode_legacy(image: Image.Image) -> EncodedImage:
+    """原来的编码方式：全尺寸 JPEG q85（关闭预处理时使用，也作为对比基准）"""
+    image = flatten(load_image(image))
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    buffered = io.BytesIO()
+    image.save(buffered, format="JPEG", quality=JPEG_QUALITY)
+    return EncodedImage(buffered.getvalue(), "image/jpeg")
+
+
+def prepare_image(image, purpose: str = "ocr", model: str = None) -> List[EncodedImage]:
+    """
+    上传前的图片预处理
+
+    :param image: PIL.Image 对象、图片文件路径、PyMuPDF Pixmap 或已编码好的 EncodedImage（原样返回）
+    :param purpose: "ocr" 或 "vlm"；纯文字图片都会转为灰度，只有 "ocr" 会按 BINARIZE 设置二值化
+    :param model: 目标模型名称，用于确定最长边
+    :return: 编码好的图块列表（普通图片只有一块）
+    """
+    if isinstance(image, EncodedImage):
+        return [image]
+    if not PREP_ENABLED:
+        return [encode_legacy(image)]
+
+    image = flatten(load_image(image))
+    document = is_document(image)
+    if document:
+        image = image.convert("L")  # 纯文字图片没有有用的颜色信息
+
+    results = []
+    for tile in split_tiles(image, max_side_for(model)):
+        if document:
+            tile = ImageOps.autocontrast(tile, cutoff=1)
+            if purpose == "ocr" and BINARIZE:
+                threshold = otsu_threshold(tile)
+                tile = tile.point(lambda v: 255 if v > threshold else 0, mode="1")
+            else:
+                # 16 级灰度保留文字的抗锯齿边缘，PNG 体积比 256 级小一半以上
+                tile = ImageOps.posterize(tile, GRAY_BITS)
+        results.append(encode(tile, document))
+    return results
+
+
+def prep_signature(purpose: str = "ocr", model: str = None) -> str:
+    """预处理参数的签名，作为 OCR 缓存键的一部分（参数变化后不会命中旧结果）"""
+    if not PREP_ENABLED:
+        return "legacy"
+    return f"v{PREP_VERSION}|{purpose}|{max_side_for(model)}|{int(BINARIZE)}"
+
+
+# ================= 效果对比 =================
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import difflib
+
+    if len(sys.argv) < 2:
+        print("用法: python image_prep.py <图片或 PDF 路径> [PDF 页码，从 1 开始] [--ocr]")
+        print("     --ocr: 分别用原始编码和预处理后的图片请求 OCR，对比耗时和文字一致性")
+        sys.exit(1)
+
+    path = sys.argv[1]
+    args = [a for a in sys.argv[2:] if not a.startswith("--")]
+    if path.lower().endswith(".pdf"):
+        from pdf_reader import render_page
+        pixmap = render_page(path, int(args[0]) - 1 if args else 0)
+        source = from_pixmap(pixmap)
+    else:
+        source = load_image(path)
+
+    from ask_ai import AIClient
+
+    AIClient(system_prompt="你是一个 OCR 助手")
+    model = (AIClient._ocr_config or {}).get("model_name")
+
+    start = time.time()
+    legacy = encode_legacy(source)
+    legacy_time = time.time() - start
+    start = time.time()
+    prepared = prepare_image(source, "ocr", model)
+    prep_time = time.time() - start
+
+    prepared_bytes = sum(len(p) for p in prepared)
+    print(f"原图: {source.size[0]}x{source.size[1]} {source.mode}，纯文字: {is_document(flatten(source))}")
+    print(f"原始编码: JPEG {len(legacy) / 1024:.1f} KB，耗时 {legacy_time * 1000:.0f} ms")
+    print(f"预处理后: {len(prepared)} 块 {', '.join(p.mime for p in prepared)}，"
+          f"{prepared_bytes / 1024:.1f} KB（{prepared_bytes / max(len(legacy), 1):.0%}），"
+          f"耗时 {prep_time * 1000:.0f} ms")
+
+    if "--ocr" in sys.argv and AIClient._ocr_config:
+        from ask_ai import get_shared_client
+
+        client = get_shared_client(AIClient._ocr_config["endpoint"], AIClient._ocr_config["token"])
+
+        def run_ocr(images):
+            begin = time.time()
+            texts = []
+            for encoded in images:
+                response = client.chat.completions.create(
+                    model=model, messages=AIClient._ocr_messages(encoded.to_data_url()), max_tokens=4096)
+                texts.append(response.choices[0].message.content)
+            return "\n".join(texts), time.time() - begin
+
+        baseline_text, baseline_time = run_ocr([legacy])
+        prepared_text, prepared_time = run_ocr(prepared)
+        similarity = difflib.SequenceMatcher(None, baseline_text, prepared_text).ratio()
+        print(f"OCR 耗时: 原始 {baseline_time:.2f}s，预处理后 {prepared_time:.2f}s")
+        print(f"OCR 文字: 原始 {len(baseline_text)} 字符，预处理后 {len(prepared_text)} 字符，一致性 {similarity:.1%}")
@@ -0,0 +1,308 @@
+import os
+import io
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+from typing import Optional, Union
+
+from PIL import Image, features
+
+from ask_ai import get_app_dir
+from image_prep import flatten, is_document, load_image
+from tracing import span
+
+
+# ================= 默认配置 =================
+
+HASH_PREFIX = 16  # 文件名使用内容哈希的前多少位（64 bit，同一文件夹内不会冲突）
+PHASH_DISTANCE = 3  # 感知哈希的汉明距离不超过该值视为近似（只报告，不合并）
+ASPECT_TOLERANCE = 0.02  # 近似还要求宽高比相差不超过 2%
+STORE_WEBP_QUALITY = 90  # 照片、图表保存为 WebP 的质量（归档用，比上传时高）
+THUMB_SIZE = 256  # 缩略图最长边
+THUMB_QUALITY = 75
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp')
+
+
+# ================= 哈希 =================
+
+def content_digest(image: Image.Image) -> str:
+    """像素内容的 sha256（与文件格式、元数据无关，同一截图重复保存得到相同的值）"""
+    h = hashlib.sha256(f"{image.mode}:{image.width}x{image.height}:".encode("ascii"))
+    h.update(image.tobytes())
+    return h.hexdigest()
+
+
+def dhash(image: Image.Image, size: int = 8) -> int:
+    """差值感知哈希：缩放到 (size+1)×size 灰度图，比较相邻像素的明暗，得到 size² 位整数"""
+    small = image.convert("L").resize((size + 1, size), Image.BILINEAR)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            offset = row * (size + 1) + col
+            value = (value << 1) | (pixels[offset] > pixels[offset + 1])
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+# ================= 图片库 =================
+
+class ImageStore:
+    """
+    知识库图片存储
+    - 图片按像素内容哈希命名（images/3f2a….png），同一秒内的多张截图不会互相覆盖，
+      只有像素完全相同的截图才复用已有文件
+    - 照片、图表按感知哈希（dHash）查找近似的已有图片，结果只通过 near_of 报告、新图片照常保存：
+      64 位 dHash 分辨不了只差几根柱子的两张图表，合并会丢失内容；纯文字截图不计算感知哈希
+    - 按内容选择格式：纯文字用无损 PNG，照片和图表用 WebP（不支持时 PNG），
+      原本就是 JPEG 的照片直接复制原文件，不再二次有损压缩
+    - 缩略图按内容哈希缓存在 thumbnails/，文件夹视图显示图片网格时不需要解码原图
+    """
+
+    def __init__(self, path: str = None, thumb_dir: str = None):
+        """
+        :param path: 数据库文件路径，默认为 exe/脚本 同目录下的 images.sqlite3
+        :param thumb_dir: 缩略图缓存目录，默认为同目录下的 thumbnails/
+        """
+        if path is None:
+            path = os.path.join(get_app_dir(), "images.sqlite3")
+        if thumb_dir is None:
+            thumb_dir = os.path.join(get_app_dir(), "thumbnails")
+        self.path = path
+        self.thumb_dir = thumb_dir
+        os.makedirs(thumb_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS images (
+                folder TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                path TEXT NOT NULL,
+                phash TEXT,
+                width INTEGER NOT NULL,
+                height INTEGER NOT NULL,
+                mime TEXT NOT NULL,
+                bytes INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (folder, digest)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_images_path ON images(path)")
+        self._conn.commit()
+        self._phashes = {}  # folder -> [(phash, 宽高比, path)]，按需从数据库加载
+
+    @staticmethod
+    def _normalize(path: str) -> str:
+        return os.path.abspath(path).replace("\\", "/")
+
+    def _folder_phashes(self, folder: str) -> list:
+        entries = self._phashes.get(folder)
+        if entries is None:
+            rows = self._conn.execute(
+                "SELECT phash, width, height, path FROM images WHERE folder = ? AND phash IS NOT NULL", (folder,)
+            ).fetchall()
+            entries = self._phashes[folder] = [(int(p, 16), w / h, path) for p, w, h, path in rows]
+        return entries
+
+    def _find_near(self, folder: str, phash: int, aspect: float) -> Optional[str]:
+        for other, other_aspect, path in self._folder_phashes(folder):
+            if hamming(phash, other) <= PHASH_DISTANCE and abs(other_aspect - aspect) <= ASPECT_TOLERANCE * aspect \
+                    and os.path.exists(path):
+                return path
+        return None
+
+    # ---------- 保存 ----------
+
+    @staticmethod
+    def _encode(image: Image.Image, document: bool) -> tuple:
+        """按内容编码，返回 (数据, 扩展名, mime)"""
+        buffered = io.BytesIO()
+        if document or not features.check("webp"):
+            image.save(buffered, format="PNG", optimize=True)
+            return buffered.getvalue(), ".png", "image/png"
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.save(buffered, format="WEBP", quality=STORE_WEBP_QUALITY, method=4)
+        return buffered.getvalue(), ".webp", "image/webp"
+
+    def save(self, image: Union[str, Image.Image], folder_path: str) -> dict:
+        """
+        把图片保存到知识库文件夹的 images/ 下
+
+        :param image: 图片路径或 PIL 图片
+        :param folder_path: 知识库文件夹路径
+        :return: {"path": 保存路径, "relative_path": markdown 中使用的相对路径, "digest": 内容哈希,
+                  "duplicate": None / "exact"（复用了像素完全相同的已有文件）,
+                  "near_of": 近似的已有图片路径或 None, "bytes": 文件大小}
+        """
+        with span("write.image") as trace:
+            result = self._save(image, folder_path)
+            # 重复的图片没有写入新文件
+            trace.set(duplicate=result["duplicate"], near=result["near_of"] is not None,
+                      bytes=0 if result["duplicate"] else result["bytes"])
+            return result
+
+    def _save(self, image: Union[str, Image.Image], folder_path: str) -> dict:
+        folder = self._normalize(folder_path)
+        images_dir = os.path.join(folder_path, "images")
+        os.makedirs(images_dir, exist_ok=True)
+
+        source_format = None
+        if isinstance(image, str):
+            source_path = image
+            image = load_image(image)
+            source_format = image.format
+        pixels = flatten(image)
+        digest = content_digest(pixels)
+        document = is_document(pixels)
+        phash = None if document else dhash(pixels)
+        aspect = pixels.width / pixels.height
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path, bytes FROM images WHERE folder = ? AND digest = ?", (folder, digest)
+            ).fetchone()
+            if row and os.path.exists(row[0]):
+                return self._result(folder_path, row[0], digest, "exact", row[1])
+            near_of = self._find_near(folder, phash, aspect) if phash is not None else None
+
+        if source_format == "JPEG" and not document:
+            ext, mime = ".jpg", "image/jpeg"
+            save_path = os.path.join(images_dir, digest[:HASH_PREFIX] + ext)
+            shutil.copyfile(source_path, save_path)
+        else:
+            data, ext, mime = self._encode(pixels, document)
+            save_path = os.path.join(images_dir, digest[:HASH_PREFIX] + ext)
+            # 先写临时文件再改名，文件名由内容决定，并发保存同一张图时结果相同
+            tmp_path = f"{save_path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, save_path)
+
+        save_path = self._normalize(save_path)
+        size = os.path.getsize(save_path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO images (folder, digest, path, phash, width, height, mime, bytes, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (folder, digest, save_path, None if phash is None else f"{phash:016x}",
+                 pixels.width, pixels.height, mime, size, time.time())
+            )
+            self._conn.commit()
+            if phash is not None and folder in self._phashes:
+                self._phashes[folder].append((phash, aspect, save_path))
+        self._write_thumbnail(pixels, digest)
+        return self._result(folder_path, save_path, digest, None, size, near_of)
+
+    @staticmethod
+    def _result(folder_path: str, path: str, digest: str, duplicate: Optional[str], size: int,
+                near_of: str = None) -> dict:
+        relative_path = os.path.relpath(path, folder_path).replace("\\", "/")
+        return {"path": path, "relative_path": relative_path, "digest": digest,
+                "duplicate": duplicate, "near_of": near_of, "bytes": size}
+
+    # ---------- 缩略图 ----------
+
+    def _thumb_path(self, key: str) -> str:
+        return os.path.join(self.thumb_dir, key[:2], f"{key}.webp" if features.check("webp") else f"{key}.png")
+
+    def _write_thumbnail(self, image: Image.Image, key: str) -> str:
+        path = self._thumb_path(key)
+        if os.path.exists(path):
+            return path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        thumb = image.copy()
+        thumb.thumbnail((THUMB_SIZE, THUMB_SIZE), Image.BILINEAR, reducing_gap=2.0)
+        if thumb.mode not in ("RGB", "L"):
+            thumb = flatten(thumb)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        if path.endswith(".webp"):
+            thumb.save(tmp_path, format="WEBP", quality=THUMB_QUALITY)
+        else:
+            thumb.save(tmp_path, format="PNG")
+        os.replace(tmp_path, path)
+        return path
+
+    def _thumb_key(self, path: str) -> str:
+        """库内图片用内容哈希；其他图片（旧版按时间命名的截图等）用路径、大小和修改时间的哈希"""
+        with self._lock:
+            row = self._conn.execute("SELECT digest FROM images WHERE path = ?", (path,)).fetchone()
+        if row:
+            return row[0]
+        stat = os.stat(path)
+        return hashlib.sha256(f"{path}|{stat.st_size}|{stat.st_mtime_ns}".encode("utf-8")).hexdigest()
+
+    def thumbnail(self, image_path: str) -> str:
+        """获取图片的缩略图路径，缓存未命中时生成（JPEG 使用 draft 模式按缩小比例解码）"""
+        path = self._normalize(image_path)
+        key = self._thumb_key(path)
+        cached = self._thumb_path(key)
+        if os.path.exists(cached):
+            return cached
+        with Image.open(path) as image:
+            image.draft("RGB", (THUMB_SIZE, THUMB_SIZE))
+            return self._write_thumbnail(flatten(image), key)
+
+    def thumbnails(self, paths: list) -> dict:
+        """批量获取缩略图 {原图路径: 缩略图路径}，不是图片或读取失败的路径不包含在结果中"""
+        result = {}
+        for path in paths:
+            if not path.lower().endswith(IMAGE_EXTS):
+                continue
+            try:
+                result[path] = self.thumbnail(path)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ 生成缩略图失败 {path}: {e}")
+        return result
+
+    def stats(self, folder_path: str = None) -> dict:
+        """图片数量和占用空间（可按文件夹统计）"""
+        query = "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM images"
+        args = ()
+        if folder_path:
+            query += " WHERE folder = ?"
+            args = (self._normalize(folder_path),)
+        with self._lock:
+            count, total = self._conn.execute(query, args).fetchone()
+        return {"images": count, "bytes": total}
+
+
+_image_store = None
+_image_store_lock = threading.Lock()
+
+
+def get_image_store() -> ImageStore:
+    """获取进程内共享的图片库"""
+    global _image_store
+    with _image_store_lock:
+        if _image_store is None:
+            _image_store = ImageStore()
+        return _image_store
+
+
+# ================= 测试入口 =================
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 3:
+        print("用法: python image_store.py <知识库文件夹路径> <图片路径>...")
+        sys.exit(1)
+
+    store = get_image_store()
+    for image_path in sys.argv[2:]:
+        start = time.time()
+        result = store.save(image_path, sys.argv[1])
+        label = "完全重复" if result["duplicate"] else "新图片"
+        if result["near_of"]:
+            label += f"，近似于 {os.path.basename(result['near_of'])}"
+        print(f"{image_path} -> {result['relative_path']} ({label}, {result['bytes'] / 1024:.1f} KB, "
+              f"{(time.time() - start) * 1000:.0f} ms)")
+    print(store.stats(sys.argv[1]))
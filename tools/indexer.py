@@ -0,0 +1,135 @@
+import os
+import threading
+from typing import Optional
+
+from search_index import SearchIndex, classify_file, file_digest, normalize_path
+
+
+# ================= 增量索引 =================
+
+class IncrementalIndexer:
+    """
+    增量索引器
+    - 以 SearchIndex 的 files 表作为清单（路径、mtime、size、sha256），重启后无需全量重建
+    - mtime 和 size 都没变的文件直接跳过；变了再计算 sha256，内容相同时只更新清单
+    - 只有内容真正变化的文件才重新提取文本和向量
+    """
+
+    def __init__(self, index: SearchIndex = None):
+        """
+        :param index: 要维护的搜索索引，默认使用 SearchIndex()
+        """
+        self.index = index or SearchIndex()
+        self._lock = threading.Lock()  # 扫描和事件更新串行执行，避免同一文件被重复处理
+
+    @staticmethod
+    def _folder_for(path: str, folders: list) -> Optional[str]:
+        """根据路径找到所属的知识库文件夹（取最长匹配的文件夹路径）"""
+        path = normalize_path(path)
+        best_name, best_len = None, -1
+        for folder in folders:
+            root = normalize_path(folder["path"])
+            if (path == root or path.startswith(root + os.sep)) and len(root) > best_len:
+                best_name, best_len = folder["name"], len(root)
+        return best_name
+
+    def _update_file(self, path: str, folder: Optional[str], entry: Optional[dict]) -> str:
+        """
+        按需更新单个文件
+
+        :return: "indexed" / "touched" / "unchanged" / "removed"
+        """
+        if folder is None or classify_file(path) is None or not os.path.isfile(path):
+            if entry is not None:
+                self.index.remove_file(path)
+                return "removed"
+            return "unchanged"
+
+        stat = os.stat(path)
+        if entry is not None and entry["folder"] == folder \
+                and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            return "unchanged"
+
+        digest = file_digest(path)
+        if entry is not None and entry["folder"] == folder and entry["sha256"] == digest:
+            self.index.touch_file(path, stat.st_mtime, stat.st_size, digest)
+            return "touched"
+
+        self.index.index_file(path, folder, digest)
+        return "indexed"
+
+    def update_paths(self, paths: list, folders: list) -> dict:
+        """
+        处理文件监听事件中变化的路径（新增、修改、删除、重命名都适用）
+
+        :param paths: 变化的文件或目录路径
+        :param folders: folder_structure.json 中的 folders 列表
+        :return: 各类处理结果的数量
+        """
+        counts = {"indexed": 0, "touched": 0, "unchanged": 0, "removed": 0}
+        with self._lock:
+            manifest = self.index.manifest()
+            targets = set()
+            for path in paths:
+                path = normalize_path(path)
+                if os.path.isdir(path):
+                    targets.update(SearchIndex.iter_folder_files(path))
+                else:
+                    targets.add(path)
+                # 目录被删除或重命名时，清单中该目录下的文件也需要检查
+                prefix = path + os.sep
+                targets.update(p for p in manifest if p.startswith(prefix))
+
+            for path in sorted(targets):
+                try:
+                    status = self._update_file(path, self._folder_for(path, folders), manifest.get(path))
+                    counts[status] += 1
+                except Exception as e:
+                    print(f"⚠️ 增量索引失败 {path}: {e}")
+        if counts["indexed"] or counts["removed"]:
+            print(f"🔄 增量索引：更新 {counts['indexed']} 个，删除 {counts['removed']} 个文件")
+        return counts
+
+    def sync(self, folders: list) -> dict:
+        """
+        扫描所有知识库文件夹，与清单比对后只处理变化的文件（监听遗漏事件或程序未运行期间的修改）
+
+        :param folders: folder_structure.json 中的 folders 列表
+        :return: 各类处理结果的数量
+        """
+        counts = {"indexed": 0, "touched": 0, "unchanged": 0, "removed": 0}
+        with self._lock:
+            manifest = self.index.manifest()
+            seen = set()
+            for folder in folders:
+                if not os.path.isdir(folder["path"]):
+                    continue
+                for path in SearchIndex.iter_folder_files(folder["path"]):
+                    if path in seen:
+                        continue
+                    seen.add(path)
+                    try:
+                        status = self._update_file(path, self._folder_for(path, folders), manifest.get(path))
+                        counts[status] += 1
+                    except Exception as e:
+                        print(f"⚠️ 增量索引失败 {path}: {e}")
+
+            for path in manifest.keys() - seen:
+                self.index.remove_file(path)
+                counts["removed"] += 1
+        print(f"✅ 增量扫描完成：更新 {counts['indexed']} 个，未变化 {counts['unchanged'] + counts['touched']} 个，"
+              f"删除 {counts['removed']} 个文件")
+        return counts
+
+
+# ================= 测试入口 =================
+
+if __name__ == "__main__":
+    import time
+
+    from folder_registry import get_folder_registry
+
+    folders = get_folder_registry().list()
+    start = time.time()
+    IncrementalIndexer().sync(folders)
+    print(f"耗时 {time.time() - start:.2f}s")
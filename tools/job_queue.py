@@ -0,0 +1,360 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from ask_ai import get_app_dir
+
+
+# ================= 默认配置 =================
+
+DEFAULT_MAX_ATTEMPTS = 3  # 任务失败后的最大尝试次数（含第一次）
+RETRY_BACKOFF_BASE = 5.0  # 重试等待时间基数（秒），按 5s、10s、20s... 递增
+RETRY_BACKOFF_MAX = 300.0
+FINISHED_JOB_TTL = 7 * 24 * 3600  # 已结束的任务保留 7 天
+PROGRESS_WRITE_INTERVAL = 0.5  # 进度写入数据库的最小间隔（秒），通知不受限制
+
+ACTIVE_STATUSES = ("queued", "running")
+FINISHED_STATUSES = ("done", "failed", "cancelled")
+
+
+class JobCancelled(Exception):
+    """任务被取消（由 JobContext.check_cancelled 抛出）"""
+
+
+# ================= 任务上下文 =================
+
+class JobContext:
+    """传给任务函数的上下文：汇报进度、检查是否被取消"""
+
+    def __init__(self, queue: "JobQueue", job_id: int):
+        self._queue = queue
+        self.job_id = job_id
+        self._last_write = 0.0
+
+    @property
+    def cancelled(self) -> bool:
+        return self._queue.is_cancel_requested(self.job_id)
+
+    def check_cancelled(self):
+        """任务被取消时抛出 JobCancelled，任务函数应在每个处理步骤之间调用"""
+        if self.cancelled:
+            raise JobCancelled()
+
+    def progress(self, fraction: float = None, message: str = None, data: dict = None):
+        """
+        汇报进度
+
+        :param fraction: 完成比例 0~1
+        :param message: 进度说明
+        :param data: 附带的增量数据（只随通知发送，不写入数据库）
+        """
+        now = time.time()
+        persist = now - self._last_write >= PROGRESS_WRITE_INTERVAL or (fraction is not None and fraction >= 1)
+        if persist:
+            self._last_write = now
+        self._queue._update_progress(self.job_id, fraction, message, data, persist)
+
+
+# ================= 任务队列 =================
+
+class JobQueue:
+    """
+    基于 SQLite 的持久化后台任务队列
+    - 任务状态：queued → running → done / failed / cancelled
+    - 每种任务有独立的并发上限，整体共用一个线程池
+    - 失败后按指数退避自动重试
+    - 程序重启后，上次未完成（queued / running）的任务会重新排队执行；执行中被中断且已无重试次数的任务标记为失败
+    """
+
+    def __init__(self, path: str = None, max_workers: int = 4,
+                 on_event: Optional[Callable[[dict], None]] = None):
+        """
+        :param path: 数据库文件路径，默认为 exe/脚本 同目录下的 jobs.sqlite3
+        :param max_workers: 同时执行的任务总数上限
+        :param on_event: 任务状态或进度变化时的回调，参数为任务字典（可额外包含 data 字段）
+        """
+        if path is None:
+            path = os.path.join(get_app_dir(), "jobs.sqlite3")
+        self.path = path
+        self.max_workers = max_workers
+        self.on_event = on_event
+
+        self._handlers = {}  # kind -> (func, concurrency)
+        self._running = {}  # kind -> 正在执行的数量
+        self._cancel_requested = set()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._conn = None
+        self._executor = None
+        self._thread = None
+        self._stopped = False
+
+    # ---------- 数据库 ----------
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    progress REAL NOT NULL DEFAULT 0,
+                    message TEXT,
+                    result TEXT,
+                    error TEXT,
+                    run_after REAL NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, run_after);
+            """)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _execute(self, sql: str, args: tuple = ()) -> sqlite3.Cursor:
+        with self._db_lock:
+            conn = self._connect()
+            cursor = conn.execute(sql, args)
+            conn.commit()
+            return cursor
+
+    def _query(self, sql: str, args: tuple = ()) -> list:
+        with self._db_lock:
+            return self._connect().execute(sql, args).fetchall()
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> dict:
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def _emit(self, job: dict, data: dict = None):
+        if self.on_event is None or job is None:
+            return
+        try:
+            self.on_event(dict(job, data=data) if data else job)
+        except Exception:
+            traceback.print_exc()
+
+    # ---------- 注册与提交 ----------
+
+    def register(self, kind: str, func: Callable[[dict, JobContext], dict], concurrency: int = 1,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        """
+        注册任务类型
+
+        :param kind: 任务类型名称
+        :param func: 任务函数 func(params, ctx) -> 结果字典（需可 JSON 序列化）
+        :param concurrency: 该类型同时执行的任务数上限
+        :param max_attempts: 该类型默认的最大尝试次数（重复执行有副作用的任务应设为 1）
+        """
+        with self._lock:
+            self._handlers[kind] = (func, concurrency, max_attempts)
+            self._running.setdefault(kind, 0)
+            self._wakeup.notify_all()
+
+    def submit(self, kind: str, params: dict = None, max_attempts: int = None) -> dict:
+        """
+        提交任务
+
+        :param max_attempts: 最大尝试次数，None 表示使用注册时的默认值
+        :return: 任务字典（包含 id）
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"未知任务类型: {kind}")
+        if max_attempts is None:
+            max_attempts = self._handlers[kind][2]
+        now = time.time()
+        cursor = self._execute(
+            "INSERT INTO jobs (kind, params, status, max_attempts, created_at, updated_at) "
+            "VALUES (?, ?, 'queued', ?, ?, ?)",
+            (kind, json.dumps(params or {}, ensure_ascii=False), max_attempts, now, now)
+        )
+        job = self.get(cursor.lastrowid)
+        self._emit(job)
+        with self._lock:
+            self._wakeup.notify_all()
+        return job
+
+    def get(self, job_id: int) -> Optional[dict]:
+        rows = self._query("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return self._row_to_job(rows[0]) if rows else None
+
+    def list_jobs(self, status: str = None, limit: int = 50) -> list:
+        """按创建时间倒序列出任务（不包含结果内容）"""
+        sql = ("SELECT id, kind, params, status, attempts, max_attempts, progress, message, NULL AS result, "
+               "error, run_after, created_at, updated_at FROM jobs")
+        args = ()
+        if status:
+            sql += " WHERE status = ?"
+            args = (status,)
+        rows = self._query(sql + " ORDER BY id DESC LIMIT ?", args + (limit,))
+        return [self._row_to_job(row) for row in rows]
+
+    def cancel(self, job_id: int) -> bool:
+        """
+        取消任务：排队中的任务直接取消；执行中的任务在下一次 check_cancelled 时停止
+
+        :return: 任务是否还未结束（取消请求是否有效）
+        """
+        job = self.get(job_id)
+        if job is None or job["status"] in FINISHED_STATUSES:
+            return False
+        with self._lock:
+            self._cancel_requested.add(job_id)
+        cursor = self._execute(
+            "UPDATE jobs SET status = 'cancelled', updated_at = ? WHERE id = ? AND status = 'queued'",
+            (time.time(), job_id)
+        )
+        if cursor.rowcount:
+            with self._lock:
+                self._cancel_requested.discard(job_id)
+            self._emit(self.get(job_id))
+        return True
+
+    def is_cancel_requested(self, job_id: int) -> bool:
+        with self._lock:
+            return job_id in self._cancel_requested
+
+    def _update_progress(self, job_id: int, fraction: Optional[float], message: Optional[str],
+                         data: Optional[dict], persist: bool):
+        if persist:
+            self._execute(
+                "UPDATE jobs SET progress = COALESCE(?, progress), message = COALESCE(?, message), "
+                "updated_at = ? WHERE id = ?",
+                (fraction, message, time.time(), job_id)
+            )
+        self._emit({"id": job_id, "status": "running", "progress": fraction, "message": message}, data)
+
+    # ---------- 调度 ----------
+
+    def start(self):
+        """启动调度线程；上次异常退出时仍在执行的任务还有重试次数的重新排队，否则标记为失败"""
+        if self._thread is not None:
+            return
+        now = time.time()
+        # 已用完尝试次数的任务（包括 max_attempts = 1、重复执行有副作用的任务）不再自动执行，标记为失败
+        interrupted = self._execute(
+            "UPDATE jobs SET status = 'failed', error = 'interrupted', updated_at = ? "
+            "WHERE status = 'running' AND attempts >= max_attempts",
+            (now,)
+        ).rowcount
+        if interrupted:
+            print(f"⚠️ {interrupted} 个后台任务在执行中被中断且已无重试次数，标记为失败")
+        self._execute("UPDATE jobs SET status = 'queued', run_after = 0, updated_at = ? WHERE status = 'running'",
+                      (now,))
+        self._execute("DELETE FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND updated_at < ?",
+                      (now - FINISHED_JOB_TTL,))
+        resumed = self._query("SELECT COUNT(*) FROM jobs WHERE status = 'queued'")[0][0]
+        if resumed:
+            print(f"🔁 恢复 {resumed} 个未完成的后台任务")
+
+        self._stopped = False
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+        self._thread = threading.Thread(target=self._loop, name="job-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self._stopped = True
+            self._wakeup.notify_all()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def _next_runnable(self) -> tuple:
+        """
+        取出下一个可以执行的任务（调用时持有 self._lock）
+
+        :return: (任务字典或 None, 距离最早的延迟任务可执行还需等待的秒数)
+        """
+        now = time.time()
+        free_kinds = [k for k, (_, limit, _) in self._handlers.items() if self._running.get(k, 0) < limit]
+        if not free_kinds or sum(self._running.values()) >= self.max_workers:
+            return None, None
+
+        placeholders = ",".join("?" * len(free_kinds))
+        rows = self._query(
+            f"SELECT * FROM jobs WHERE status = 'queued' AND kind IN ({placeholders}) "
+            f"ORDER BY run_after > ?, run_after, id LIMIT 1",
+            tuple(free_kinds) + (now,)
+        )
+        if not rows:
+            return None, None
+        job = self._row_to_job(rows[0])
+        if job["run_after"] > now:
+            return None, job["run_after"] - now
+        return job, None
+
+    def _loop(self):
+        while True:
+            with self._lock:
+                if self._stopped:
+                    return
+                job, wait = self._next_runnable()
+                if job is None:
+                    self._wakeup.wait(timeout=min(wait, 5.0) if wait else 5.0)
+                    continue
+                self._running[job["kind"]] += 1
+
+            cursor = self._execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? "
+                "WHERE id = ? AND status = 'queued'",
+                (time.time(), job["id"])
+            )
+            if not cursor.rowcount:
+                # 在取出和开始之间被取消
+                self._release(job["kind"])
+                continue
+            self._emit(self.get(job["id"]))
+            self._executor.submit(self._run, job)
+
+    def _release(self, kind: str):
+        with self._lock:
+            self._running[kind] -= 1
+            self._wakeup.notify_all()
+
+    def _run(self, job: dict):
+        func = self._handlers[job["kind"]][0]
+        job_id = job["id"]
+        attempts = job["attempts"] + 1
+        try:
+            result = func(job["params"], JobContext(self, job_id))
+            self._execute(
+                "UPDATE jobs SET status = 'done', progress = 1, result = ?, error = NULL, updated_at = ? WHERE id = ?",
+                (json.dumps(result, ensure_ascii=False), time.time(), job_id)
+            )
+        except JobCancelled:
+            self._execute("UPDATE jobs SET status = 'cancelled', updated_at = ? WHERE id = ?",
+                          (time.time(), job_id))
+        except Exception as e:
+            traceback.print_exc()
+            if attempts < job["max_attempts"] and not self.is_cancel_requested(job_id):
+                delay = min(RETRY_BACKOFF_BASE * (2 ** (attempts - 1)), RETRY_BACKOFF_MAX)
+                print(f"⏳ 任务 {job_id} ({job['kind']}) 失败，{delay:.0f}s 后重试: {e}")
+                self._execute(
+                    "UPDATE jobs SET status = 'queued', error = ?, run_after = ?, updated_at = ? WHERE id = ?",
+                    (str(e), time.time() + delay, time.time(), job_id)
+                )
+            else:
+                self._execute("UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                              (str(e), time.time(), job_id))
+        finally:
+            with self._lock:
+                self._cancel_requested.discard(job_id)
+            self._release(job["kind"])
+            self._emit(self.get(job_id))
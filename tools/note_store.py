@@ -0,0 +1,431 @@
+import os
+import re
+import json
+import time
+import struct
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+from tracing import current_span, traced
+
+
+# ================= 默认配置 =================
+
+JOURNAL_DIR = ".notes"  # 笔记文件夹下保存日志和索引的隐藏目录
+JOURNAL_FILE = "journal.jsonl"  # 条目日志：每行一个 JSON 条目，只追加
+INDEX_FILE = "journal.idx"  # 定长偏移索引：第 i 条记录对应 id = i + 1
+MATERIALIZED_FILE = "materialized"  # 已写入 markdown 分段的最大条目 id
+LOCK_FILE = "journal.lock"  # 跨进程写锁（单独的文件：Windows 的字节锁是强制锁，锁住日志或索引本身会挡住写入）
+SEGMENT_FORMAT = "%Y-%m"  # markdown 按月分段
+LEGACY_SUFFIX = ".legacy.md"  # 旧版单文件笔记导入日志后改成的后缀（搜索索引不再收录）
+ENTRY_SEPARATOR = re.compile(r"\n-{3,}\n")  # markdown 中条目之间的分隔线
+RECENT_DEFAULT = 20
+
+# 索引记录：日志偏移（uint64）、长度（uint32）、时间戳（double），共 20 字节
+INDEX_RECORD = struct.Struct("<QId")
+
+
+def segment_of(timestamp: float) -> str:
+    """条目时间所在的分段名，例如 2024-05"""
+    return time.strftime(SEGMENT_FORMAT, time.localtime(timestamp))
+
+
+def _fsync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+
+@contextmanager
+def _process_lock(path: str):
+    """跨进程互斥锁：Windows 用 msvcrt.locking，其他系统用 fcntl.flock，进程退出时系统自动释放"""
+    with open(path, 'a+b') as f:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue  # LK_LOCK 重试约 10 秒仍拿不到锁时抛出，继续等待
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+# ================= 笔记存储 =================
+
+class NoteStore:
+    """
+    单个知识库文件夹的笔记存储（取代不断增长的单个 md 文件）
+    - 条目先追加写入日志并 fsync，再写入定长偏移索引，按 id 读取一条或读取最近 N 条时
+      只需要定位索引、读取对应的几行日志，不读取整个文件
+    - 并发保存时合并提交：同一时刻等待的多批条目由一个线程一次写入、一次 fsync
+    - markdown 按月分段生成（{文件夹名}_笔记_2024-05.md），查看和索引时只需要加载当月分段；
+      分段由日志派生，崩溃后按日志补齐
+    - 多个进程（worker、keyboard_manager）可以同时写入同一文件夹：提交和恢复持有 journal.lock 上的
+      跨进程锁，下一个 id 和日志偏移都在锁内重新读取
+    - 分段是用户会打开编辑的文件，恢复时只追加缺少的条目，不整体重写
+    - 首次打开时导入旧版的单个笔记文件（笔记/{文件夹名}_笔记.md、文件夹根目录的 {文件夹名}.md）
+    """
+
+    def __init__(self, notes_dir: str, title: str):
+        """
+        :param notes_dir: 笔记文件夹路径（知识库文件夹下的 笔记/）
+        :param title: 文件夹名称，用于 markdown 文件名和标题
+        """
+        self.notes_dir = notes_dir
+        self.title = title
+        self.journal_dir = os.path.join(notes_dir, JOURNAL_DIR)
+        self.journal_path = os.path.join(self.journal_dir, JOURNAL_FILE)
+        self.index_path = os.path.join(self.journal_dir, INDEX_FILE)
+        self.materialized_path = os.path.join(self.journal_dir, MATERIALIZED_FILE)
+        self.lock_path = os.path.join(self.journal_dir, LOCK_FILE)
+
+        self._lock = threading.Lock()  # 本进程内的写入（提交、恢复）串行，跨进程由 _process_lock 保证
+        self._queue_lock = threading.Lock()
+        self._queue = []  # 等待提交的批次
+
+        os.makedirs(self.journal_dir, exist_ok=True)
+        with self._lock, _process_lock(self.lock_path):
+            self._recover()
+            self._migrate_legacy()
+
+    # ---------- 路径 ----------
+
+    def segment_path(self, segment: str) -> str:
+        return os.path.join(self.notes_dir, f"{self.title}_笔记_{segment}.md")
+
+    def current_segment_path(self) -> str:
+        """当前时间的条目会写入的 markdown 分段"""
+        return self.segment_path(segment_of(time.time()))
+
+    def segments(self) -> list:
+        """已有的 markdown 分段名，按时间升序"""
+        prefix, suffix = f"{self.title}_笔记_", ".md"
+        return sorted(name[len(prefix):-len(suffix)] for name in os.listdir(self.notes_dir)
+                      if name.startswith(prefix) and name.endswith(suffix))
+
+    # ---------- 索引 ----------
+
+    def count(self) -> int:
+        """条目总数（即最新条目的 id）"""
+        try:
+            return os.path.getsize(self.index_path) // INDEX_RECORD.size
+        except OSError:
+            return 0
+
+    def _read_index(self, first_id: int, last_id: int) -> list:
+        """读取 id 在 [first_id, last_id] 内的索引记录 [(offset, length, timestamp)]"""
+        if last_id < first_id:
+            return []
+        with open(self.index_path, 'rb') as f:
+            f.seek((first_id - 1) * INDEX_RECORD.size)
+            data = f.read((last_id - first_id + 1) * INDEX_RECORD.size)
+        return [INDEX_RECORD.unpack_from(data, i) for i in range(0, len(data) - INDEX_RECORD.size + 1,
+                                                                   INDEX_RECORD.size)]
+
+    def _read_entries(self, first_id: int, records: list) -> list:
+        if not records:
+            return []
+        entries = []
+        with open(self.journal_path, 'rb') as f:
+            for i, (offset, length, _) in enumerate(records):
+                f.seek(offset)
+                entry = json.loads(f.read(length))
+                entry["id"] = first_id + i
+                entries.append(entry)
+        return entries
+
+    # ---------- 读取 ----------
+
+    def get(self, entry_id: int) -> Optional[dict]:
+        """按 id 读取一条（{"id", "ts", "kind", "text"}），不存在时返回 None"""
+        if not 1 <= entry_id <= self.count():
+            return None
+        return self._read_entries(entry_id, self._read_index(entry_id, entry_id))[0]
+
+    def recent(self, limit: int = RECENT_DEFAULT, before: int = None) -> list:
+        """
+        最近的条目，新的在前
+
+        :param before: 只返回 id 小于该值的条目（用于向前翻页）
+        """
+        last_id = self.count() if before is None else min(before - 1, self.count())
+        first_id = max(1, last_id - limit + 1)
+        entries = self._read_entries(first_id, self._read_index(first_id, last_id))
+        entries.reverse()
+        return entries
+
+    # ---------- 写入 ----------
+
+    def append(self, text: str, kind: str = "text") -> dict:
+        """追加一条，返回 {"id", "ts", "segment", "path"}"""
+        return self.append_many([{"text": text, "kind": kind}])[0]
+
+    @traced("write.note")
+    def append_many(self, entries: list) -> list:
+        """
+        追加多条（一次写入、一次 fsync）
+
+        :param entries: [{"text": markdown 内容（不含分隔线）, "kind": "text" / "image"}]
+        :return: 与输入顺序一致的 [{"id", "ts", "segment", "path"}]
+        """
+        batch = {"entries": entries, "result": None, "error": None}
+        current_span().set(entries=len(entries), bytes=sum(len(entry["text"].encode("utf-8")) for entry in entries))
+        with self._queue_lock:
+            self._queue.append(batch)
+        with self._lock:
+            # 之前的提交可能已经顺带写入了本批次
+            if batch["result"] is None and batch["error"] is None:
+                with self._queue_lock:
+                    batches, self._queue = self._queue, []
+                current_span().set(grouped=len(batches))
+                try:
+                    with _process_lock(self.lock_path):
+                        # 其他进程可能在上次提交后写入过（或写到一半时崩溃），先补齐再取下一个 id
+                        self._recover()
+                        self._commit(batches)
+                except Exception as e:
+                    for b in batches:
+                        b["error"] = e
+        if batch["error"] is not None:
+            raise batch["error"]
+        return batch["result"]
+
+    def _commit(self, batches: list):
+        """把多个批次写入日志和索引，再追加到 markdown 分段（调用时持有跨进程锁）"""
+        now = time.time()
+        next_id = self.count() + 1
+        lines, records, results = [], [], []
+        with open(self.journal_path, 'ab') as journal:
+            offset = journal.tell()
+            for batch in batches:
+                batch_result = []
+                for entry in batch["entries"]:
+                    ts = entry.get("ts", now)  # 导入旧笔记时沿用原来的时间
+                    record = {"ts": ts, "kind": entry.get("kind", "text"), "text": entry["text"].strip()}
+                    line = json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+                    lines.append(line)
+                    records.append((next_id, record))
+                    segment = segment_of(ts)
+                    batch_result.append({"id": next_id, "ts": ts, "segment": segment,
+                                         "path": self.segment_path(segment)})
+                    next_id += 1
+                results.append(batch_result)
+            journal.write(b"".join(lines))
+            _fsync(journal)
+
+        with open(self.index_path, 'ab') as index:
+            for line, (_, record) in zip(lines, records):
+                index.write(INDEX_RECORD.pack(offset, len(line), record["ts"]))
+                offset += len(line)
+            _fsync(index)
+
+        for batch, batch_result in zip(batches, results):
+            batch["result"] = batch_result
+        try:
+            self._materialize(records)
+        except OSError as e:
+            # 条目已经安全写入日志，分段在下次打开时按日志补齐
+            print(f"⚠️ 写入 markdown 分段失败: {e}")
+
+    # ---------- markdown 分段 ----------
+
+    def _entry_markdown(self, record: dict) -> str:
+        return f"\n---\n{record['text']}\n"
+
+    def _segment_header(self, segment: str) -> str:
+        return f"# {self.title} 笔记（{segment}）\n"
+
+    @staticmethod
+    def _ends_with(path: str, text: str) -> bool:
+        data = text.encode("utf-8")
+        try:
+            with open(path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() < len(data):
+                    return False
+                f.seek(-len(data), os.SEEK_END)
+                return f.read() == data
+        except OSError:
+            return False
+
+    def _materialize(self, records: list, resume: bool = False):
+        """
+        把已提交的条目追加到对应的 markdown 分段（分段只是派生数据，不 fsync）
+
+        :param resume: 恢复时使用：上次崩溃可能发生在写完分段、更新标记之前，分段末尾已经是这些条目时跳过
+        """
+        by_segment = {}
+        for _, record in records:
+            by_segment.setdefault(segment_of(record["ts"]), []).append(self._entry_markdown(record))
+        for segment, parts in by_segment.items():
+            path = self.segment_path(segment)
+            text = "".join(parts)
+            if resume and self._ends_with(path, text):
+                continue
+            header = "" if os.path.exists(path) else self._segment_header(segment)
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(header + text)
+        if records:
+            self._write_materialized(records[-1][0])
+
+    def _read_materialized(self) -> int:
+        try:
+            with open(self.materialized_path, 'r', encoding='utf-8') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _write_materialized(self, entry_id: int):
+        tmp_path = f"{self.materialized_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(str(entry_id))
+        os.replace(tmp_path, self.materialized_path)
+
+    def rebuild_segment(self, segment: str) -> Optional[str]:
+        """
+        按日志重新生成一个月的 markdown 分段（按索引中的时间戳筛选，只读取该月的条目）
+        只用于手动修复：分段中手动编辑过的内容会丢失，因此原文件先改名备份（不覆盖已有备份）
+
+        :return: 备份文件路径，原来没有该分段时为 None
+        """
+        total = self.count()
+        records = self._read_index(1, total)
+        ids = [i + 1 for i, (_, _, ts) in enumerate(records) if segment_of(ts) == segment]
+        parts = [self._segment_header(segment)]
+        with open(self.journal_path, 'rb') as f:
+            for entry_id in ids:
+                offset, length, _ = records[entry_id - 1]
+                f.seek(offset)
+                parts.append(self._entry_markdown(json.loads(f.read(length))))
+
+        path = self.segment_path(segment)
+        backup_path = None
+        if os.path.exists(path):
+            stamp = time.strftime("%Y%m%d%H%M%S")
+            backup_path, n = f"{path}.{stamp}.bak", 1
+            while os.path.exists(backup_path):
+                backup_path, n = f"{path}.{stamp}-{n}.bak", n + 1
+            os.rename(path, backup_path)
+            print(f"📦 已备份原分段: {backup_path}")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write("".join(parts))
+        os.replace(tmp_path, path)
+        return backup_path
+
+    # ---------- 旧版笔记迁移 ----------
+
+    def legacy_paths(self) -> list:
+        """旧版本追加笔记的单个 markdown 文件"""
+        return [os.path.join(self.notes_dir, f"{self.title}_笔记.md"),
+                os.path.join(os.path.dirname(self.notes_dir), f"{self.title}.md")]
+
+    def _migrate_legacy(self):
+        """
+        把旧版单文件笔记按 --- 分隔线拆成条目导入日志（时间取文件的修改时间），
+        然后改名为 *.legacy.md，recent() / get() 和按月分段都能看到升级前的笔记（调用时持有跨进程锁）
+        """
+        for path in self.legacy_paths():
+            if not os.path.isfile(path):
+                continue
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                text = f.read()
+            ts = os.path.getmtime(path)
+            entries = []
+            for i, part in enumerate(ENTRY_SEPARATOR.split("\n" + text)):
+                part = part.strip()
+                if not part or (i == 0 and re.fullmatch(r"#[^\n]*", part)):
+                    continue  # 文件开头只有标题行
+                entries.append({"text": part, "kind": "image" if part.startswith("### 🖼️") else "text", "ts": ts})
+            if entries:
+                self._commit([{"entries": entries, "result": None, "error": None}])
+            legacy_path = path[:-len(".md")] + LEGACY_SUFFIX
+            os.replace(path, legacy_path)
+            print(f"📥 已导入 {len(entries)} 条旧笔记，原文件改名为: {legacy_path}")
+
+    # ---------- 崩溃恢复 ----------
+
+    def _recover(self):
+        """
+        打开时校验日志和索引：
+        - 截掉索引末尾不完整或指向日志之外的记录
+        - 日志中已写入但未进索引的完整行补进索引，不完整的末尾行截掉
+        - markdown 分段落后于日志时，把缺少的条目追加到对应分段（不重写分段，保留用户的手动编辑）
+        每次提交前都会调用（调用时持有跨进程锁），日志和索引一致时只读取最后一条索引记录
+        """
+        journal_size = os.path.getsize(self.journal_path) if os.path.exists(self.journal_path) else 0
+        index_size = os.path.getsize(self.index_path) if os.path.exists(self.index_path) else 0
+        count = self.count()
+        if index_size % INDEX_RECORD.size == 0 and self._read_materialized() >= count:
+            last = self._read_index(count, count) if count else []
+            if (last[0][0] + last[0][1] if last else 0) == journal_size:
+                return
+
+        records = self._read_index(1, count) if count else []
+        while records and records[-1][0] + records[-1][1] > journal_size:
+            records.pop()
+        if len(records) != count:
+            with open(self.index_path, 'r+b') as f:
+                f.truncate(len(records) * INDEX_RECORD.size)
+            print(f"⚠️ 笔记索引末尾不完整，已截断: {self.index_path}")
+
+        indexed_end = records[-1][0] + records[-1][1] if records else 0
+        if journal_size > indexed_end:
+            recovered = []
+            with open(self.journal_path, 'rb') as f:
+                f.seek(indexed_end)
+                offset = indexed_end
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        ts = json.loads(line)["ts"]
+                    except (ValueError, KeyError):
+                        break
+                    recovered.append((offset, len(line), ts))
+                    offset += len(line)
+            with open(self.journal_path, 'r+b') as f:
+                f.truncate(offset)
+            with open(self.index_path, 'ab') as f:
+                for record in recovered:
+                    f.write(INDEX_RECORD.pack(*record))
+                _fsync(f)
+            records.extend(recovered)
+            if recovered:
+                print(f"🔧 从日志恢复 {len(recovered)} 条笔记索引: {self.journal_path}")
+
+        materialized = self._read_materialized()
+        if materialized < len(records):
+            lagging = self._read_entries(materialized + 1, records[materialized:])
+            self._materialize([(entry["id"], entry) for entry in lagging], resume=True)
+            print(f"🔧 补写 {len(lagging)} 条笔记到 markdown 分段")
+
+
+# ================= 测试入口 =================
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("用法: python note_store.py <知识库文件夹路径> [条数]")
+        sys.exit(1)
+
+    folder = sys.argv[1].rstrip("/\\")
+    store = NoteStore(os.path.join(folder, "笔记"), os.path.basename(folder))
+    print(f"共 {store.count()} 条笔记，分段: {', '.join(store.segments()) or '无'}")
+    for entry in store.recent(int(sys.argv[2]) if len(sys.argv) > 2 else 5):
+        print(f"\n[{entry['id']}] {time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['ts']))}")
+        print(entry["text"][:200])
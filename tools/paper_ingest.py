@@ -0,0 +1,228 @@
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+import httpx
+
+from ask_ai import get_app_dir
+from paper_store import PaperStore
+from search_index import file_digest
+
+
+# ================= 默认配置 =================
+
+DOWNLOAD_WORKERS = 4  # 并发下载数（arXiv 对 PDF 下载的限制比 API 宽松）
+DOWNLOAD_RETRIES = 3  # 下载中断后的重试次数，每次从已下载的位置续传
+DOWNLOAD_TIMEOUT = 60.0
+DOWNLOAD_CHUNK = 64 * 1024
+
+
+def safe_filename(name: str, limit: int = 100) -> str:
+    """清理文件名中的非法字符（与 index.js 中 arxiv:download 的规则一致）"""
+    return re.sub(r'[<>:"/\\|?*]', '_', name)[:limit]
+
+
+def paper_description(paper: dict) -> str:
+    """用于分类的论文描述（与推荐页单篇保存时的格式一致）"""
+    return f"论文标题: {paper['title']}\n作者: {paper.get('authors', '')}\n摘要: {paper.get('summary', '')[:500]}"
+
+
+# ================= 批量入库 =================
+
+class PaperIngestor:
+    """
+    arXiv 论文批量下载入库
+    - 下载阶段：线程池并发下载，未完成的 .part 文件用 HTTP Range 续传
+    - 按 arXiv ID 和文件 sha256 跳过已经入库的论文
+    - 分类阶段：下载完成后整批交给 ContentManager.save_many，多篇论文合并为少量分类请求
+    """
+
+    def __init__(self, manager=None, store: PaperStore = None, download_dir: str = None,
+                 workers: int = DOWNLOAD_WORKERS, save_lock: threading.Lock = None):
+        """
+        :param manager: 用于分类保存的 ContentManager，默认在首次保存时创建
+        :param store: 记录下载状态的 PaperStore
+        :param download_dir: PDF 下载目录，默认为 exe/脚本 同目录下的 pdfs
+        :param workers: 并发下载数
+        :param save_lock: 保存时持有的锁（与其他使用同一个 ContentManager 的调用串行）
+        """
+        self._manager = manager
+        self.store = store or PaperStore()
+        self.download_dir = download_dir or os.path.join(get_app_dir(), "pdfs")
+        self.workers = workers
+        self.save_lock = save_lock or threading.Lock()
+        self._http = None
+        self._http_lock = threading.Lock()
+
+    @property
+    def manager(self):
+        if self._manager is None:
+            from choose_to_save import ContentManager
+            self._manager = ContentManager()
+        return self._manager
+
+    def _get_http(self) -> httpx.Client:
+        """所有下载共用一个连接池"""
+        with self._http_lock:
+            if self._http is None:
+                self._http = httpx.Client(
+                    follow_redirects=True,
+                    timeout=DOWNLOAD_TIMEOUT,
+                    limits=httpx.Limits(max_connections=self.workers, max_keepalive_connections=self.workers)
+                )
+            return self._http
+
+    def pdf_path(self, paper: dict) -> str:
+        """论文 PDF 的下载路径（文件名带 arXiv ID，避免同名论文互相覆盖）"""
+        name = f"{safe_filename(paper['title'])} [{safe_filename(paper['arxiv_id'])}].pdf"
+        return os.path.join(self.download_dir, name)
+
+    # ---------- 下载 ----------
+
+    def _download_once(self, url: str, part_path: str):
+        """下载到 .part 文件，已有部分内容时请求剩余字节"""
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+        with self._get_http().stream("GET", url, headers=headers) as response:
+            if response.status_code == 416:
+                return  # 已经完整下载
+            if response.status_code == 206:
+                mode = "ab"
+            elif response.status_code == 200:
+                mode = "wb"  # 服务端不支持续传，从头下载
+            else:
+                raise RuntimeError(f"下载失败: HTTP {response.status_code}")
+
+            with open(part_path, mode) as f:
+                for block in response.iter_bytes(DOWNLOAD_CHUNK):
+                    f.write(block)
+
+    def download(self, paper: dict) -> str:
+        """
+        下载单篇论文的 PDF（支持断点续传）
+
+        :return: 下载完成的文件路径
+        """
+        dest = self.pdf_path(paper)
+        if os.path.exists(dest):
+            return dest
+
+        os.makedirs(self.download_dir, exist_ok=True)
+        part_path = dest + ".part"
+        for attempt in range(DOWNLOAD_RETRIES + 1):
+            try:
+                self._download_once(paper["pdf_url"], part_path)
+                break
+            except (httpx.TransportError, httpx.TimeoutException) as e:
+                if attempt >= DOWNLOAD_RETRIES:
+                    raise RuntimeError(f"下载失败: {e}")
+                print(f"⏳ {paper['arxiv_id']} 下载中断，续传重试 ({attempt + 1}/{DOWNLOAD_RETRIES})")
+
+        with open(part_path, "rb") as f:
+            if f.read(5) != b"%PDF-":
+                os.remove(part_path)
+                raise RuntimeError("下载的文件不是 PDF")
+        os.replace(part_path, dest)
+        return dest
+
+    def _prepare(self, paper: dict) -> dict:
+        """下载阶段：返回 {"arxiv_id", "status", "path", ...}，status 为 downloaded / skipped / failed"""
+        arxiv_id = paper["arxiv_id"]
+        record = self.store.get_download(arxiv_id)
+        if record and record["saved_path"] and os.path.exists(record["saved_path"]):
+            return {"arxiv_id": arxiv_id, "status": "skipped", "path": record["saved_path"], "reason": "已入库"}
+
+        try:
+            pdf_path = self.download(paper)
+            digest = file_digest(pdf_path)
+        except Exception as e:
+            print(f"❌ {arxiv_id} 下载失败: {e}")
+            return {"arxiv_id": arxiv_id, "status": "failed", "error": str(e)}
+
+        duplicate = self.store.find_saved_by_digest(digest)
+        self.store.record_download(arxiv_id, sha256=digest, pdf_path=pdf_path, saved_path=duplicate)
+        if duplicate:
+            return {"arxiv_id": arxiv_id, "status": "skipped", "path": duplicate, "reason": "内容相同的文件已入库"}
+        return {"arxiv_id": arxiv_id, "status": "downloaded", "path": pdf_path, "sha256": digest}
+
+    # ---------- 入库 ----------
+
+    def _save(self, items: list, sub_folder: str) -> list:
+        """
+        分类阶段：用 ContentManager.save_many 一次性分类保存下载好的 PDF
+
+        :param items: [(论文, 下载路径)]
+        :return: 保存后的路径列表（失败为 None）
+        """
+        from choose_to_save import InputType
+
+        batch = [{"type": InputType.PDF, "content": pdf_path,
+                  "description": paper_description(paper), "sub_folder": sub_folder}
+                 for paper, pdf_path in items]
+        with self.save_lock:
+            try:
+                return self.manager.save_many(batch)
+            except Exception as e:
+                print(f"❌ 批量保存失败: {e}")
+                return [None] * len(items)
+
+    def ingest(self, papers: list, sub_folder: str = "文章",
+               on_progress: Optional[Callable[[dict], None]] = None) -> list:
+        """
+        批量下载并分类保存论文
+
+        :param papers: 论文字典列表（需要 arxiv_id、title、pdf_url，authors / summary 用于分类）
+        :param sub_folder: PDF 保存的子文件夹
+        :param on_progress: 每篇论文状态变化时的回调，参数为单篇结果字典
+        :return: 与输入顺序一致的结果列表，status 为 saved / skipped / failed
+        """
+        report = on_progress or (lambda item: None)
+
+        def prepare(paper):
+            result = self._prepare(paper)
+            report(result)
+            return result
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(prepare, papers))
+
+        # 同一批次中内容相同的 PDF 只保存第一份
+        pending, duplicates, first_by_digest = [], [], {}
+        for i, r in enumerate(results):
+            if r["status"] != "downloaded":
+                continue
+            if r["sha256"] in first_by_digest:
+                duplicates.append((i, first_by_digest[r["sha256"]]))
+            else:
+                first_by_digest[r["sha256"]] = i
+                pending.append((i, papers[i], r["path"]))
+
+        if pending:
+            print(f"🤖 正在分类保存 {len(pending)} 篇论文...")
+            saved_paths = self._save([(paper, path) for _, paper, path in pending], sub_folder)
+            for (i, paper, _), saved_path in zip(pending, saved_paths):
+                if saved_path:
+                    self.store.record_download(paper["arxiv_id"], saved_path=saved_path)
+                    results[i] = {"arxiv_id": paper["arxiv_id"], "status": "saved", "path": saved_path}
+                else:
+                    results[i] = {"arxiv_id": paper["arxiv_id"], "status": "failed", "error": "保存失败"}
+                report(results[i])
+
+        for i, first in duplicates:
+            arxiv_id = papers[i]["arxiv_id"]
+            if results[first]["status"] == "saved":
+                self.store.record_download(arxiv_id, saved_path=results[first]["path"])
+                results[i] = {"arxiv_id": arxiv_id, "status": "skipped", "path": results[first]["path"],
+                              "reason": "内容相同的文件已入库"}
+            else:
+                results[i] = dict(results[first], arxiv_id=arxiv_id)
+            report(results[i])
+
+        counts = {}
+        for r in results:
+            counts[r["status"]] = counts.get(r["status"], 0) + 1
+        print(f"✅ 批量入库完成: {counts}")
+        return results
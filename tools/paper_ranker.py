@@ -0,0 +1,108 @@
+import threading
+from typing import Callable
+
+import numpy as np
+
+from embedding_router import EmbeddingRouter
+from search_index import SearchIndex, VECTOR_DIM
+
+
+# ================= 默认配置 =================
+
+TOP_K = 3  # 候选论文取与知识库最相似的 K 个文件/文件夹的平均相似度作为得分
+
+
+# ================= 论文重排 =================
+
+class PaperRanker:
+    """
+    按与知识库的相关度给候选论文排序
+    - 知识库向量：已索引文件的平均片段向量 + 各文件夹描述的向量，以知识库片段计算 IDF 重新加权
+    - 知识库向量只在索引或文件夹配置变化后重算，每次打分只需一次矩阵乘法
+    """
+
+    def __init__(self, index: SearchIndex, get_folders: Callable[[], list], top_k: int = TOP_K):
+        """
+        :param index: 知识库搜索索引（提供已保存文件的向量）
+        :param get_folders: 返回 folder_structure.json 中 folders 列表的函数
+        :param top_k: 得分取前 K 个最相似条目的平均
+        """
+        self.index = index
+        self.get_folders = get_folders
+        self.top_k = top_k
+
+        self._lock = threading.Lock()
+        self._signature = None
+        self._idf = None
+        self._library = None  # (条目数, VECTOR_DIM)，已归一化
+        self._labels = None  # 每一行对应的文件夹名称
+
+    def _build(self, folders: list):
+        """重算知识库向量"""
+        _, file_folders, file_matrix = self.index.file_vectors()
+        folder_texts = [EmbeddingRouter.folder_text(f) for f in folders]
+        embedder = self.index.embedder
+        folder_matrix = (embedder.embed(folder_texts) if (embedder is not None and folder_texts)
+                         else np.zeros((0, VECTOR_DIM), np.float32))
+
+        # 片段向量是 log1p(tf) 归一化的结果，按维度乘以 IDF 后重新归一化，
+        # 等价于直接用 IDF 加权，从而压低 "the"、"model" 这类在所有论文中都出现的词
+        library = np.vstack([file_matrix, folder_matrix])
+        df = np.count_nonzero(library, axis=0).astype(np.float32)
+        self._idf = (np.log((1 + len(library)) / (1 + df)) + 1.0).astype(np.float32)
+        self._library = self._normalize(library * self._idf)
+
+        self._labels = file_folders + [f["name"] for f in folders]
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def _ensure_library(self):
+        folders = self.get_folders()
+        signature = (self.index.version(), EmbeddingRouter.signature(folders))
+        if signature != self._signature:
+            self._build(folders)
+            self._signature = signature
+
+    def score(self, papers: list) -> list:
+        """
+        计算每篇论文的相关度
+
+        :param papers: 论文字典列表（使用 title 和 summary）
+        :return: [(得分, 最相关的文件夹名称)]，与输入顺序一致
+        """
+        if not papers or self.index.embedder is None:
+            return [(0.0, "")] * len(papers)
+
+        with self._lock:
+            self._ensure_library()
+            library, labels, idf = self._library, self._labels, self._idf
+        if library.shape[0] == 0:
+            return [(0.0, "")] * len(papers)
+
+        texts = [f"{p['title']} {p['title']} {p.get('summary', '')}" for p in papers]
+        candidates = self._normalize(self.index.embedder.embed(texts) * idf)
+        similarity = candidates @ library.T
+
+        k = min(self.top_k, library.shape[0])
+        top = np.partition(similarity, similarity.shape[1] - k, axis=1)[:, -k:]
+        scores = top.mean(axis=1)
+        best = similarity.argmax(axis=1)
+        return [(float(s), labels[b]) for s, b in zip(scores, best)]
+
+    def rank(self, papers: list, limit: int = None) -> list:
+        """
+        按相关度从高到低排序，得分相同时保持原有顺序（即提交时间倒序）
+
+        :param papers: 候选论文
+        :param limit: 返回数量，None 表示全部
+        :return: 论文列表，每篇增加 relevance 和 matched_folder 字段
+        """
+        ranked = []
+        for paper, (score, folder) in zip(papers, self.score(papers)):
+            ranked.append(dict(paper, relevance=round(score, 4), matched_folder=folder))
+        ranked.sort(key=lambda p: -p["relevance"])
+        return ranked if limit is None else ranked[:limit]
@@ -0,0 +1,269 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+from typing import Optional
+
+from ask_ai import get_app_dir
+
+
+# ================= 默认配置 =================
+
+QUERY_FRESH_SECONDS = 3600  # 同一关键词在该时间内重复搜索直接读本地库，不访问 arXiv
+
+_VERSION_RE = re.compile(r"^(?P<id>.+?)v(?P<version>\d+)$")
+
+
+def split_arxiv_id(short_id: str) -> tuple:
+    """把 "2401.12345v2" 拆成 ("2401.12345", 2)，没有版本号时版本记为 1"""
+    match = _VERSION_RE.match(short_id)
+    if match:
+        return match.group("id"), int(match.group("version"))
+    return short_id, 1
+
+
+# ================= 论文库 =================
+
+class PaperStore:
+    """
+    本地 arXiv 论文元数据库
+    - papers：以 (arxiv_id, version) 为主键保存论文元数据
+    - queries：每个关键词最近一次抓取时间和已见到的最新提交时间，用于增量抓取
+    - query_papers：关键词与论文的对应关系，记录首次出现时间，区分“新论文”
+    - downloads：已下载 / 已入库的 PDF，批量保存时据此跳过重复论文
+    """
+
+    def __init__(self, path: str = None):
+        """
+        :param path: 数据库文件路径，默认为 exe/脚本 同目录下的 arxiv_papers.sqlite3
+        """
+        if path is None:
+            path = os.path.join(get_app_dir(), "arxiv_papers.sqlite3")
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS papers (
+                    arxiv_id TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    title TEXT NOT NULL,
+                    authors TEXT,
+                    published TEXT NOT NULL,
+                    summary TEXT,
+                    url TEXT,
+                    pdf_url TEXT,
+                    fetched_at REAL NOT NULL,
+                    notified INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (arxiv_id, version)
+                );
+                CREATE TABLE IF NOT EXISTS queries (
+                    query TEXT PRIMARY KEY,
+                    last_published TEXT,
+                    last_fetched REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS query_papers (
+                    query TEXT NOT NULL,
+                    arxiv_id TEXT NOT NULL,
+                    first_seen REAL NOT NULL,
+                    PRIMARY KEY (query, arxiv_id)
+                );
+                CREATE TABLE IF NOT EXISTS downloads (
+                    arxiv_id TEXT PRIMARY KEY,
+                    sha256 TEXT,
+                    pdf_path TEXT,
+                    saved_path TEXT,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_papers_published ON papers(published);
+                CREATE INDEX IF NOT EXISTS idx_downloads_sha256 ON downloads(sha256);
+            """)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """关键词规范化：大小写和多余空格不同的查询视为同一个"""
+        return " ".join(query.split()).lower()
+
+    # ---------- 抓取状态 ----------
+
+    def query_state(self, query: str) -> Optional[dict]:
+        """
+        关键词的抓取状态
+
+        :return: {"last_published": 已见到的最新提交时间, "last_fetched": 上次抓取时间戳}，从未抓取过返回 None
+        """
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT last_published, last_fetched FROM queries WHERE query = ?",
+                (self.normalize_query(query),)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"last_published": row[0], "last_fetched": row[1]}
+
+    def is_fresh(self, query: str, max_age: float = QUERY_FRESH_SECONDS) -> bool:
+        """关键词是否在 max_age 秒内抓取过"""
+        state = self.query_state(query)
+        return state is not None and time.time() - state["last_fetched"] < max_age
+
+    # ---------- 写入 ----------
+
+    def add_results(self, query: str, papers: list) -> list:
+        """
+        保存一次抓取的结果并更新关键词的抓取状态
+
+        :param query: 关键词
+        :param papers: 论文字典列表（需包含 arxiv_id、version、published 等字段）
+        :return: 该关键词下首次出现的 arxiv_id 列表
+        """
+        query = self.normalize_query(query)
+        now = time.time()
+        new_ids = []
+        with self._lock:
+            conn = self._connect()
+            for p in papers:
+                conn.execute(
+                    "INSERT OR REPLACE INTO papers "
+                    "(arxiv_id, version, title, authors, published, summary, url, pdf_url, fetched_at, notified) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, "
+                    "COALESCE((SELECT MAX(notified) FROM papers WHERE arxiv_id = ?), 0))",
+                    (p["arxiv_id"], p["version"], p["title"], p["authors"], p["published"],
+                     p["summary"], p["url"], p["pdf_url"], now, p["arxiv_id"])
+                )
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO query_papers (query, arxiv_id, first_seen) VALUES (?, ?, ?)",
+                    (query, p["arxiv_id"], now)
+                )
+                if cursor.rowcount:
+                    new_ids.append(p["arxiv_id"])
+
+            latest = max((p["published"] for p in papers), default=None)
+            conn.execute(
+                "INSERT INTO queries (query, last_published, last_fetched) VALUES (?, ?, ?) "
+                "ON CONFLICT(query) DO UPDATE SET last_fetched = excluded.last_fetched, "
+                "last_published = MAX(COALESCE(last_published, ''), COALESCE(excluded.last_published, ''))",
+                (query, latest, now)
+            )
+            conn.commit()
+        return new_ids
+
+    def take_unnotified(self, arxiv_ids: list) -> list:
+        """
+        从给定论文中挑出还没通知过的，并标记为已通知（多个关键词命中同一篇论文时只通知一次）
+
+        :return: 尚未通知过的 arxiv_id 列表（保持输入顺序）
+        """
+        result = []
+        with self._lock:
+            conn = self._connect()
+            for arxiv_id in arxiv_ids:
+                row = conn.execute("SELECT MAX(notified) FROM papers WHERE arxiv_id = ?", (arxiv_id,)).fetchone()
+                if row[0] == 0:
+                    result.append(arxiv_id)
+                    conn.execute("UPDATE papers SET notified = 1 WHERE arxiv_id = ?", (arxiv_id,))
+            conn.commit()
+        return result
+
+    # ---------- 下载记录 ----------
+
+    def get_download(self, arxiv_id: str) -> Optional[dict]:
+        """
+        论文的下载记录
+
+        :return: {"sha256", "pdf_path", "saved_path"}，没有记录返回 None
+        """
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT sha256, pdf_path, saved_path FROM downloads WHERE arxiv_id = ?", (arxiv_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"sha256": row[0], "pdf_path": row[1], "saved_path": row[2]}
+
+    def find_saved_by_digest(self, sha256: str) -> Optional[str]:
+        """查找内容相同且已经入库的 PDF 路径"""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT saved_path FROM downloads WHERE sha256 = ? AND saved_path IS NOT NULL", (sha256,)
+            ).fetchall()
+        for (saved_path,) in rows:
+            if os.path.exists(saved_path):
+                return saved_path
+        return None
+
+    def record_download(self, arxiv_id: str, sha256: str = None, pdf_path: str = None, saved_path: str = None):
+        """更新下载记录（为 None 的字段保持原值）"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT INTO downloads (arxiv_id, sha256, pdf_path, saved_path, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(arxiv_id) DO UPDATE SET "
+                "sha256 = COALESCE(excluded.sha256, sha256), pdf_path = COALESCE(excluded.pdf_path, pdf_path), "
+                "saved_path = COALESCE(excluded.saved_path, saved_path), updated_at = excluded.updated_at",
+                (arxiv_id, sha256, pdf_path, saved_path, time.time())
+            )
+            conn.commit()
+
+    # ---------- 查询 ----------
+
+    @staticmethod
+    def _row_to_paper(row) -> dict:
+        arxiv_id, version, title, authors, published, summary, url, pdf_url = row
+        return {
+            "arxiv_id": arxiv_id,
+            "version": version,
+            "title": title,
+            "authors": authors,
+            "published": published,
+            "published_date": published[:10],
+            "summary": summary,
+            "url": url,
+            "pdf_url": pdf_url,
+        }
+
+    def get_papers(self, arxiv_ids: list) -> list:
+        """按 arxiv_id 读取论文（每篇取最新版本），保持输入顺序"""
+        if not arxiv_ids:
+            return []
+        placeholders = ",".join("?" * len(arxiv_ids))
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT arxiv_id, MAX(version), title, authors, published, summary, url, pdf_url "
+                f"FROM papers WHERE arxiv_id IN ({placeholders}) GROUP BY arxiv_id",
+                list(arxiv_ids)
+            ).fetchall()
+        papers = {row[0]: self._row_to_paper(row) for row in rows}
+        return [papers[i] for i in arxiv_ids if i in papers]
+
+    def latest_for_query(self, query: str, limit: int = 5) -> list:
+        """某个关键词下按提交时间倒序的论文（每篇取最新版本）"""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT p.arxiv_id, MAX(p.version), p.title, p.authors, p.published, p.summary, p.url, p.pdf_url "
+                "FROM query_papers q JOIN papers p ON p.arxiv_id = q.arxiv_id "
+                "WHERE q.query = ? GROUP BY p.arxiv_id ORDER BY p.published DESC LIMIT ?",
+                (self.normalize_query(query), limit)
+            ).fetchall()
+        return [self._row_to_paper(row) for row in rows]
+
+    def stats(self) -> dict:
+        with self._lock:
+            conn = self._connect()
+            papers = conn.execute("SELECT COUNT(DISTINCT arxiv_id) FROM papers").fetchone()[0]
+            queries = conn.execute("SELECT COUNT(*) FROM queries").fetchone()[0]
+        return {"papers": papers, "queries": queries}
@@ -0,0 +1,268 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterator, Optional
+
+import fitz  # PyMuPDF
+
+from ask_ai import AIClient
+from image_prep import fit_scale, max_side_for
+
+
+# ================= 默认配置 =================
+
+# 每个 OCR 服务商允许的最大并发请求数（未列出的使用 DEFAULT_PROVIDER_CONCURRENCY）
+PROVIDER_CONCURRENCY = {
+    "https://api.siliconflow.cn/v1": 4,
+    "https://models.github.ai/inference": 2,
+}
+DEFAULT_PROVIDER_CONCURRENCY = 2
+
+OCR_ZOOM = 2.0  # 渲染缩放倍数，2x 以提高 OCR 精度
+TEXT_CHUNK_PAGES = 16  # 文本层提取时每个任务处理的页数
+PROCESS_POOL_MIN_PAGES = 64  # 页数达到该值才使用进程池提取文本层，小文档进程启动开销不划算
+
+OCR_SYSTEM_PROMPT = "你是一个 OCR 助手，请准确识别图片中的所有文字内容，保持原有格式。"
+
+
+# ================= 服务商并发限制 =================
+
+_provider_semaphores = {}
+_provider_lock = threading.Lock()
+
+
+def get_provider_semaphore(endpoint: str) -> threading.BoundedSemaphore:
+    """获取某个服务商共享的并发信号量（同一进程内所有 PdfReader 共用）"""
+    with _provider_lock:
+        semaphore = _provider_semaphores.get(endpoint)
+        if semaphore is None:
+            limit = PROVIDER_CONCURRENCY.get(endpoint, DEFAULT_PROVIDER_CONCURRENCY)
+            semaphore = threading.BoundedSemaphore(limit)
+            _provider_semaphores[endpoint] = semaphore
+        return semaphore
+
+
+# ================= 进程池任务 =================
+
+def extract_text_layers(pdf_path: str, page_numbers: list) -> dict:
+    """
+    提取指定页的文本层（可在子进程中执行）
+
+    :param pdf_path: PDF 文件路径
+    :param page_numbers: 页码列表（从 0 开始）
+    :return: {页码: 文本}
+    """
+    with fitz.open(pdf_path) as doc:
+        return {n: doc[n].get_text() for n in page_numbers}
+
+
+def render_page(pdf_path: str, page_num: int, zoom: float = OCR_ZOOM,
+                max_side: int = None, gray: bool = False) -> fitz.Pixmap:
+    """
+    将指定页渲染为 Pixmap（每次单独打开文档，可在多线程中安全调用）
+
+    :param zoom: 渲染缩放倍数上限
+    :param max_side: 按 image_prep 的规则限制渲染尺寸，直接渲染成上传尺寸，不再额外缩放
+    :param gray: 直接渲染为灰度（OCR 不需要颜色，像素内存只有 RGB 的 1/3）
+    :return: 不带透明通道的 Pixmap，可直接交给 AIClient（不经过 PNG 编解码）
+    """
+    with fitz.open(pdf_path) as doc:
+        page = doc[page_num]
+        if max_side:
+            zoom = min(zoom, fit_scale(page.rect.width, page.rect.height, max_side))
+        colorspace = fitz.csGRAY if gray else fitz.csRGB
+        return page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=colorspace, alpha=False)
+
+
+# ================= PDF 读取器 =================
+
+class PdfReader:
+    """
+    并发 PDF 读取器
+    - 有文本层的页面直接提取文字，大文档在进程池中分块提取
+    - 无文本层的页面渲染为图片后交给 OCR 线程池，并受服务商并发上限约束
+    - 结果始终按页码顺序返回
+    """
+
+    _process_pool = None
+    _process_pool_lock = threading.Lock()
+
+    def __init__(self, ai_client: AIClient = None, ocr_workers: int = None,
+                 zoom: float = OCR_ZOOM):
+        """
+        :param ai_client: 用于 OCR 的 AIClient，默认在首次需要 OCR 时创建
+        :param ocr_workers: OCR 线程数，默认取所有服务商并发上限中的最大值
+        :param zoom: OCR 渲染缩放倍数
+        """
+        self._ai_client = ai_client
+        self._client_lock = threading.Lock()
+        self.ocr_workers = ocr_workers or max(
+            [DEFAULT_PROVIDER_CONCURRENCY, *PROVIDER_CONCURRENCY.values()]
+        )
+        self.zoom = zoom
+
+    @classmethod
+    def _get_process_pool(cls) -> ProcessPoolExecutor:
+        with cls._process_pool_lock:
+            if cls._process_pool is None:
+                workers = max(1, min(4, (os.cpu_count() or 2) - 1))
+                cls._process_pool = ProcessPoolExecutor(max_workers=workers)
+            return cls._process_pool
+
+    def _get_client(self) -> AIClient:
+        with self._client_lock:
+            if self._ai_client is None:
+                self._ai_client = AIClient(system_prompt=OCR_SYSTEM_PROMPT)
+            return self._ai_client
+
+    def _ocr_page(self, pdf_path: str, page_num: int) -> str:
+        """渲染并 OCR 一页（在 OCR 线程中执行）"""
+        try:
+            client = self._get_client()
+            config = AIClient._ocr_config or {}
+            pixmap = render_page(pdf_path, page_num, self.zoom,
+                                 max_side=max_side_for(config.get('model_name')), gray=True)
+        except Exception as e:
+            print(f"❌ 第 {page_num + 1} 页渲染失败: {e}")
+            return f"[OCR 识别失败: {e}]"
+
+        with get_provider_semaphore(config.get('endpoint', '')):
+            return client._ocr_image(pixmap)
+
+    def _iter_text_layers(self, pdf_path: str, page_count: int) -> Iterator[tuple]:
+        """按页码顺序产出 (页码, 文本层)"""
+        chunks = [list(range(start, min(start + TEXT_CHUNK_PAGES, page_count)))
+                  for start in range(0, page_count, TEXT_CHUNK_PAGES)]
+
+        if page_count < PROCESS_POOL_MIN_PAGES:
+            for chunk in chunks:
+                texts = extract_text_layers(pdf_path, chunk)
+                for n in chunk:
+                    yield n, texts[n]
+            return
+
+        pool = self._get_process_pool()
+        futures = [pool.submit(extract_text_layers, pdf_path, chunk) for chunk in chunks]
+        for chunk, future in zip(chunks, futures):
+            texts = future.result()
+            for n in chunk:
+                yield n, texts[n]
+
+    def iter_pages(self, pdf_path: str, max_pages: int = None) -> Iterator[dict]:
+        """
+        按页码顺序逐页产出读取结果，前面的页面就绪后立即返回，不必等待整份文档
+
+        :param pdf_path: PDF 文件路径
+        :param max_pages: 最多读取的页数，None 表示整份文档
+        :return: {"page": 页码(从 1 开始), "text": 文本, "ocr": 是否经过 OCR, "total_pages": 总页数}
+        """
+        if not os.path.exists(pdf_path):
+            raise FileNotFoundError("文件不存在")
+
+        with fitz.open(pdf_path) as doc:
+            total_pages = len(doc)
+        page_count = total_pages if max_pages is None else min(max_pages, total_pages)
+
+        # 队列中按顺序保存每页的结果：已就绪的文本或 OCR Future
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.ocr_workers) as ocr_pool:
+            try:
+                for page_num, text in self._iter_text_layers(pdf_path, page_count):
+                    if text.strip():
+                        pending.append((page_num, text.strip(), None))
+                    else:
+                        print(f"[PdfReader] 第 {page_num + 1} 页: 无文本，加入 OCR 队列")
+                        pending.append((page_num, None, ocr_pool.submit(self._ocr_page, pdf_path, page_num)))
+
+                    # 把队首已就绪的页面先交出去
+                    while pending and (pending[0][2] is None or pending[0][2].done()):
+                        yield self._page_result(pending.popleft(), total_pages)
+
+                while pending:
+                    yield self._page_result(pending.popleft(), total_pages)
+            finally:
+                # 调用方提前停止迭代时，取消还未开始的 OCR 任务
+                for _, _, future in pending:
+                    if future is not None:
+                        future.cancel()
+
+    @staticmethod
+    def _page_result(item: tuple, total_pages: int) -> dict:
+        page_num, text, future = item
+        if future is not None:
+            return {"page": page_num + 1, "text": future.result(), "ocr": True, "total_pages": total_pages}
+        return {"page": page_num + 1, "text": text, "ocr": False, "total_pages": total_pages}
+
+    def read(self, pdf_path: str, max_pages: int = None,
+             on_page: Optional[Callable[[dict], None]] = None) -> dict:
+        """
+        读取整份（或前 max_pages 页）PDF
+
+        :param on_page: 每页就绪后的回调（用于汇报进度，回调抛出异常时停止读取并取消剩余的 OCR）
+        :return: {"total_pages": 总页数, "pages": [逐页结果], "content": 拼接后的全文}
+        """
+        pages = []
+        for page in self.iter_pages(pdf_path, max_pages):
+            pages.append(page)
+            if on_page is not None:
+                on_page(page)
+        total_pages = pages[0]["total_pages"] if pages else 0
+
+        parts = []
+        for page in pages:
+            parts.append(format_page_header(page))
+            parts.append(page["text"])
+        if total_pages > len(pages):
+            parts.append(f"\n... (仅显示前 {len(pages)} 页，共 {total_pages} 页)")
+
+        return {"total_pages": total_pages, "pages": pages, "content": "\n\n".join(parts)}
+
+
+def format_page_header(page: dict) -> str:
+    """生成页面分隔标题，与原 file:readPdf 输出格式保持一致"""
+    suffix = " (OCR)" if page["ocr"] else ""
+    return f"--- 第 {page['page']} 页{suffix} ---"
+
+
+# ================= 便捷函数 =================
+
+_default_reader = None
+
+
+def read_pdf(pdf_path: str, max_pages: Optional[int] = None) -> dict:
+    """
+    便捷函数：读取 PDF，无文本层的页面自动 OCR
+
+    :param pdf_path: PDF 文件路径
+    :param max_pages: 最多读取的页数，None 表示整份文档
+    :return: 同 PdfReader.read()
+
+    使用示例:
+        from pdf_reader import read_pdf
+
+        result = read_pdf("paper.pdf")
+        print(result["content"])
+    """
+    global _default_reader
+    if _default_reader is None:
+        _default_reader = PdfReader()
+    return _default_reader.read(pdf_path, max_pages)
+
+
+# ================= 测试入口 =================
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    if len(sys.argv) < 2:
+        print("用法: python pdf_reader.py <PDF 文件路径> [最多页数]")
+        sys.exit(1)
+
+    start = time.time()
+    result = read_pdf(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else None)
+    ocr_pages = sum(1 for p in result["pages"] if p["ocr"])
+    print(result["content"])
+    print(f"\n✅ 共 {result['total_pages']} 页，读取 {len(result['pages'])} 页（OCR {ocr_pages} 页），"
+          f"耗时 {time.time() - start:.2f}s")
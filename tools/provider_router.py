@@ -0,0 +1,257 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Optional
+
+from env_utils import env_flag
+
+
+# ================= 默认配置 =================
+
+LATENCY_WINDOW = 50  # 每个服务商保留最近多少次请求用于统计
+MIN_SAMPLES = 3  # 样本数达到该值后才按延迟排序
+SLOW_LATENCY = 20.0  # p50 超过该值（秒）的服务商排在尚未测过的服务商之后
+ERROR_RATE_UNHEALTHY = 0.5  # 最近请求的错误率达到该值视为不健康
+UNAVAILABLE_COOLDOWN = 60.0  # 连接失败 / 5xx / 鉴权失败后暂停使用的时间（秒）
+RATE_LIMIT_COOLDOWN = 30.0  # 429 且没有 Retry-After 时暂停使用的时间（秒）
+
+HEDGE_ENABLED = env_flag("AI_HEDGE_ENABLED", False)  # 对冲会多消耗一次请求，默认关闭
+HEDGE_MIN_DELAY = 2.0  # 对冲前至少等待的时间（秒）
+HEDGE_DEFAULT_DELAY = 8.0  # 首选服务商样本不足时的对冲等待时间（秒）
+
+
+# ================= 错误分类 =================
+
+def classify_error(error: Exception) -> Optional[str]:
+    """
+    判断失败是否应该切换服务商
+
+    :return: "rate_limited"（429）/ "unavailable"（网络、超时、鉴权、模型不存在、5xx）/
+             None（请求本身的问题，换服务商也不会成功）
+    """
+    from openai import APIConnectionError, APIStatusError
+
+    if isinstance(error, APIConnectionError):  # 包括 APITimeoutError
+        return "unavailable"
+    if isinstance(error, APIStatusError):
+        if error.status_code == 429:
+            return "rate_limited"
+        if error.status_code in (401, 403, 404) or error.status_code >= 500:
+            return "unavailable"
+    return None
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+# ================= 单个服务商的统计 =================
+
+class ProviderStats:
+    """一个服务商 + 模型最近请求的延迟和成败"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.latencies = deque(maxlen=window)  # 成功请求的耗时
+        self.outcomes = deque(maxlen=window)  # True 成功 / False 失败
+        self.cooldown_until = 0.0
+        self.last_error = None
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    @property
+    def samples(self) -> int:
+        return len(self.latencies)
+
+
+# ================= 路由 =================
+
+_hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="ai-route")
+
+
+class ProviderRouter:
+    """
+    按实时表现在多个 API 服务商之间分配请求
+    - 记录每个服务商 + 模型最近请求的 p50 / p95 延迟和错误率
+    - 冷却中（刚失败或被限流）和错误率过高的服务商排在最后
+    - 请求失败且属于服务商问题时自动换下一个
+    - 可选对冲：首选服务商超过其 p95 仍未返回时，同时向下一个服务商发出请求，先返回的结果生效
+    """
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(config: dict, metric: str = "chat") -> str:
+        return f"{config['endpoint']}|{config['model_name']}|{metric}"
+
+    def _get(self, config: dict, metric: str) -> ProviderStats:
+        key = self.make_key(config, metric)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = ProviderStats()
+        return stats
+
+    # ---------- 记录 ----------
+
+    def record_success(self, config: dict, latency: float, metric: str = "chat"):
+        with self._lock:
+            stats = self._get(config, metric)
+            stats.latencies.append(latency)
+            stats.outcomes.append(True)
+            stats.cooldown_until = 0.0
+
+    def record_failure(self, config: dict, error: Exception, metric: str = "chat"):
+        """记录一次失败（请求本身的问题不计入服务商的错误率）"""
+        kind = classify_error(error)
+        if kind is None:
+            return
+        if kind == "rate_limited":
+            cooldown = _retry_after(error) or RATE_LIMIT_COOLDOWN
+        else:
+            cooldown = UNAVAILABLE_COOLDOWN
+        with self._lock:
+            stats = self._get(config, metric)
+            stats.outcomes.append(False)
+            stats.cooldown_until = time.time() + cooldown
+            stats.last_error = f"{kind}: {error}"
+        print(f"⚠️ {config.get('name', config['endpoint'])} {kind}，{cooldown:.0f}s 内优先使用其他服务商")
+
+    # ---------- 排序 ----------
+
+    def order(self, configs: list, metric: str = "chat") -> list:
+        """
+        按优先程度排序：
+        可用 > 冷却中；健康 > 错误率过高；延迟正常 > 尚未测过 > 延迟过高；同一档内按 p50（乘以错误率惩罚）升序，
+        仍相同时保持传入顺序
+        """
+        now = time.time()
+        with self._lock:
+            keyed = []
+            for index, config in enumerate(configs):
+                stats = self._stats.get(self.make_key(config, metric))
+                if stats is None or stats.samples < MIN_SAMPLES:
+                    cooling = stats is not None and stats.cooldown_until > now
+                    keyed.append(((cooling, False, 1, 0.0, index), config))
+                    continue
+                score = stats.percentile(50) * (1 + 2 * stats.error_rate)
+                tier = 0 if score <= SLOW_LATENCY else 2
+                keyed.append(((stats.cooldown_until > now, stats.error_rate >= ERROR_RATE_UNHEALTHY,
+                               tier, score, index), config))
+        keyed.sort(key=lambda item: item[0])
+        return [config for _, config in keyed]
+
+    def hedge_delay(self, config: dict, metric: str = "chat") -> float:
+        """对冲前的等待时间：首选服务商的 p95"""
+        with self._lock:
+            stats = self._stats.get(self.make_key(config, metric))
+            p95 = stats.percentile(95) if stats is not None and stats.samples >= MIN_SAMPLES else None
+        return max(HEDGE_MIN_DELAY, p95 if p95 is not None else HEDGE_DEFAULT_DELAY)
+
+    # ---------- 发送 ----------
+
+    def _timed(self, config: dict, request: Callable[[dict], object], metric: str):
+        start = time.monotonic()
+        try:
+            result = request(config)
+        except Exception as e:
+            self.record_failure(config, e, metric)
+            raise
+        self.record_success(config, time.monotonic() - start, metric)
+        return result
+
+    def call(self, configs: list, request: Callable[[dict], object],
+             hedge: bool = None, metric: str = "chat") -> tuple:
+        """
+        按排序依次尝试服务商
+
+        :param configs: 候选 API 配置（传入顺序作为没有统计数据时的优先级）
+        :param request: request(config) -> 结果，失败时抛出异常
+        :param hedge: 是否对冲慢请求，None 表示按 AI_HEDGE_ENABLED 环境变量
+        :param metric: 统计类别（例如流式请求只统计首包时间，与普通请求分开）
+        :return: (实际完成请求的配置, 结果)
+        """
+        hedge = HEDGE_ENABLED if hedge is None else hedge
+        pending = self.order(configs, metric)
+        if not pending:
+            raise RuntimeError("没有可用的 API 配置")
+
+        running = {}
+        errors = []
+
+        def launch():
+            config = pending.pop(0)
+            running[_hedge_pool.submit(self._timed, config, request, metric)] = config
+            return config
+
+        latest = launch()
+        while running:
+            timeout = self.hedge_delay(latest, metric) if hedge and pending else None
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                print(f"🐢 {latest.get('name', latest['endpoint'])} 响应慢，对冲请求 {pending[0].get('name', '')}")
+                latest = launch()
+                continue
+
+            for future in done:
+                config = running.pop(future)
+                try:
+                    # 对冲中落后的请求继续在后台完成，只用于更新统计
+                    return config, future.result()
+                except Exception as e:
+                    if classify_error(e) is None:
+                        raise
+                    errors.append(e)
+            if not running and pending:
+                latest = launch()
+
+        raise errors[-1]
+
+    # ---------- 查看 ----------
+
+    def snapshot(self) -> list:
+        """各服务商的统计（延迟单位：秒）"""
+        now = time.time()
+        with self._lock:
+            result = []
+            for key, stats in self._stats.items():
+                p50, p95 = stats.percentile(50), stats.percentile(95)
+                result.append({
+                    "key": key,
+                    "samples": stats.samples,
+                    "p50": round(p50, 3) if p50 is not None else None,
+                    "p95": round(p95, 3) if p95 is not None else None,
+                    "error_rate": round(stats.error_rate, 3),
+                    "cooling": stats.cooldown_until > now,
+                    "last_error": stats.last_error,
+                })
+        return result
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ProviderRouter:
+    """获取进程内共享的路由（所有 AIClient 共用统计数据）"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ProviderRouter()
+        return _router
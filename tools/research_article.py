@@ -1,20 +1,27 @@
-import arxiv
-from datetime import datetime
+import time
 import textwrap
 
+from arxiv_fetcher import get_fetcher, iter_results, newest_first, to_paper_info
+from paper_store import PaperStore, QUERY_FRESH_SECONDS
+
+# 增量抓取时最多向前翻多少篇（防止长时间未运行后一次抓取过多）
+MAX_INCREMENTAL_RESULTS = 100
+# 启用本地重排时，候选数量为 max_results 的倍数
+OVERFETCH_FACTOR = 5
+
+
 class ArxivRecommender:
-    def __init__(self, max_results=5):
+    def __init__(self, max_results=5, store=None, ranker=None):
         """
         初始化 Arxiv 推荐器
         :param max_results: 每次推荐的文章数量，默认为 5
+        :param store: 本地论文库 PaperStore，默认在首次调用 search() 时创建
+        :param ranker: 按知识库相关度重排的 PaperRanker，为 None 时按提交时间排序
         """
         self.max_results = max_results
-        # 实例化一个 Client，复用连接
-        self.client = arxiv.Client(
-            page_size=max_results,
-            delay_seconds=3.0,
-            num_retries=3
-        )
+        self._store = store
+        self.ranker = ranker
+        # 所有推荐器共用 arxiv_fetcher 中的同一个 Client 和请求间隔
 
     def get_latest_papers(self, query):
         """
@@ -22,32 +29,15 @@ class ArxivRecommender:
         :param query: 用户关心的领域关键词 (支持 AND, OR, NOT，例如: "LLM AND RAG")
         :return: 包含论文信息的列表
         """
-        # 构造搜索对象
-        # sort_by=arxiv.SortCriterion.SubmittedDate 确保是“最新”提交的
-        search = arxiv.Search(
-            query=query,
-            max_results=self.max_results,
-            sort_by=arxiv.SortCriterion.SubmittedDate,
-            sort_order=arxiv.SortOrder.Descending
-        )
+        # 按提交时间倒序，确保是“最新”提交的
+        search = newest_first(query, self.max_results)
 
         papers_data = []
 
         try:
             # 执行搜索
-            results = self.client.results(search)
-            
-            for r in results:
-                # 提取并清洗数据
-                paper_info = {
-                    "title": r.title.replace('\n', ' '),
-                    "authors": ", ".join([a.name for a in r.authors]),
-                    "published_date": r.published.strftime("%Y-%m-%d"),
-                    "summary": r.summary.replace('\n', ' '), # 去除摘要中的换行符
-                    "url": r.entry_id,
-                    "pdf_url": r.pdf_url
-                }
-                papers_data.append(paper_info)
+            for r in iter_results(search):
+                papers_data.append(to_paper_info(r))
                 
         except Exception as e:
             print(f"[错误] 获取 Arxiv 数据失败: {e}")
@@ -55,6 +45,56 @@ class ArxivRecommender:
 
         return papers_data
 
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = PaperStore()
+        return self._store
+
+    def _fetch_since(self, query, last_published):
+        """
+        抓取比 last_published 更新的论文，同一时间窗口内的多个关键词由 ArxivFetcher 合并抓取
+        :param last_published: 上次见到的最新提交时间，None 表示首次抓取，只取 max_results 篇
+        """
+        limit = self._candidate_count() if last_published is None else MAX_INCREMENTAL_RESULTS
+        return get_fetcher().fetch(query, last_published, limit)
+
+    def _candidate_count(self):
+        return self.max_results * OVERFETCH_FACTOR if self.ranker else self.max_results
+
+    def _rank(self, papers):
+        """有重排器时按相关度取前 max_results 篇"""
+        if self.ranker is None or not papers:
+            return papers[:self.max_results]
+        try:
+            return self.ranker.rank(papers, self.max_results)
+        except Exception as e:
+            print(f"[警告] 相关度排序失败，按时间排序: {e}")
+            return papers[:self.max_results]
+
+    def search(self, query, max_age=QUERY_FRESH_SECONDS):
+        """
+        通过本地论文库搜索：短时间内重复的关键词直接读库，否则只增量抓取新论文
+        :param query: 关键词
+        :param max_age: 本地结果的有效期（秒），0 表示总是增量抓取
+        :return: {"papers": 推荐的 max_results 篇, "new_papers": 本次首次出现的论文中推荐的部分}
+        """
+        store = self.store
+        new_ids = []
+        state = store.query_state(query)
+        if state is None or time.time() - state["last_fetched"] >= max_age:
+            try:
+                papers = self._fetch_since(query, state["last_published"] if state else None)
+                new_ids = store.add_results(query, papers)
+                print(f"[Arxiv] \"{query}\" 抓取 {len(papers)} 篇，新增 {len(new_ids)} 篇")
+            except Exception as e:
+                print(f"[错误] 获取 Arxiv 数据失败: {e}")
+
+        return {
+            "papers": self._rank(store.latest_for_query(query, self._candidate_count())),
+            "new_papers": self._rank(store.get_papers(new_ids)),
+        }
+
     def format_display(self, papers):
         """
         将论文列表格式化打印
@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Optional
+
+from ask_ai import get_app_dir
+from env_utils import env_flag
+
+
+# ================= 默认配置 =================
+
+DEFAULT_MAX_BYTES = int(float(os.environ.get("AI_CACHE_MAX_MB", "200")) * 1024 * 1024)
+
+
+# ================= 响应缓存 =================
+
+class ResponseCache:
+    """
+    基于 SQLite 的内容寻址响应缓存
+    键为模型、系统提示词、请求参数、文本和图片字节的哈希，值为模型返回的文本。
+    总大小超过上限时按最近访问时间淘汰（LRU）
+    """
+
+    def __init__(self, path: str = None, max_bytes: int = DEFAULT_MAX_BYTES,
+                 cache_sampled: bool = None):
+        """
+        :param path: 数据库文件路径，默认为 exe/脚本 同目录下的 ai_cache.sqlite3
+        :param max_bytes: 缓存总大小上限（字节）
+        :param cache_sampled: 是否缓存 temperature > 0 的请求，默认读取环境变量 AI_CACHE_SAMPLED（默认开启）
+        """
+        if path is None:
+            path = os.path.join(get_app_dir(), "ai_cache.sqlite3")
+        if cache_sampled is None:
+            cache_sampled = env_flag("AI_CACHE_SAMPLED", True)
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.cache_sampled = cache_sampled
+        self.enabled = env_flag("AI_CACHE_ENABLED", True)
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def make_key(kind: str, model: str, **parts) -> str:
+        """
+        生成缓存键
+
+        :param kind: 请求类型，例如 "chat" / "ocr"
+        :param model: 模型名称
+        :param parts: 影响结果的其余字段（系统提示词、messages、参数、图片哈希等），需可 JSON 序列化
+        :return: 十六进制 SHA-256
+        """
+        payload = json.dumps({"kind": kind, "model": model, **parts},
+                             ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def should_cache(self, temperature: float, use_cache: bool = None) -> bool:
+        """
+        判断某次请求是否走缓存
+
+        :param temperature: 请求的生成温度
+        :param use_cache: 调用方显式指定（None 表示按默认策略）
+        """
+        if not self.enabled or use_cache is False:
+            return False
+        if use_cache is True:
+            return True
+        return temperature == 0 or self.cache_sampled
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存，命中时刷新访问时间"""
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+                conn.commit()
+                return row[0]
+        except sqlite3.Error as e:
+            print(f"⚠️ 读取响应缓存失败: {e}")
+            return None
+
+    def put(self, key: str, kind: str, value: str):
+        """写入缓存并在超出大小上限时淘汰最久未访问的条目"""
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, kind, value, size, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, kind, value, size, now, now)
+                )
+                self._evict(conn)
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ 写入响应缓存失败: {e}")
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        excess = total - self.max_bytes
+        freed = 0
+        stale_keys = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed_at ASC"):
+            stale_keys.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM responses WHERE key = ?", stale_keys)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM responses")
+            conn.commit()
+
+    def stats(self) -> dict:
+        """返回条目数与总大小"""
+        with self._lock:
+            conn = self._connect()
+            count, total = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {"entries": count, "bytes": total, "max_bytes": self.max_bytes}
+
+
+def image_digest(image) -> str:
+    """
+    计算图片内容的哈希，用作缓存键的一部分
+
+    :param image: PIL.Image 对象、图片文件路径、PyMuPDF Pixmap 或 EncodedImage
+    """
+    h = hashlib.sha256()
+    if isinstance(image, str):
+        with open(image, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(block)
+    elif hasattr(image, "mime") and hasattr(image, "data"):
+        # 已编码的图片直接对编码后的字节取哈希
+        h.update(image.mime.encode("utf-8"))
+        h.update(image.data)
+    elif hasattr(image, "samples_mv"):
+        # Pixmap 直接对像素内存取哈希，不复制
+        h.update(f"pixmap|{image.n}|{image.width}x{image.height}".encode("utf-8"))
+        h.update(image.samples_mv)
+    else:
+        h.update(f"{image.mode}|{image.size}".encode("utf-8"))
+        h.update(image.tobytes())
+    return h.hexdigest()
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """获取进程内共享的响应缓存"""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache()
+        return _response_cache
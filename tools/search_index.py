@@ -0,0 +1,477 @@
+import os
+import re
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Iterator, Optional
+
+import numpy as np
+
+from ask_ai import get_app_dir
+from embedding_router import tokenize, HashingEmbedder
+from note_store import LEGACY_SUFFIX
+
+
+# ================= 默认配置 =================
+
+VECTOR_DIM = 1024  # 检索向量维度（低于分类器，降低存储和计算量）
+MAX_CHUNK_CHARS = 2000  # 单个索引片段的最大长度
+CANDIDATE_LIMIT = 50  # 全文 / 向量各自召回的候选数量
+RRF_K = 60  # 倒数排名融合常数
+
+NOTE_SEPARATOR = re.compile(r"\n-{3,}\n")  # 笔记分段中条目之间的分隔线（见 note_store）
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp')
+HASH_BLOCK_SIZE = 1 << 20  # 计算文件哈希时每次读取 1MB
+
+
+# ================= 文档切分 =================
+
+def _split_long(text: str, limit: int = MAX_CHUNK_CHARS) -> list:
+    """按段落把过长文本切成不超过 limit 字符的片段"""
+    if len(text) <= limit:
+        return [text]
+    chunks, current = [], ""
+    for paragraph in text.split("\n\n"):
+        while len(paragraph) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(paragraph[:limit])
+            paragraph = paragraph[limit:]
+        if len(current) + len(paragraph) + 2 > limit and current:
+            chunks.append(current)
+            current = paragraph
+        else:
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def split_markdown(text: str) -> list:
+    """按笔记条目（--- 分隔线）切分 markdown"""
+    chunks = []
+    for entry in NOTE_SEPARATOR.split(text):
+        entry = entry.strip()
+        if entry:
+            chunks.extend(_split_long(entry))
+    return chunks
+
+
+def classify_file(path: str) -> Optional[str]:
+    """判断文件在索引中的类型：note / pdf / image，不需要索引的返回 None"""
+    lower = path.lower()
+    if lower.endswith(LEGACY_SUFFIX):
+        return None  # 已导入笔记日志的旧版笔记文件，内容与按月分段重复
+    if lower.endswith(('.md', '.txt')):
+        return "note"
+    if lower.endswith('.pdf'):
+        return "pdf"
+    if lower.endswith(IMAGE_EXTS):
+        return "image"
+    return None
+
+
+def normalize_path(path: str) -> str:
+    """
+    索引中文件路径的统一形式（绝对路径，Windows 下统一大小写和分隔符）
+    写入索引和在清单中查找都使用它，否则同一文件会因写法不同被当作两个文件
+    """
+    return os.path.normcase(os.path.abspath(path))
+
+
+def file_digest(path: str) -> str:
+    """分块计算文件内容的 sha256"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+# ================= 搜索索引 =================
+
+class SearchIndex:
+    """
+    知识库搜索索引
+    - 全文检索：SQLite FTS5，文本预先切成英文单词 + 中文单字/二字特征，兼容中英文混合查询
+    - 向量检索（可选）：哈希向量存入 SQLite，查询时加载为 NumPy 矩阵做余弦相似度
+    - 两路结果用倒数排名融合（RRF）合并
+    """
+
+    def __init__(self, path: str = None, use_vectors: bool = True, ocr_images: bool = False):
+        """
+        :param path: 索引数据库路径，默认为 exe/脚本 同目录下的 search_index.sqlite3
+        :param use_vectors: 是否启用向量检索
+        :param ocr_images: 是否对 images 文件夹中的图片做 OCR 后索引（会产生 API 调用，结果有缓存）
+        """
+        if path is None:
+            path = os.path.join(get_app_dir(), "search_index.sqlite3")
+        self.path = path
+        self.use_vectors = use_vectors
+        self.ocr_images = ocr_images
+        self.embedder = HashingEmbedder(dim=VECTOR_DIM) if self.use_vectors else None
+
+        self._lock = threading.RLock()
+        self._conn = None
+        self._pdf_reader = None
+        self._ai_client = None
+        self._matrix = None  # 向量矩阵缓存，索引变化后失效
+        self._matrix_ids = None
+        self._matrix_folders = None  # 与矩阵逐行对应的 folder / kind，用于在取 top k 前过滤
+        self._matrix_kinds = None
+
+    # ---------- 数据库 ----------
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    folder TEXT,
+                    kind TEXT NOT NULL,
+                    mtime REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    sha256 TEXT,
+                    indexed_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS chunks (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    folder TEXT,
+                    kind TEXT NOT NULL,
+                    title TEXT,
+                    position INTEGER NOT NULL,
+                    content TEXT NOT NULL,
+                    vector BLOB
+                );
+                CREATE INDEX IF NOT EXISTS idx_chunks_path ON chunks(path);
+                CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(tokens);
+            """)
+            # 旧版本索引没有 sha256 列
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(files)")}
+            if "sha256" not in columns:
+                conn.execute("ALTER TABLE files ADD COLUMN sha256 TEXT")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ---------- 内容提取 ----------
+
+    def _iter_file_chunks(self, path: str, kind: str) -> Iterator[tuple]:
+        """产出 (标题, 片段文本)"""
+        if kind == "note":
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                text = f.read()
+            for chunk in split_markdown(text):
+                first_line = chunk.split("\n", 1)[0].lstrip("#").strip()
+                yield first_line[:100], chunk
+
+        elif kind == "pdf":
+            if self._pdf_reader is None:
+                from pdf_reader import PdfReader
+                self._pdf_reader = PdfReader()
+            for page in self._pdf_reader.iter_pages(path):
+                for chunk in _split_long(page["text"]):
+                    yield f"第 {page['page']} 页", chunk
+
+        elif kind == "image" and self.ocr_images:
+            if self._ai_client is None:
+                from ask_ai import AIClient
+                self._ai_client = AIClient()
+            text = self._ai_client._ocr_image(path)
+            if not text.startswith("[OCR"):
+                for chunk in _split_long(text):
+                    yield os.path.basename(path), chunk
+
+    # ---------- 写入 ----------
+
+    def index_file(self, path: str, folder: str = None, digest: str = None) -> int:
+        """
+        （重新）索引单个文件，替换该文件已有的所有片段
+
+        :param path: 文件路径
+        :param folder: 所属知识库文件夹名称
+        :param digest: 文件内容的 sha256，记录到清单中供增量索引比对
+        :return: 写入的片段数
+        """
+        path = normalize_path(path)
+        kind = classify_file(path)
+        if kind is None or not os.path.isfile(path):
+            self.remove_file(path)
+            return 0
+
+        stat = os.stat(path)
+        chunks = list(self._iter_file_chunks(path, kind))
+        vectors = self.embedder.embed([c for _, c in chunks]).astype(np.float16) if (self.use_vectors and chunks) else None
+
+        with self._lock:
+            conn = self._connect()
+            self._delete_chunks(conn, path)
+            for i, (title, content) in enumerate(chunks):
+                blob = vectors[i].tobytes() if vectors is not None else None
+                cursor = conn.execute(
+                    "INSERT INTO chunks (path, folder, kind, title, position, content, vector) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (path, folder, kind, title, i, content, blob)
+                )
+                tokens = " ".join(tokenize(f"{title} {content}"))
+                conn.execute("INSERT INTO chunks_fts (rowid, tokens) VALUES (?, ?)", (cursor.lastrowid, tokens))
+            conn.execute(
+                "INSERT OR REPLACE INTO files (path, folder, kind, mtime, size, sha256, indexed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path, folder, kind, stat.st_mtime, stat.st_size, digest, time.time())
+            )
+            conn.commit()
+            self._matrix = None
+        return len(chunks)
+
+    @staticmethod
+    def _delete_chunks(conn: sqlite3.Connection, path: str):
+        ids = [(row[0],) for row in conn.execute("SELECT id FROM chunks WHERE path = ?", (path,))]
+        conn.executemany("DELETE FROM chunks_fts WHERE rowid = ?", ids)
+        conn.execute("DELETE FROM chunks WHERE path = ?", (path,))
+
+    def remove_file(self, path: str):
+        """从索引中删除文件"""
+        path = normalize_path(path)
+        with self._lock:
+            conn = self._connect()
+            self._delete_chunks(conn, path)
+            conn.execute("DELETE FROM files WHERE path = ?", (path,))
+            conn.commit()
+            self._matrix = None
+
+    def manifest(self) -> dict:
+        """
+        已索引文件的清单
+
+        :return: {路径: {"folder", "mtime", "size", "sha256"}}
+        """
+        with self._lock:
+            rows = self._connect().execute("SELECT path, folder, mtime, size, sha256 FROM files").fetchall()
+        return {path: {"folder": folder, "mtime": mtime, "size": size, "sha256": sha256}
+                for path, folder, mtime, size, sha256 in rows}
+
+    def touch_file(self, path: str, mtime: float, size: int, digest: str = None):
+        """内容未变（仅 mtime 变化）时只更新清单，不重新提取"""
+        path = normalize_path(path)
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "UPDATE files SET mtime = ?, size = ?, sha256 = COALESCE(?, sha256) WHERE path = ?",
+                (mtime, size, digest, path)
+            )
+            conn.commit()
+
+    @staticmethod
+    def iter_folder_files(folder_path: str) -> Iterator[str]:
+        """遍历知识库文件夹中需要索引的文件（路径已经过 normalize_path）"""
+        for root, _, files in os.walk(normalize_path(folder_path)):
+            for name in files:
+                path = os.path.join(root, name)
+                if classify_file(path):
+                    yield path
+
+    def rebuild(self, folders: list) -> dict:
+        """
+        重建整个索引
+
+        :param folders: folder_structure.json 中的 folders 列表
+        :return: {"files": 文件数, "chunks": 片段数}
+        """
+        with self._lock:
+            conn = self._connect()
+            conn.executescript("DELETE FROM chunks; DELETE FROM chunks_fts; DELETE FROM files;")
+            conn.commit()
+
+        file_count = chunk_count = 0
+        for folder in folders:
+            if not os.path.isdir(folder["path"]):
+                continue
+            for path in self.iter_folder_files(folder["path"]):
+                try:
+                    chunk_count += self.index_file(path, folder["name"], file_digest(path))
+                    file_count += 1
+                except Exception as e:
+                    print(f"⚠️ 索引失败 {path}: {e}")
+        print(f"✅ 索引完成：{file_count} 个文件，{chunk_count} 个片段")
+        return {"files": file_count, "chunks": chunk_count}
+
+    # ---------- 查询 ----------
+
+    @staticmethod
+    def _fts_query(query: str) -> Optional[str]:
+        """把查询转换为 FTS5 表达式：英文单词和中文二字特征，任一命中即召回，由 bm25 排序"""
+        terms = []
+        for token in tokenize(query):
+            is_single_cjk = len(token) == 1 and not token.isascii()
+            if is_single_cjk and len(query.strip()) > 1:
+                continue  # 有二字特征时跳过单字，减少噪声
+            terms.append('"' + token.replace('"', '""') + '"')
+        return " OR ".join(dict.fromkeys(terms)) if terms else None
+
+    def _fts_candidates(self, conn, query: str, folder: str = None, kind: str = None) -> list:
+        expression = self._fts_query(query)
+        if not expression:
+            return []
+        # 过滤条件放在 SQL 中，保证每个文件夹 / 类型都能召回满 CANDIDATE_LIMIT 个候选
+        sql = "SELECT chunks_fts.rowid FROM chunks_fts JOIN chunks ON chunks.id = chunks_fts.rowid " \
+              "WHERE chunks_fts MATCH ?"
+        params = [expression]
+        if folder:
+            sql += " AND chunks.folder = ?"
+            params.append(folder)
+        if kind:
+            sql += " AND chunks.kind = ?"
+            params.append(kind)
+        rows = conn.execute(sql + " ORDER BY bm25(chunks_fts) LIMIT ?", params + [CANDIDATE_LIMIT]).fetchall()
+        return [row[0] for row in rows]
+
+    def _vector_candidates(self, conn, query: str, folder: str = None, kind: str = None) -> list:
+        if not self.use_vectors:
+            return []
+        if self._matrix is None:
+            rows = conn.execute("SELECT id, folder, kind, vector FROM chunks WHERE vector IS NOT NULL").fetchall()
+            self._matrix_ids = np.array([r[0] for r in rows], dtype=np.int64)
+            self._matrix_folders = np.array([r[1] or "" for r in rows], dtype=object)
+            self._matrix_kinds = np.array([r[2] for r in rows], dtype=object)
+            self._matrix = (np.frombuffer(b"".join(r[3] for r in rows), dtype=np.float16)
+                            .reshape(len(rows), VECTOR_DIM).astype(np.float32)
+                            if rows else np.zeros((0, VECTOR_DIM), np.float32))
+
+        rows = np.arange(self._matrix.shape[0])
+        if folder:
+            rows = rows[self._matrix_folders[rows] == folder]
+        if kind:
+            rows = rows[self._matrix_kinds[rows] == kind]
+        if rows.size == 0:
+            return []
+
+        scores = self._matrix[rows] @ self.embedder.embed([query])[0]
+        top = min(CANDIDATE_LIMIT, scores.size)
+        best = np.argpartition(-scores, top - 1)[:top]
+        best = best[np.argsort(-scores[best])]
+        return [int(self._matrix_ids[rows[i]]) for i in best if scores[i] > 0]
+
+    @staticmethod
+    def _snippet(content: str, query: str, width: int = 120) -> str:
+        """截取包含查询词的片段"""
+        lower = content.lower()
+        position = -1
+        for token in sorted(tokenize(query), key=len, reverse=True):
+            position = lower.find(token)
+            if position >= 0:
+                break
+        start = max(0, position - width // 3) if position >= 0 else 0
+        snippet = content[start:start + width].replace("\n", " ")
+        return ("..." if start > 0 else "") + snippet + ("..." if start + width < len(content) else "")
+
+    def search(self, query: str, limit: int = 20, folder: str = None, kind: str = None) -> list:
+        """
+        搜索知识库
+
+        :param query: 查询文本（中英文均可）
+        :param limit: 返回结果数量
+        :param folder: 只在某个知识库文件夹中搜索（可选）
+        :param kind: 只搜索某类内容 note / pdf / image（可选）
+        :return: [{"path", "folder", "kind", "title", "snippet", "score"}]
+        """
+        with self._lock:
+            conn = self._connect()
+            ranked_lists = [self._fts_candidates(conn, query, folder, kind),
+                            self._vector_candidates(conn, query, folder, kind)]
+
+            scores = {}
+            for ranked in ranked_lists:
+                for rank, chunk_id in enumerate(ranked):
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+            if not scores:
+                return []
+
+            ids = sorted(scores, key=scores.get, reverse=True)
+            placeholders = ",".join("?" * len(ids))
+            rows = {row[0]: row for row in conn.execute(
+                f"SELECT id, path, folder, kind, title, content FROM chunks WHERE id IN ({placeholders})", ids
+            )}
+
+        results = []
+        for chunk_id in ids:
+            row = rows.get(chunk_id)
+            if row is None:
+                continue
+            _, path, row_folder, row_kind, title, content = row
+            results.append({
+                "path": path,
+                "folder": row_folder,
+                "kind": row_kind,
+                "title": title,
+                "snippet": self._snippet(content, query),
+                "score": round(scores[chunk_id], 6),
+            })
+            if len(results) >= limit:
+                break
+        return results
+
+    def version(self) -> tuple:
+        """索引内容的版本标识（文件数和最近索引时间），用于判断基于索引的派生数据是否需要重算"""
+        with self._lock:
+            return tuple(self._connect().execute("SELECT COUNT(*), MAX(indexed_at) FROM files").fetchone())
+
+    def file_vectors(self) -> tuple:
+        """
+        每个已索引文件的向量（该文件所有片段向量的平均）
+
+        :return: (路径列表, 所属文件夹列表, 形状为 (文件数, VECTOR_DIM) 的矩阵)，未启用向量时均为空
+        """
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT path, folder, vector FROM chunks WHERE vector IS NOT NULL ORDER BY path, position"
+            ).fetchall()
+        if not rows:
+            return [], [], np.zeros((0, VECTOR_DIM), np.float32)
+
+        matrix = (np.frombuffer(b"".join(r[2] for r in rows), dtype=np.float16)
+                  .reshape(len(rows), VECTOR_DIM).astype(np.float32))
+        paths = [r[0] for r in rows]
+        starts = [0] + [i for i in range(1, len(paths)) if paths[i] != paths[i - 1]]
+        counts = np.diff(starts + [len(paths)]).astype(np.float32)
+        means = np.add.reduceat(matrix, starts, axis=0) / counts[:, None]
+        return [paths[i] for i in starts], [rows[i][1] or "" for i in starts], means
+
+    def stats(self) -> dict:
+        """索引统计"""
+        with self._lock:
+            conn = self._connect()
+            files = conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+            chunks = conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        return {"files": files, "chunks": chunks, "vectors": self.use_vectors}
+
+
+# ================= 测试入口 =================
+
+if __name__ == "__main__":
+    import sys
+
+    from folder_registry import get_folder_registry
+
+    index = SearchIndex()
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild":
+        index.rebuild(get_folder_registry().list())
+    elif len(sys.argv) > 1:
+        start = time.time()
+        for r in index.search(" ".join(sys.argv[1:])):
+            print(f"[{r['folder']}] {r['path']} ({r['title']})\n    {r['snippet']}")
+        print(f"\n耗时 {(time.time() - start) * 1000:.1f} ms")
+    else:
+        print("用法: python search_index.py rebuild | <查询词>")
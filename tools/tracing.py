@@ -0,0 +1,368 @@
+import os
+import json
+import time
+import inspect
+import functools
+import itertools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from env_utils import env_flag
+
+
+# ================= 默认配置 =================
+
+TRACE_ENABLED = env_flag("AI_TRACE_ENABLED", True)
+TRACE_MAX_BYTES = int(float(os.environ.get("AI_TRACE_MAX_MB", "10")) * 1024 * 1024)  # 单个文件的大小上限
+TRACE_BACKUPS = 5  # 轮转保留的旧文件数（traces.jsonl.1 ~ .5）
+TRACE_FILE = "traces.jsonl"
+
+
+# ================= 耗时段 =================
+
+_ids = itertools.count(1)
+# 当前最内层的耗时段；ContextVar 在每个线程、每个 asyncio 任务中独立，并发请求之间不会串
+_current = ContextVar("trace_span", default=None)
+
+
+class Span:
+    """
+    一个耗时段，结束时写入一行 JSON：
+    {"ts": 开始时间, "stage": 阶段, "ms": 耗时, "id": ..., "parent": 外层耗时段 id, "pid": ..., "ok": ..., 其他属性}
+
+    常用属性：provider、model、cache（"hit" / "miss"）、bytes（请求体或写入的字节数）、
+    prompt_tokens / completion_tokens（来自 response.usage，多次请求时累加）
+    """
+
+    __slots__ = ("stage", "attrs", "id", "parent", "start", "ts")
+
+    def __init__(self, stage: str, attrs: dict, parent: Optional[str]):
+        self.stage = stage
+        self.attrs = attrs
+        self.id = f"{os.getpid():x}-{next(_ids):x}"
+        self.parent = parent
+        self.ts = time.time()
+        self.start = time.perf_counter()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, key: str, value):
+        """累加数值属性（多块 OCR、多次重试等）"""
+        if value:
+            self.attrs[key] = self.attrs.get(key, 0) + value
+
+    def add_usage(self, response):
+        """从 response.usage（或流式响应最后一段的 usage）累加 token 数"""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        self.add("prompt_tokens", getattr(usage, "prompt_tokens", None))
+        self.add("completion_tokens", getattr(usage, "completion_tokens", None))
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+    def finish(self, error: BaseException = None):
+        """结束并写入记录（属性中的 ok / error 优先于异常，用于吞掉异常后返回降级结果的情况）"""
+        record = {"ts": round(self.ts, 3), "stage": self.stage, "ms": round(self.elapsed_ms(), 2),
+                  "id": self.id, "parent": self.parent, "pid": os.getpid(), "ok": error is None}
+        if error is not None:
+            record["error"] = f"{type(error).__name__}: {error}"[:300]
+        record.update(self.attrs)
+        get_trace_writer().write(record)
+
+
+class _NullSpan:
+    """关闭追踪时使用，所有方法都不做任何事"""
+
+    id = None
+
+    def set(self, **attrs):
+        pass
+
+    def add(self, key, value):
+        pass
+
+    def add_usage(self, response):
+        pass
+
+    def elapsed_ms(self) -> float:
+        return 0.0
+
+    def finish(self, error: BaseException = None):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+# ================= 写入 =================
+
+class TraceWriter:
+    """
+    按行追加 JSONL，文件超过 max_bytes 时轮转（与 logging.handlers.RotatingFileHandler 相同的命名规则），
+    每行一次 write 调用，多个进程同时追加时行不会交错
+    worker、keyboard_manager 等进程各自持有句柄：写入前比对文件标识，其他进程轮转后重新打开；
+    是否轮转按文件的实际大小（所有进程写入的总和）判断，已被其他进程轮转过的文件不再重复轮转
+    """
+
+    def __init__(self, path: str = None, max_bytes: int = TRACE_MAX_BYTES, backups: int = TRACE_BACKUPS):
+        """
+        :param path: 追踪文件路径，默认为 exe/脚本 同目录下的 traces/traces.jsonl
+        """
+        if path is None:
+            from ask_ai import get_app_dir
+            path = os.path.join(get_app_dir(), "traces", TRACE_FILE)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._lock = threading.Lock()
+        self._file = None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def files(self) -> list:
+        """从旧到新的全部追踪文件"""
+        rotated = [f"{self.path}.{i}" for i in range(self.backups, 0, -1)]
+        return [p for p in rotated + [self.path] if os.path.exists(p)]
+
+    def _is_current(self) -> bool:
+        """句柄是否仍指向 self.path（其他进程轮转后，句柄指向的是改名后的 .1）"""
+        try:
+            current = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        handle = os.fstat(self._file.fileno())
+        return (current.st_ino, current.st_dev) == (handle.st_ino, handle.st_dev)
+
+    def _rotate(self):
+        is_current = self._is_current()
+        self._file.close()
+        self._file = None
+        if not is_current:
+            return  # 其他进程已经轮转过，下次写入时打开新文件即可
+        try:
+            for i in range(self.backups - 1, 0, -1):
+                source = f"{self.path}.{i}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.path}.{i + 1}")
+            if os.path.exists(self.path):
+                os.replace(self.path, f"{self.path}.1")
+        except PermissionError:
+            pass  # Windows 上其他进程仍打开着文件时无法改名，之后的写入会再次尝试
+
+    def write(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            try:
+                if self._file is not None and not self._is_current():
+                    self._file.close()
+                    self._file = None
+                if self._file is None:
+                    self._file = open(self.path, 'a', encoding='utf-8')
+                self._file.write(line)
+                self._file.flush()
+                if os.fstat(self._file.fileno()).st_size >= self.max_bytes:
+                    self._rotate()
+            except OSError as e:
+                print(f"⚠️ 写入追踪记录失败: {e}")
+                self._file = None
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_trace_writer() -> TraceWriter:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = TraceWriter()
+        return _writer
+
+
+@contextmanager
+def span(stage: str, **attrs) -> Iterator[Span]:
+    """
+    记录一个耗时段，同一线程（或 asyncio 任务）内嵌套的耗时段通过 parent 关联
+
+    使用示例:
+        with span("ocr", provider="SiliconFlow") as s:
+            response = client.chat.completions.create(...)
+            s.add_usage(response)
+    """
+    if not TRACE_ENABLED:
+        yield NULL_SPAN
+        return
+
+    parent = _current.get()
+    current = Span(stage, attrs, parent.id if parent else None)
+    token = _current.set(current)
+    error = None
+    try:
+        yield current
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current.reset(token)
+        current.finish(error)
+
+
+def current_span():
+    """最内层的耗时段（没有时为 NULL_SPAN），用于在被 traced 装饰的函数内补充属性"""
+    return _current.get() or NULL_SPAN
+
+
+def traced(stage: str):
+    """装饰器：把整个函数调用（普通函数或协程函数）记录为一个耗时段"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def detached_span(stage: str, **attrs):
+    """
+    开始一个不成为“当前耗时段”的耗时段，由调用方 finish()
+    用于生成器（流式响应）：yield 期间调用方的其他耗时段不应挂到它下面
+    """
+    if not TRACE_ENABLED:
+        return NULL_SPAN
+    parent = _current.get()
+    return Span(stage, attrs, parent.id if parent else None)
+
+
+def payload_bytes(messages: list) -> int:
+    """messages 中文本和图片 data URL 的字节数（近似请求体大小，不序列化整个请求）"""
+    total = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            total += len(content.encode("utf-8"))
+            continue
+        for part in content or []:
+            if part.get("type") == "text":
+                total += len(part.get("text", "").encode("utf-8"))
+            elif part.get("type") == "image_url":
+                total += len(part.get("image_url", {}).get("url", ""))
+    return total
+
+
+# ================= 汇总 =================
+
+def read_spans(since: float = None, path: str = None) -> Iterator[dict]:
+    """
+    读取追踪记录（包括已轮转的文件）
+
+    :param since: 只返回该时间戳之后开始的记录
+    :param path: 追踪文件路径，默认为 get_trace_writer() 的路径
+    """
+    writer = get_trace_writer() if path is None else TraceWriter(path)
+    for file_path in writer.files():
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # 进程中断时最后一行可能不完整
+                if since is None or record.get("ts", 0) >= since:
+                    yield record
+
+
+def _percentile(ordered: list, q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def summarize(spans, by: str = None) -> dict:
+    """
+    按阶段汇总：次数、失败数、耗时 p50 / p95 / 最大值 / 合计、token 数、字节数、缓存命中率
+
+    :param spans: read_spans() 的结果
+    :param by: 额外的分组属性（如 "provider"），分组键为 "阶段 [属性值]"
+    :return: {分组键: 统计}
+    """
+    groups = {}
+    for record in spans:
+        key = record.get("stage", "?")
+        if by and record.get(by) is not None:
+            key = f"{key} [{record[by]}]"
+        groups.setdefault(key, []).append(record)
+
+    summary = {}
+    for key in sorted(groups):
+        records = groups[key]
+        durations = sorted(r.get("ms", 0) for r in records)
+        hits = sum(1 for r in records if r.get("cache") == "hit")
+        misses = sum(1 for r in records if r.get("cache") == "miss")
+        summary[key] = {
+            "count": len(records),
+            "errors": sum(1 for r in records if not r.get("ok", True)),
+            "p50_ms": round(_percentile(durations, 50), 2),
+            "p95_ms": round(_percentile(durations, 95), 2),
+            "max_ms": round(durations[-1], 2),
+            "total_s": round(sum(durations) / 1000, 2),
+            "prompt_tokens": sum(r.get("prompt_tokens", 0) for r in records),
+            "completion_tokens": sum(r.get("completion_tokens", 0) for r in records),
+            "bytes": sum(r.get("bytes", 0) for r in records),
+            "cache_hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+        }
+    return summary
+
+
+def format_summary(summary: dict) -> str:
+    """汇总结果格式化为文本表格"""
+    header = (f"{'stage':<30}{'count':>7}{'err':>6}{'p50 ms':>10}{'p95 ms':>10}{'total s':>9}"
+              f"{'in tok':>10}{'out tok':>10}{'KB':>10}{'hit':>8}")
+    lines = [header, "-" * len(header)]
+    for key, s in summary.items():
+        hit_rate = "-" if s["cache_hit_rate"] is None else f"{s['cache_hit_rate']:.0%}"
+        lines.append(f"{key:<30}{s['count']:>7}{s['errors']:>6}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}"
+                     f"{s['total_s']:>9.1f}{s['prompt_tokens']:>10}{s['completion_tokens']:>10}"
+                     f"{s['bytes'] / 1024:>10.1f}{hit_rate:>8}")
+    return "\n".join(lines)
+
+
+def parse_since(value: str) -> Optional[float]:
+    """"30m" / "24h" / "7d" 转换为起始时间戳，空值表示全部"""
+    if not value:
+        return None
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    unit = value[-1].lower()
+    if unit in units:
+        return time.time() - float(value[:-1]) * units[unit]
+    return time.time() - float(value) * 3600
+
+
+# ================= 命令行入口 =================
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="按阶段汇总追踪记录的耗时、token 和缓存命中率")
+    parser.add_argument("--since", default="24h", help="时间范围，如 30m / 24h / 7d，all 表示全部")
+    parser.add_argument("--by", help="额外的分组属性，如 provider / model / route")
+    parser.add_argument("--path", help="追踪文件路径，默认为数据目录下的 traces/traces.jsonl")
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+
+    since = None if args.since == "all" else parse_since(args.since)
+    result = summarize(read_spans(since, args.path), args.by)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    elif not result:
+        print("没有追踪记录")
+    else:
+        print(format_summary(result))
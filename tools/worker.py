@@ -0,0 +1,537 @@
+import os
+import sys
+import json
+import time
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+# ================= 标准输出隔离 =================
+# 协议消息独占真正的 stdout，其余模块里的 print 诊断信息全部转到 stderr，
+# 避免 emoji 日志混入 JSON 行导致 Electron 端解析失败
+_protocol_out = sys.stdout
+sys.stdout = sys.stderr
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ask_ai import AIClient, ask_ai_stream
+
+
+# ================= 常驻对象 =================
+# 在 worker 生命周期内只初始化一次，后续请求直接复用
+
+_write_lock = threading.Lock()
+_state_lock = threading.Lock()
+_content_lock = threading.Lock()  # ContentManager 的保存和分类流程串行执行（文件夹配置本身由注册表保证事务）
+
+_content_manager = None
+_recommenders = {}
+_pdf_reader = None
+_search_index = None
+_indexer = None
+_paper_store = None
+_paper_ranker = None
+_paper_ingestor = None
+_job_queue = None
+_context_builder = None
+_folders_subscribed = False
+
+FOLDER_POLL_INTERVAL = 3.0  # 检查其他进程（keyboard_manager 等）是否修改了文件夹注册表的间隔（秒）
+
+
+def _get_content_manager():
+    """获取常驻的 ContentManager（首次调用时才导入并初始化）"""
+    global _content_manager
+    with _state_lock:
+        if _content_manager is None:
+            from choose_to_save import ContentManager
+            _content_manager = ContentManager()
+        return _content_manager
+
+
+def _get_folder_registry():
+    """获取共享的文件夹注册表（首次调用时订阅变更，以 folders.changed 通知推送给 Electron 端）"""
+    from folder_registry import get_folder_registry
+    registry = get_folder_registry()
+    global _folders_subscribed
+    with _state_lock:
+        if not _folders_subscribed:
+            registry.subscribe(lambda version: send_message(
+                {"jsonrpc": "2.0", "method": "folders.changed", "params": {"version": version}}))
+            _folders_subscribed = True
+    return registry
+
+
+def _poll_folder_registry():
+    """
+    定期刷新文件夹注册表：其他进程提交的修改只有在本进程 refresh() 时才会被发现，
+    没有请求时也要轮询，folders.changed 才能及时推送到界面（未变化时每次只执行一条 PRAGMA data_version）
+    """
+    while True:
+        time.sleep(FOLDER_POLL_INTERVAL)
+        try:
+            _get_folder_registry().refresh()
+        except Exception as e:
+            print(f"⚠️ 刷新文件夹注册表失败: {e}")
+
+
+def _get_pdf_reader():
+    """获取常驻的 PdfReader"""
+    global _pdf_reader
+    with _state_lock:
+        if _pdf_reader is None:
+            from pdf_reader import PdfReader
+            _pdf_reader = PdfReader()
+        return _pdf_reader
+
+
+def _get_search_index():
+    """获取常驻的 SearchIndex"""
+    global _search_index
+    with _state_lock:
+        if _search_index is None:
+            from search_index import SearchIndex
+            _search_index = SearchIndex()
+        return _search_index
+
+
+def _get_context_builder():
+    """获取常驻的 ContextBuilder（按文档内容缓存切分结果）"""
+    global _context_builder
+    with _state_lock:
+        if _context_builder is None:
+            from context_builder import ContextBuilder
+            _context_builder = ContextBuilder()
+    return _context_builder
+
+
+def _get_indexer():
+    """获取常驻的 IncrementalIndexer（与搜索共用同一个 SearchIndex）"""
+    index = _get_search_index()
+    global _indexer
+    with _state_lock:
+        if _indexer is None:
+            from indexer import IncrementalIndexer
+            _indexer = IncrementalIndexer(index)
+        return _indexer
+
+
+def _get_paper_store():
+    """获取常驻的 PaperStore"""
+    global _paper_store
+    with _state_lock:
+        if _paper_store is None:
+            from paper_store import PaperStore
+            _paper_store = PaperStore()
+        return _paper_store
+
+
+def _get_paper_ingestor():
+    """获取常驻的 PaperIngestor（与其他保存操作共用 ContentManager 和锁）"""
+    manager = _get_content_manager()
+    store = _get_paper_store()
+    global _paper_ingestor
+    with _state_lock:
+        if _paper_ingestor is None:
+            from paper_ingest import PaperIngestor
+            _paper_ingestor = PaperIngestor(manager=manager, store=store, save_lock=_content_lock)
+        return _paper_ingestor
+
+
+def _get_recommender(max_results: int):
+    """按 max_results 获取常驻的 ArxivRecommender（共用同一个本地论文库和相关度排序）"""
+    global _paper_ranker
+    index = _get_search_index()
+    store = _get_paper_store()
+    with _state_lock:
+        recommender = _recommenders.get(max_results)
+        if recommender is None:
+            from paper_ranker import PaperRanker
+            from research_article import ArxivRecommender
+            if _paper_ranker is None:
+                _paper_ranker = PaperRanker(index, _knowledge_folders)
+            recommender = ArxivRecommender(max_results=max_results, store=store,
+                                           ranker=_paper_ranker)
+            _recommenders[max_results] = recommender
+        return recommender
+
+
+# ================= 协议 =================
+
+def send_message(message: dict):
+    """向 Electron 端写一行 JSON 消息"""
+    line = json.dumps(message, ensure_ascii=False)
+    with _write_lock:
+        _protocol_out.write(line + "\n")
+        _protocol_out.flush()
+
+
+def _send_result(request_id, result):
+    send_message({"jsonrpc": "2.0", "id": request_id, "result": result})
+
+
+def _send_error(request_id, code: int, message: str):
+    send_message({"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}})
+
+
+def _make_notifier(request_id):
+    """
+    生成绑定到某个请求的通知函数，用于在请求完成前推送增量数据
+    通知格式: {"jsonrpc": "2.0", "method": "ai.chunk", "params": {"id": 1, ...}}
+    """
+    def notify(method: str, data: dict):
+        send_message({"jsonrpc": "2.0", "method": method, "params": {"id": request_id, **data}})
+    return notify
+
+
+# ================= 请求处理函数 =================
+
+def handle_ping(params: dict, notify) -> dict:
+    """健康检查（附带各 API 服务商最近的延迟和错误率）"""
+    from provider_router import get_router
+
+    return {"pid": os.getpid(), "model": AIClient.get_current_model_display(),
+            "providers": get_router().snapshot()}
+
+
+def handle_ai_ask(params: dict, notify) -> dict:
+    """
+    AI 问答，生成过程中以 ai.chunk 通知逐段推送文本
+
+    params.text: 直接发送的提示词
+    params.question + params.document (+ params.file_name): 针对正在阅读的文件提问，
+        按 token 预算挑选与问题相关的片段组成提示词
+    """
+    context = None
+    if params.get("document"):
+        from context_builder import budget_for
+
+        # 先确定本次使用的 API 配置再取预算：首次提问时还没有创建过客户端，_verified_config 为 None；
+        # 创建客户端只选择配置、不发送请求，随后 ask_ai_stream 的默认客户端沿用同一配置
+        model = AIClient().model_name
+        built = _get_context_builder().build_prompt(
+            params["question"], params["document"], params.get("file_name", ""), budget_for(model)
+        )
+        kwargs = {"text": built["prompt"]}
+        context = built["context"]
+    else:
+        kwargs = {"text": params.get("text") or params["question"]}
+    for key in ("system_prompt", "temperature", "max_tokens"):
+        if key in params:
+            kwargs[key] = params[key]
+
+    parts = []
+    for delta in ask_ai_stream(**kwargs):
+        parts.append(delta)
+        notify("ai.chunk", {"delta": delta})
+    return {"response": "".join(parts), "context": context}
+
+
+def handle_pdf_read(params: dict, notify) -> dict:
+    """
+    读取 PDF 文本，无文本层的页面并发 OCR
+
+    stream 为 true 时每页就绪后立即以 pdf.page 通知推送，worker 端不保留全文，
+    最终结果只包含页数统计
+    """
+    reader = _get_pdf_reader()
+    if not params.get("stream"):
+        result = reader.read(params["path"], params.get("max_pages"))
+        return {"content": result["content"], "total_pages": result["total_pages"]}
+
+    from pdf_reader import format_page_header
+
+    pages_read = 0
+    total_pages = 0
+    for page in reader.iter_pages(params["path"], params.get("max_pages")):
+        pages_read += 1
+        total_pages = page["total_pages"]
+        notify("pdf.page", {**page, "header": format_page_header(page)})
+    return {"total_pages": total_pages, "pages_read": pages_read}
+
+
+def handle_arxiv_search(params: dict, notify) -> dict:
+    """
+    搜索 Arxiv 最新论文（经过本地论文库，只增量抓取）
+
+    params.max_age: 本地结果有效期（秒），定时任务传 0 以确保抓取
+    params.only_unnotified: 为 True 时 new_papers 只保留从未通知过的论文，并标记为已通知
+    """
+    from paper_store import QUERY_FRESH_SECONDS
+
+    recommender = _get_recommender(int(params.get("max_results", 5)))
+    result = recommender.search(params["query"], max_age=float(params.get("max_age", QUERY_FRESH_SECONDS)))
+    if params.get("only_unnotified"):
+        ids = recommender.store.take_unnotified([p["arxiv_id"] for p in result["new_papers"]])
+        result["new_papers"] = [p for p in result["new_papers"] if p["arxiv_id"] in ids]
+    return result
+
+
+def handle_arxiv_ingest(params: dict, notify) -> dict:
+    """批量下载论文 PDF 并分类入库，每篇论文状态变化时发送 ingest.progress 通知"""
+    results = _get_paper_ingestor().ingest(
+        params.get("papers", []),
+        sub_folder=params.get("sub_folder", "文章"),
+        on_progress=lambda item: notify("ingest.progress", item)
+    )
+    return {"results": results}
+
+
+def handle_content_save_pdf(params: dict, notify) -> dict:
+    """将 PDF 自动分类保存到合适的文件夹"""
+    from choose_to_save import InputType
+
+    manager = _get_content_manager()
+    with _content_lock:
+        result_path = manager.save_content(
+            InputType.PDF,
+            params["path"],
+            description=params.get("description"),
+            sub_folder=params.get("sub_folder", "文章")
+        )
+    if not result_path:
+        raise RuntimeError("保存失败")
+    return {"path": result_path}
+
+
+def handle_folder_create(params: dict, notify) -> dict:
+    """新建知识库文件夹并生成描述"""
+    manager = _get_content_manager()
+    folder_name = params["name"]
+    with _content_lock:
+        result = manager.create_folder(folder_name, params.get("base_path"), parent=params.get("parent"))
+    if not result:
+        raise RuntimeError("创建失败")
+
+    folder = manager.registry.get(folder_name) or {}
+    return {"path": result, "description": folder.get("description", "")}
+
+
+def handle_folder_list(params: dict, notify) -> dict:
+    """列出知识库文件夹及注册表版本号"""
+    registry = _get_folder_registry()
+    return {"folders": registry.list(), "version": registry.version()}
+
+
+def _get_note_store(params: dict):
+    """按 folder（名称）和可选的 path（知识库文件夹路径，查看器打开的文件夹不一定在注册表中）获取笔记存储"""
+    folder_path = params.get("path")
+    if folder_path and not os.path.isdir(os.path.join(folder_path, "笔记")):
+        raise RuntimeError(f"不是笔记文件夹: {folder_path}")
+    store = _get_content_manager().get_note_store(params["folder"], folder_path or None)
+    if store is None:
+        raise RuntimeError(f"文件夹不存在: {params['folder']}")
+    return store
+
+
+def handle_notes_recent(params: dict, notify) -> dict:
+    """读取文件夹最近的笔记条目（只读取对应的几条日志，不加载整个 markdown）"""
+    store = _get_note_store(params)
+    before = params.get("before")
+    notes = store.recent(int(params.get("limit") or 20), int(before) if before else None)
+    return {"notes": notes, "total": store.count(), "segment": store.current_segment_path()}
+
+
+def handle_notes_get(params: dict, notify) -> dict:
+    """按 id 读取一条笔记"""
+    note = _get_note_store(params).get(int(params["id"]))
+    if note is None:
+        raise RuntimeError("笔记不存在")
+    return {"note": note}
+
+
+def handle_images_thumbnails(params: dict, notify) -> dict:
+    """批量获取图片缩略图（按内容哈希缓存，命中时不解码原图）"""
+    from image_store import get_image_store
+    return {"thumbnails": get_image_store().thumbnails(params.get("paths", []))}
+
+
+def handle_search_query(params: dict, notify) -> dict:
+    """搜索知识库（全文 + 向量）"""
+    results = _get_search_index().search(
+        params["query"],
+        limit=int(params.get("limit", 20)),
+        folder=params.get("folder"),
+        kind=params.get("kind")
+    )
+    return {"results": results}
+
+
+def _knowledge_folders() -> list:
+    """读取最新的知识库文件夹列表（注册表未变化时直接返回缓存）"""
+    return _get_folder_registry().list()
+
+
+def handle_search_rebuild(params: dict, notify) -> dict:
+    """按文件夹注册表重建知识库索引"""
+    return _get_search_index().rebuild(_knowledge_folders())
+
+
+def handle_index_sync(params: dict, notify) -> dict:
+    """扫描知识库，只重新索引变化的文件"""
+    return _get_indexer().sync(_knowledge_folders())
+
+
+def handle_index_update(params: dict, notify) -> dict:
+    """处理文件监听事件中变化的路径"""
+    return _get_indexer().update_paths(params.get("paths", []), _knowledge_folders())
+
+
+# ================= 后台任务 =================
+# 耗时的 AI 操作以持久化任务执行：不受 Electron 端请求超时限制，可取消，失败自动重试，
+# worker 重启后未完成的任务继续执行。状态变化以 job.update 通知推送（不绑定请求 id）
+
+def _send_job_update(job: dict):
+    send_message({"jsonrpc": "2.0", "method": "job.update", "params": job})
+
+
+def _job_pdf_read(params: dict, ctx) -> dict:
+    """读取 PDF 全文，每页完成后汇报进度（OCR 结果有缓存，重试或恢复时已识别的页面不会重复请求）"""
+    def on_page(page):
+        ctx.check_cancelled()
+        ctx.progress(page["page"] / max(page["total_pages"], 1), f"第 {page['page']} 页")
+
+    result = _get_pdf_reader().read(params["path"], params.get("max_pages"), on_page=on_page)
+    return {"content": result["content"], "total_pages": result["total_pages"]}
+
+
+def _job_from_handler(handler):
+    """把普通请求处理函数包装为任务函数：增量通知转为任务进度，并在每次通知时检查是否被取消"""
+    def run(params: dict, ctx) -> dict:
+        def notify(method: str, data: dict):
+            ctx.check_cancelled()
+            ctx.progress(message=method, data=data)
+        return handler(params, notify)
+    return run
+
+
+def _get_job_queue():
+    """获取常驻的 JobQueue（首次调用时注册任务类型并启动调度）"""
+    global _job_queue
+    with _state_lock:
+        if _job_queue is None:
+            from job_queue import JobQueue
+            queue = JobQueue(on_event=_send_job_update)
+            queue.register("pdf.read", _job_pdf_read, concurrency=2)
+            queue.register("content.savePdf", _job_from_handler(handle_content_save_pdf), max_attempts=1)
+            queue.register("folder.create", _job_from_handler(handle_folder_create), max_attempts=1)
+            queue.register("arxiv.ingest", _job_from_handler(handle_arxiv_ingest))
+            queue.start()
+            _job_queue = queue
+    return _job_queue
+
+
+def handle_job_submit(params: dict, notify) -> dict:
+    """提交后台任务，立即返回任务信息，进度和结果通过 job.update 通知推送"""
+    max_attempts = params.get("max_attempts")
+    job = _get_job_queue().submit(params["kind"], params.get("params") or {},
+                                  max_attempts=int(max_attempts) if max_attempts else None)
+    return {"job": job}
+
+
+def handle_job_get(params: dict, notify) -> dict:
+    """查询任务状态（包含结果）"""
+    job = _get_job_queue().get(int(params["id"]))
+    if job is None:
+        raise RuntimeError("任务不存在")
+    return {"job": job}
+
+
+def handle_job_cancel(params: dict, notify) -> dict:
+    """取消排队中或执行中的任务"""
+    return {"cancelled": _get_job_queue().cancel(int(params["id"]))}
+
+
+def handle_job_list(params: dict, notify) -> dict:
+    """按创建时间倒序列出任务"""
+    return {"jobs": _get_job_queue().list_jobs(params.get("status"), int(params.get("limit", 50)))}
+
+
+def handle_trace_summary(params: dict, notify) -> dict:
+    """按阶段汇总追踪记录的耗时 p50 / p95、token 数和缓存命中率"""
+    from tracing import parse_since, read_spans, summarize
+    since = params.get("since") or "24h"
+    return {"stages": summarize(read_spans(None if since == "all" else parse_since(since)), params.get("by"))}
+
+
+HANDLERS = {
+    "ping": handle_ping,
+    "ai.ask": handle_ai_ask,
+    "pdf.read": handle_pdf_read,
+    "arxiv.search": handle_arxiv_search,
+    "arxiv.ingest": handle_arxiv_ingest,
+    "content.savePdf": handle_content_save_pdf,
+    "folder.create": handle_folder_create,
+    "folder.list": handle_folder_list,
+    "notes.recent": handle_notes_recent,
+    "notes.get": handle_notes_get,
+    "images.thumbnails": handle_images_thumbnails,
+    "search.query": handle_search_query,
+    "search.rebuild": handle_search_rebuild,
+    "index.sync": handle_index_sync,
+    "index.update": handle_index_update,
+    "job.submit": handle_job_submit,
+    "job.get": handle_job_get,
+    "job.cancel": handle_job_cancel,
+    "job.list": handle_job_list,
+    "trace.summary": handle_trace_summary,
+}
+
+
+# ================= 主循环 =================
+
+def _dispatch(request: dict):
+    request_id = request.get("id")
+    method = request.get("method")
+    handler = HANDLERS.get(method)
+
+    if handler is None:
+        _send_error(request_id, -32601, f"未知方法: {method}")
+        return
+
+    try:
+        result = handler(request.get("params") or {}, _make_notifier(request_id))
+        _send_result(request_id, result)
+    except Exception as e:
+        traceback.print_exc()
+        _send_error(request_id, -32000, str(e))
+
+
+def serve(max_workers: int = 4):
+    """
+    从 stdin 逐行读取 JSON-RPC 请求并并发处理
+
+    请求: {"jsonrpc": "2.0", "id": 1, "method": "ai.ask", "params": {...}}
+    通知: {"jsonrpc": "2.0", "method": "ai.chunk", "params": {"id": 1, ...}}  （请求处理中的增量数据，可有多条）
+          {"jsonrpc": "2.0", "method": "job.update", "params": {"id": 任务 id, "status": ...}}  （后台任务状态）
+          {"jsonrpc": "2.0", "method": "folders.changed", "params": {"version": ...}}  （文件夹注册表被任一进程修改）
+    响应: {"jsonrpc": "2.0", "id": 1, "result": {...}}
+          {"jsonrpc": "2.0", "id": 1, "error": {"code": -32000, "message": "..."}}
+    """
+    print(f"[Worker] 已启动，PID: {os.getpid()}")
+    send_message({"jsonrpc": "2.0", "method": "ready", "params": {"pid": os.getpid()}})
+
+    # 启动时就恢复上次未完成的任务
+    try:
+        _get_job_queue()
+    except Exception:
+        traceback.print_exc()
+    threading.Thread(target=_poll_folder_registry, name="folder-poll", daemon=True).start()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                _send_error(None, -32700, f"请求解析失败: {e}")
+                continue
+            executor.submit(_dispatch, request)
+
+    print("[Worker] stdin 已关闭，退出")
+
+
+if __name__ == "__main__":
+    serve()